@@ -0,0 +1,53 @@
+"""Сравнить два JSON-отчёта ``manage.py run_benchmark``.
+
+Печатает по каждому эндпоинту req/s, p99 и среднее число SQL-запросов
+базового и нового отчёта с относительным изменением; ``--fail-on-queries``
+завершает работу с кодом 1, если где-то выросло число запросов.
+
+    python benchmarks/compare_reports.py before.json after.json
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before or after is None:
+        return ''
+    return f'{(after - before) / before * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--fail-on-queries', action='store_true')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f'{before["commit"]} ({before["database"]}) -> '
+          f'{after["commit"]} ({after["database"]})')
+    print(f'{"endpoint":<24} {"req/s":>17} {"p99 ms":>17} {"queries":>13}')
+    more_queries = []
+    for endpoint, new in after['endpoints'].items():
+        old = before['endpoints'].get(endpoint)
+        if not old or not old.get('requests') or not new.get('requests'):
+            continue
+        old_queries, new_queries = old['queries']['mean'], new['queries']['mean']
+        if new_queries > old_queries:
+            more_queries.append(endpoint)
+        print(f'{endpoint:<24} '
+              f'{new["rps"]:>9} {change(old["rps"], new["rps"]):>7} '
+              f'{new["p99_ms"]:>9} {change(old["p99_ms"], new["p99_ms"]):>7} '
+              f'{old_queries:>6} -> {new_queries:<3}')
+
+    if more_queries and args.fail_on_queries:
+        sys.exit(f'more queries: {", ".join(more_queries)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Сравнить WSGI- и ASGI-режимы сервиса на одном наборе данных.
+
+Поочерёдно запускает gunicorn из ``pull_request_service/`` с SERVER_MODE=wsgi
+и SERVER_MODE=asgi (подключение к БД и кэшу берётся из окружения), один раз
+наполняет базу и прогоняет одинаковую нагрузку ``loadtest.py`` против обоих.
+Если общий кэш не задан, а воркеров несколько, серверы используют
+``FileBasedCache`` во временном каталоге.
+
+    DB_HOST=127.0.0.1 python benchmarks/compare_servers.py --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import loadtest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent / 'pull_request_service'
+
+
+def start_server(mode, port, workers, **overrides):
+    env = {**os.environ, 'SERVER_MODE': mode, 'WEB_CONCURRENCY': str(workers),
+           'BIND': f'127.0.0.1:{port}', **overrides}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=SERVICE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    url = f'http://127.0.0.1:{port}/api/statisticsCache/'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'{mode} server exited with {server.returncode}')
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'],
+                        choices=['wsgi', 'asgi'])
+    loadtest.add_arguments(parser)
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    cache_dir = tempfile.TemporaryDirectory()
+    overrides = {}
+    if args.workers > 1 and 'CACHE_BACKEND' not in os.environ:
+        overrides = {'CACHE_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                     'CACHE_LOCATION': cache_dir.name}
+    dataset = None
+    results = {}
+    for mode in args.modes:
+        server = start_server(mode, args.port, args.workers, **overrides)
+        try:
+            if dataset is None:
+                dataset = loadtest.seed(base_url, args.teams, args.members, args.prs)
+            results[mode] = loadtest.run(
+                base_url, dataset, args.concurrency, args.duration, args.warmup)
+        finally:
+            stop_server(server)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f'{"mode":<6} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for mode, result in results.items():
+        print(f'{mode:<6} {result["rps"]:>9} {result["p50_ms"]:>9} '
+              f'{result["p99_ms"]:>9} {result["errors"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
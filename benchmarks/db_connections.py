@@ -0,0 +1,59 @@
+"""Задержка запросов при разных режимах соединений с PostgreSQL.
+
+Запускает сервис (``--mode``) поочерёдно с новым соединением на каждый
+запрос (DB_CONN_MAX_AGE=0), с постоянными соединениями и с пулом, и
+прогоняет одинаковую нагрузку ``loadtest.py`` на одном наборе данных.
+База — из переменных окружения, например локальный контейнер:
+
+    docker run -d -p 5432:5432 -e POSTGRES_USER=django_user \\
+        -e POSTGRES_PASSWORD=mysecretpassword -e POSTGRES_DB=django postgres:13.10
+    DB_HOST=127.0.0.1 python benchmarks/db_connections.py
+"""
+import argparse
+import json
+
+import loadtest
+from compare_servers import start_server, stop_server
+
+
+def variants(pool_size):
+    return {
+        'per-request': {'DB_CONN_MAX_AGE': '0', 'DB_POOL_MAX_SIZE': '0'},
+        'persistent': {'DB_CONN_MAX_AGE': '600', 'DB_POOL_MAX_SIZE': '0'},
+        'pool': {'DB_POOL_MAX_SIZE': str(pool_size)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', default='wsgi', choices=['wsgi', 'asgi'])
+    parser.add_argument('--pool-size', type=int, default=8)
+    loadtest.add_arguments(parser)
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    dataset = None
+    results = {}
+    for name, env in variants(args.pool_size).items():
+        server = start_server(args.mode, args.port, args.workers, **env)
+        try:
+            if dataset is None:
+                dataset = loadtest.seed(base_url, args.teams, args.members, args.prs)
+            results[name] = loadtest.run(
+                base_url, dataset, args.concurrency, args.duration, args.warmup)
+        finally:
+            stop_server(server)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f'{"connections":<12} {"req/s":>9} {"mean ms":>9} {"p50 ms":>9} {"p99 ms":>9}')
+    for name, result in results.items():
+        print(f'{name:<12} {result["rps"]:>9} {result["mean_ms"]:>9} '
+              f'{result["p50_ms"]:>9} {result["p99_ms"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
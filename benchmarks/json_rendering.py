@@ -0,0 +1,84 @@
+"""Микробенчмарк JSON: JSONRenderer/JSONParser DRF против FastJSONRenderer/FastJSONParser.
+
+Данные — страницы статистики пользователей и PR в том виде, в каком их
+отдаёт ``values()``. Перед замером проверяется, что байты ответа и
+разобранные данные совпадают. Без установленного orjson обе колонки
+показывают стандартный модуль json.
+
+    python benchmarks/json_rendering.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'pull_request_service'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pull_request_service.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.parsers import FastJSONParser  # noqa: E402
+from api.renderers import FastJSONRenderer, orjson  # noqa: E402
+
+
+def user_statistics(size):
+    return [{'user_id': i, 'username': f'пользователь-{i}', 'assignments_count': i % 17}
+            for i in range(size)]
+
+
+def pr_statistics(size):
+    return [{'pull_request_id': i, 'pull_request_name': f'PR-{i} fix "quotes"',
+             'reviewers_count': i % 3}
+            for i in range(size)]
+
+
+def best_ms(func, repeat):
+    return round(min(timeit.repeat(func, number=1, repeat=repeat)) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='печатать результат в JSON')
+    args = parser.parse_args()
+
+    results = []
+    for name, build in (('statisticsUser', user_statistics), ('statisticsPR', pr_statistics)):
+        for size in args.sizes:
+            data = build(size)
+            content = JSONRenderer().render(data)
+            assert FastJSONRenderer().render(data) == content, name
+            assert FastJSONParser().parse(BytesIO(content)) == data, name
+            results.append({
+                'payload': name, 'rows': size, 'bytes': len(content),
+                'render_drf_ms': best_ms(lambda: JSONRenderer().render(data), args.repeat),
+                'render_fast_ms': best_ms(lambda: FastJSONRenderer().render(data), args.repeat),
+                'parse_drf_ms': best_ms(
+                    lambda: JSONParser().parse(BytesIO(content)), args.repeat),
+                'parse_fast_ms': best_ms(
+                    lambda: FastJSONParser().parse(BytesIO(content)), args.repeat),
+            })
+
+    if args.json:
+        print(json.dumps({'orjson': orjson is not None, 'results': results}))
+        return
+    if orjson is None:
+        print('orjson не установлен: FastJSON* работают через модуль json')
+    print(f'{"payload":<15} {"rows":>7} {"render ms":>19} {"parse ms":>19}')
+    for row in results:
+        print(f'{row["payload"]:<15} {row["rows"]:>7} '
+              f'{row["render_drf_ms"]:>8} -> {row["render_fast_ms"]:<7} '
+              f'{row["parse_drf_ms"]:>8} -> {row["parse_fast_ms"]:<7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Нагрузочный тест читающих эндпоинтов сервиса.
+
+Создаёт через API набор команд и PR (``--teams``/``--members``/``--prs``),
+после чего ``--concurrency`` потоков в течение ``--duration`` секунд
+опрашивают смесь GET-запросов. Печатает req/s и перцентили задержки.
+
+    python benchmarks/loadtest.py --base-url http://localhost:8080 --json
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+
+class Client:
+    """Постоянное HTTP-соединение одного потока с переподключением."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, payload, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def seed(base_url, teams, members, prs, batch=500):
+    """Создать данные через bulk-эндпоинты; вернуть параметры для запросов."""
+    client = Client(base_url)
+    prefix = uuid.uuid4().hex[:8]
+    team_names = [f'bench-{prefix}-{i}' for i in range(teams)]
+    user_ids = []
+    for start in range(0, teams, batch):
+        status, data = client.request('POST', '/api/team/bulkAdd/', {'teams': [
+            {'team_name': name,
+             'members': [{'username': f'{name}-u{j}', 'is_active': True}
+                         for j in range(members)]}
+            for name in team_names[start:start + batch]]})
+        if status != 200:
+            raise RuntimeError(f'bulkAdd failed: {status} {data[:200]!r}')
+        for result in json.loads(data)['results']:
+            user_ids.extend(member['user_id'] for member in result['team']['members'])
+
+    for start in range(0, prs, batch):
+        status, data = client.request('POST', '/api/pullRequest/bulkCreate/', {
+            'pull_requests': [
+                {'pull_request_name': f'bench-{prefix}-pr{i}',
+                 'author_id': random.choice(user_ids)}
+                for i in range(start, min(start + batch, prs))]})
+        if status != 200:
+            raise RuntimeError(f'bulkCreate failed: {status} {data[:200]!r}')
+    client.close()
+    return {'team_names': team_names, 'user_ids': user_ids}
+
+
+def requests_mix(dataset):
+    team_names, user_ids = dataset['team_names'], dataset['user_ids']
+    return [
+        (4, lambda: '/api/team/get/?' + urlencode(
+            {'team_name': random.choice(team_names)})),
+        (4, lambda: '/api/users/getReview/?' + urlencode(
+            {'user_id': random.choice(user_ids)})),
+        (1, lambda: '/api/statisticsUser/?limit=100'),
+        (1, lambda: '/api/statisticsPR/?limit=100'),
+    ]
+
+
+def run(base_url, dataset, concurrency=16, duration=20.0, warmup=2.0):
+    mix = requests_mix(dataset)
+    weights = [weight for weight, _ in mix]
+    builders = [builder for _, builder in mix]
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    def worker():
+        client = Client(base_url)
+        local, failed = [], 0
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            path = random.choices(builders, weights)[0]()
+            try:
+                status, _ = client.request('GET', path)
+            except (http.client.HTTPException, OSError):
+                status = None
+            elapsed = time.monotonic() - now
+            if now >= measure_from:
+                if status == 200:
+                    local.append(elapsed)
+                else:
+                    failed += 1
+        client.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+
+    def percentile(q):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        'concurrency': concurrency,
+        'duration_s': duration,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--teams', type=int, default=50)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--prs', type=int, default=5000)
+    parser.add_argument('--json', action='store_true', help='печатать результат в JSON')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8080')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    dataset = seed(args.base_url, args.teams, args.members, args.prs)
+    result = run(args.base_url, dataset, args.concurrency, args.duration, args.warmup)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f'{key:>12}: {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Микробенчмарк сериализации списков: ModelSerializer против ReadSerializer.
+
+Данные строятся в памяти, БД не нужна: ModelSerializer получает экземпляры
+моделей (ревьюверы PR — как после ``prefetch_related``), сериализаторы
+ответов — словари, как из ``values()``. Печатает время на строку для
+нескольких размеров списка, чтобы было видно, что стоимость линейна.
+
+    python benchmarks/serialization.py --sizes 10 100 1000 10000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'pull_request_service'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pull_request_service.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.serializers import (  # noqa: E402
+    PullRequestReadSerializer,
+    PullRequestSerializer,
+    UserTeamReadSerializer,
+    UserTeamSerializer,
+)
+from pull_requests.models import PullRequest  # noqa: E402
+from teams.models import Team  # noqa: E402
+from users.models import User  # noqa: E402
+
+
+def users(size):
+    team = Team(pk=1, team_name='backend')
+    instances = [User(pk=i, username=f'user{i}', team=team, is_active=True)
+                 for i in range(size)]
+    rows = [{'id': user.pk, 'username': user.username,
+             'team__team_name': team.team_name, 'is_active': True}
+            for user in instances]
+    return ((lambda: UserTeamSerializer(instances, many=True).data),
+            (lambda: UserTeamReadSerializer(rows, many=True).data))
+
+
+def pull_requests(size):
+    reviewers = [User(pk=i, username=f'user{i}') for i in range(2)]
+    instances = []
+    for i in range(size):
+        pr = PullRequest(pk=i, pull_request_name=f'PR{i}', author_id=100, status='OPEN')
+        # То же, что оставляет prefetch_related('assigned_reviewers').
+        cached = User.objects.all()
+        cached._result_cache, cached._prefetch_done = reviewers, True
+        pr._prefetched_objects_cache = {'assigned_reviewers': cached}
+        instances.append(pr)
+    rows = [{'id': pr.pk, 'pull_request_name': pr.pull_request_name,
+             'author_id': pr.author_id, 'status': pr.status,
+             'assigned_reviewers': [user.pk for user in reviewers]}
+            for pr in instances]
+    return ((lambda: PullRequestSerializer(instances, many=True).data),
+            (lambda: PullRequestReadSerializer(rows, many=True).data))
+
+
+def per_row_us(func, size, repeat):
+    number = max(1, 20000 // size)
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return round(best / number / size * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='печатать результат в JSON')
+    args = parser.parse_args()
+
+    results = []
+    for name, build in (('users', users), ('pull_requests', pull_requests)):
+        for size in args.sizes:
+            model, read = build(size)
+            assert model() == read(), name
+            results.append({
+                'payload': name, 'rows': size,
+                'model_us_per_row': per_row_us(model, size, args.repeat),
+                'read_us_per_row': per_row_us(read, size, args.repeat),
+            })
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f'{"payload":<14} {"rows":>6} {"model µs/row":>13} {"read µs/row":>12} {"speedup":>8}')
+    for row in results:
+        speedup = row['model_us_per_row'] / row['read_us_per_row']
+        print(f'{row["payload"]:<14} {row["rows"]:>6} {row["model_us_per_row"]:>13} '
+              f'{row["read_us_per_row"]:>12} {speedup:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Архивация смёрженных PR.
+
+``manage.py archive_pull_requests`` переносит PR, смёрженные раньше
+``ARCHIVE_AFTER_DAYS`` дней назад, вместе со связями ревьюверов в таблицы
+``ArchivedPullRequest``, так что горячие таблицы PR, ревьюверов и
+статистики PR не растут вместе с историей. Каждый пакет переносится
+отдельной транзакцией. Статистика и ``getReview`` учитывают архив только
+с параметром ``include_archived``.
+"""
+from collections import defaultdict
+
+from django.db import connections, router, transaction
+
+from pull_requests.models import ArchivedPullRequest, PullRequest
+
+from . import counters
+from .models import PullRequestReviewStats
+
+Reviewer = PullRequest.assigned_reviewers.through
+ArchivedReviewer = ArchivedPullRequest.assigned_reviewers.through
+
+
+def archive_batch(before, batch_size):
+    """Перенести в архив до ``batch_size`` PR, смёрженных раньше ``before``.
+
+    Возвращает число перенесённых PR; ноль означает, что переносить
+    больше нечего. PR, заблокированные другими транзакциями, пропускаются
+    до следующего запуска.
+    """
+    with transaction.atomic():
+        pull_requests = list(PullRequest.objects.select_for_update(skip_locked=True).filter(
+            status='MERGED', merged_at__lt=before,
+        ).order_by('merged_at', 'pk')[:batch_size])
+        if not pull_requests:
+            return 0
+        ids = [pr.pk for pr in pull_requests]
+
+        reviewers = defaultdict(list)
+        for pr_id, user_id in Reviewer.objects.filter(
+                pullrequest_id__in=ids).order_by('pk').values_list('pullrequest_id', 'user_id'):
+            reviewers[pr_id].append(user_id)
+
+        ArchivedPullRequest.objects.bulk_create(
+            ArchivedPullRequest(
+                id=pr.pk, pull_request_name=pr.pull_request_name,
+                author_id=pr.author_id, status=pr.status,
+                reviewers_count=len(reviewers[pr.pk]),
+                created_at=pr.created_at, merged_at=pr.merged_at)
+            for pr in pull_requests)
+        ArchivedReviewer.objects.bulk_create(
+            ArchivedReviewer(archivedpullrequest_id=pr_id, user_id=user_id)
+            for pr_id, user_ids in reviewers.items() for user_id in user_ids)
+
+        Reviewer.objects.filter(pullrequest_id__in=ids).delete()
+        PullRequestReviewStats.objects.filter(pull_request_id__in=ids).delete()
+        _delete_pull_requests(ids)
+        counters.pull_requests_archived(reviewers)
+    return len(ids)
+
+
+def _delete_pull_requests(ids):
+    """Удалить PR явным DELETE.
+
+    Обычный delete() загрузил бы каждый PR и вызвал для него pre_delete, а
+    обработчик из api.signals уменьшил бы счётчики, которые здесь не
+    уменьшаются, а переносятся в архивный счётчик. Связи и статистика к
+    этому моменту уже удалены.
+    """
+    connection = connections[router.db_for_write(PullRequest)]
+    table = connection.ops.quote_name(PullRequest._meta.db_table)
+    column = connection.ops.quote_name(PullRequest._meta.pk.column)
+    batch_size = connection.ops.bulk_batch_size([PullRequest._meta.pk], ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', batch)
+
+
+def archive(before, batch_size):
+    """Перенести в архив все PR, смёрженные раньше ``before``."""
+    archived = 0
+    while count := archive_batch(before, batch_size):
+        archived += count
+    return archived
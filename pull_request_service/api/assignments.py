@@ -0,0 +1,196 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from pull_requests.models import ArchivedPullRequest, PullRequest
+from users.models import User
+
+from . import counters, events
+from .policies import policy_engine
+from .selection import workload
+
+
+Reviewer = PullRequest.assigned_reviewers.through
+
+
+def create_pull_requests(items, retry=True):
+    """Создать пачку PR и назначить ревьюверов за постоянное число запросов.
+
+    Возвращает результаты в порядке входных элементов: ``{'pr': ...}`` для
+    созданных PR и ``{'error': ...}`` с кодами PR_EXISTS и NOT_FOUND.
+    Имена PR из архива тоже заняты. Если конкурентный запрос успел занять
+    имя, пачка пересчитывается один раз с учётом уже существующих PR;
+    имя, ушедшее в архив во время вставки, тоже приводит к пересчёту.
+    """
+    names = {item['pull_request_name'] for item in items}
+    taken = set(PullRequest.objects.filter(
+        pull_request_name__in=names).values_list('pull_request_name', flat=True).union(
+        ArchivedPullRequest.objects.filter(
+            pull_request_name__in=names).values_list('pull_request_name', flat=True),
+        all=True))
+    authors = dict(User.objects.filter(
+        pk__in={item['author_id'] for item in items}).values_list('pk', 'team_id'))
+    plans = policy_engine.plans(set(authors.values()))
+
+    pending = defaultdict(int)
+    results = []
+    created = []
+    for item in items:
+        name, author_id = item['pull_request_name'], item['author_id']
+        if name in taken:
+            results.append({'error': {'code': 'PR_EXISTS',
+                                      'message': f'{name} already exists'}})
+            continue
+        if author_id not in authors:
+            results.append({'error': {'code': 'NOT_FOUND',
+                                      'message': 'Author/team not found'}})
+            continue
+
+        taken.add(name)
+        reviewers = policy_engine.choose(
+            plans[authors[author_id]], exclude=[author_id], pending=pending)
+        for member_id in reviewers:
+            pending[member_id] += 1
+
+        pr = {'pull_request_id': None, 'pull_request_name': name,
+              'author_id': author_id, 'status': 'OPEN',
+              'assigned_reviewers': reviewers}
+        results.append({'pr': pr})
+        created.append(pr)
+
+    if not created:
+        return results
+
+    try:
+        with transaction.atomic():
+            _insert_pull_requests(created)
+            # Проверка архива повторяется после вставки: вставка ждёт
+            # транзакцию, переносящую PR с тем же именем в архив.
+            archived = ArchivedPullRequest.objects.filter(pull_request_name__in=[
+                pr['pull_request_name'] for pr in created]).exists()
+            transaction.set_rollback(archived)
+    except IntegrityError:
+        if not retry:
+            raise
+        return create_pull_requests(items, retry=False)
+    if archived:
+        # Каждый повтор добавляет в занятые хотя бы одно имя из пачки,
+        # поэтому число повторов ограничено её размером.
+        return create_pull_requests(items, retry=retry)
+
+    workload.assign(
+        member_id for pr in created for member_id in pr['assigned_reviewers'])
+    policy_engine.remember(plans.values())
+    return results
+
+
+def _insert_pull_requests(created):
+    objs = PullRequest.objects.bulk_create(
+        PullRequest(pull_request_name=pr['pull_request_name'],
+                    author_id=pr['author_id'], status='OPEN')
+        for pr in created)
+    if objs[0].pk is None:
+        ids = dict(PullRequest.objects.filter(
+            pull_request_name__in=[pr['pull_request_name'] for pr in created]
+        ).values_list('pull_request_name', 'pk'))
+        for obj in objs:
+            obj.pk = ids[obj.pull_request_name]
+    for pr, obj in zip(created, objs):
+        pr['pull_request_id'] = obj.pk
+
+    Reviewer.objects.bulk_create(
+        Reviewer(pullrequest_id=pr['pull_request_id'], user_id=member_id)
+        for pr in created for member_id in pr['assigned_reviewers'])
+    counters.pull_requests_created(
+        {pr['pull_request_id']: pr['assigned_reviewers'] for pr in created})
+    events.pull_requests_created(created)
+
+
+def reassign_open_reviews(user_ids):
+    """Снять пользователей с открытых PR и пакетно назначить им замену.
+
+    Вызывается внутри транзакции. Число запросов не зависит ни от
+    количества PR, ни от размера команд: блокировка затронутых PR, одна
+    выборка их связей, составы команд авторов из кэша, один DELETE и
+    один INSERT в таблицу ревьюверов и обновление счётчиков статистики.
+    """
+    summary, _ = reassign_open_reviews_batch(user_ids)
+    return summary
+
+
+def reassign_open_reviews_batch(user_ids, limit=None):
+    """То же, что ``reassign_open_reviews``, но не больше ``limit`` PR за раз.
+
+    Возвращает итог и число обработанных PR; ноль означает, что открытых
+    PR у пользователей не осталось.
+    """
+    user_ids = set(user_ids)
+    summary = {'reassigned': 0, 'short': 0, 'orphaned': 0}
+
+    affected = Reviewer.objects.filter(
+        user_id__in=user_ids, pullrequest__status='OPEN'
+    ).values('pullrequest_id')
+    if limit is not None:
+        affected = affected.order_by('pullrequest_id').distinct()[:limit]
+    # Затронутые PR блокируются в порядке ключей до расчёта замен, как в
+    # pullRequest/reassign: параллельные замена, merge и деактивация ждут
+    # друг друга, а связи ниже читаются уже после их фиксации. Смёрженный
+    # за время ожидания PR отсекает повторная проверка статуса.
+    locked = list(PullRequest.objects.select_for_update().filter(
+        pk__in=affected, status='OPEN').order_by('pk').values_list('pk', flat=True))
+    links = Reviewer.objects.filter(pullrequest_id__in=locked).values_list(
+        'pk', 'pullrequest_id', 'user_id',
+        'pullrequest__author_id', 'pullrequest__author__team_id')
+
+    reviewers = defaultdict(set)
+    removed_links = defaultdict(list)
+    authors = {}
+    for link_id, pr_id, user_id, author_id, team_id in links:
+        reviewers[pr_id].add(user_id)
+        authors[pr_id] = (author_id, team_id)
+        if user_id in user_ids:
+            removed_links[pr_id].append((link_id, user_id))
+
+    if not removed_links:
+        return summary, len(locked)
+
+    plans = policy_engine.plans(
+        {team_id for _, team_id in authors.values()}, exclude=user_ids)
+
+    pending = defaultdict(int)
+    stale_links = []
+    new_links = []
+    for pr_id in sorted(removed_links):
+        author_id, team_id = authors[pr_id]
+        stale_links.extend(
+            (pr_id, user_id) for _, user_id in removed_links[pr_id])
+
+        needed = len(removed_links[pr_id])
+        chosen = policy_engine.choose(
+            plans[team_id], exclude={author_id, *reviewers[pr_id]}, k=needed, pending=pending)
+        for member_id in chosen:
+            pending[member_id] += 1
+        new_links.extend(
+            Reviewer(pullrequest_id=pr_id, user_id=member_id)
+            for member_id in chosen)
+
+        if chosen:
+            summary['reassigned'] += 1
+        if len(chosen) < needed:
+            summary['short'] += 1
+        if not chosen and reviewers[pr_id] <= user_ids:
+            summary['orphaned'] += 1
+
+    Reviewer.objects.filter(
+        pk__in=[link_id for links in removed_links.values() for link_id, _ in links]
+    ).delete()
+    Reviewer.objects.bulk_create(new_links)
+    added = [(link.pullrequest_id, link.user_id) for link in new_links]
+    counters.reviewers_changed(added=added, removed=stale_links)
+    events.reviewers_changed(added=added, removed=stale_links)
+
+    workload.forget(user_ids)
+    workload.assign(link.user_id for link in new_links)
+    policy_engine.remember(plans.values())
+
+    return summary, len(locked)
@@ -0,0 +1,66 @@
+"""Асинхронные точки входа для читающих эндпоинтов.
+
+В Django 3.2 нет асинхронного ORM, поэтому представление целиком
+выполняется одним вызовом ``sync_to_async`` в общем пуле потоков, а не в
+единственном потоке, куда ASGI-обработчик сводит синхронные представления.
+Потоковые ответы дочитываются там же во временный файл: ASGI-обработчик
+Django 3.2 перебирает итератор ответа в цикле событий, где запросы к БД
+запрещены.
+"""
+import tempfile
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import FileResponse
+
+
+def _spool(response):
+    buffer = tempfile.SpooledTemporaryFile(max_size=settings.ASYNC_STREAM_SPOOL_SIZE)
+    try:
+        for chunk in response:
+            buffer.write(chunk)
+    finally:
+        response.close()
+    buffer.seek(0)
+
+    spooled = FileResponse(buffer, status=response.status_code)
+    for header, value in response.items():
+        spooled[header] = value
+    return spooled
+
+
+def _run(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(func, *args, **kwargs):
+    """Выполнить синхронную функцию с запросами к БД в общем пуле потоков."""
+    return await sync_to_async(_run, thread_sensitive=False)(func, *args, **kwargs)
+
+
+def _call(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.streaming:
+        response = _spool(response)
+    return response
+
+
+async def call(view, request, *args, **kwargs):
+    """Выполнить синхронное представление в общем пуле потоков."""
+    return await run(_call, view, request, *args, **kwargs)
+
+
+def read_only(view):
+    """Асинхронная обёртка над синхронным читающим представлением."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await call(view, request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from teams.models import Team
+from users.models import User
+
+from .rosters import roster_cache
+
+
+def create_teams(items, retry=True):
+    """Импортировать пачку команд с участниками за постоянное число запросов.
+
+    Возвращает результаты в порядке входных элементов: ``{'team': ...}`` для
+    созданных команд и ``{'error': ...}`` с кодом TEAM_EXISTS.
+    """
+    taken = set(Team.objects.filter(
+        team_name__in={item['team_name'] for item in items}
+    ).values_list('team_name', flat=True))
+
+    results = []
+    created = []
+    for item in items:
+        team_name = item['team_name']
+        if team_name in taken:
+            results.append({'error': {'code': 'TEAM_EXISTS',
+                                      'message': f'{team_name} already exists'}})
+            continue
+        taken.add(team_name)
+        team = {'team_name': team_name, 'members': []}
+        results.append({'team': team})
+        created.append((team, item['members']))
+
+    if not created:
+        return results
+
+    try:
+        with transaction.atomic():
+            teams = _insert_teams(created)
+    except IntegrityError:
+        if not retry:
+            raise
+        return create_teams(items, retry=False)
+
+    roster_cache.invalidate(team_ids=[team.pk for team in teams],
+                            team_names=[team.team_name for team in teams])
+
+    members = defaultdict(list)
+    for team_id, user_id, username, is_active in User.objects.filter(
+            team_id__in=[team.pk for team in teams]
+    ).order_by('pk').values_list('team_id', 'pk', 'username', 'is_active'):
+        members[team_id].append(
+            {'user_id': user_id, 'username': username, 'is_active': is_active})
+
+    for team, (payload, _) in zip(teams, created):
+        payload['members'] = members[team.pk]
+    return results
+
+
+def _insert_teams(created):
+    teams = Team.objects.bulk_create(
+        Team(team_name=team['team_name']) for team, _ in created)
+    if teams[0].pk is None:
+        ids = dict(Team.objects.filter(
+            team_name__in=[team.team_name for team in teams]
+        ).values_list('team_name', 'pk'))
+        for team in teams:
+            team.pk = ids[team.team_name]
+
+    User.objects.bulk_create(
+        User(team_id=team.pk, **member)
+        for team, (_, members) in zip(teams, created)
+        for member in members)
+    return teams
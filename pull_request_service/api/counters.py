@@ -0,0 +1,130 @@
+"""Счётчики статистики назначений.
+
+Изменения через менеджеры связи (``add``/``remove``/``set``/``clear``)
+учитываются обработчиками сигналов из ``api.signals``. Пакетные пути,
+которые пишут в таблицу ревьюверов напрямую, вызывают функции этого
+модуля сами в той же транзакции. Каждое изменение счётчиков также
+меняет версии статистики и списков ревью затронутых пользователей.
+"""
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from pull_requests.models import ArchivedPullRequest, PullRequest
+
+from .models import PullRequestReviewStats, UserReviewStats
+from .versions import reviews_scope, versions
+
+
+def _apply(model, deltas, fields):
+    """Прибавить дельты к счётчикам одним INSERT и одним UPDATE."""
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(pk)
+    if not by_delta:
+        return
+
+    model.objects.bulk_create(
+        (model(pk=pk) for pks in by_delta.values() for pk in pks),
+        ignore_conflicts=True)
+
+    delta = Case(*(When(pk__in=pks, then=Value(delta))
+                   for delta, pks in by_delta.items()))
+    model.objects.filter(
+        pk__in=[pk for pks in by_delta.values() for pk in pks]
+    ).update(**{field: Greatest(F(field) + delta, 0) for field in fields})
+
+
+def _bump_versions(user_ids):
+    versions.bump('stats', *(reviews_scope(user_id) for user_id in user_ids))
+
+
+def pull_requests_created(reviewers):
+    """Учесть новые открытые PR: ``reviewers`` — {pr_id: [user_id, ...]}."""
+    _bump_versions(user_id for user_ids in reviewers.values() for user_id in user_ids)
+    PullRequestReviewStats.objects.bulk_create(
+        PullRequestReviewStats(pull_request_id=pr_id, reviewers_count=len(user_ids))
+        for pr_id, user_ids in reviewers.items())
+    _apply(UserReviewStats,
+           Counter(user_id for user_ids in reviewers.values() for user_id in user_ids),
+           ('assignments_count', 'open_assignments_count'))
+
+
+def reviewers_changed(added=(), removed=(), is_open=True):
+    """Учесть добавленные и снятые связи (pr_id, user_id)."""
+    pr_deltas = Counter()
+    user_deltas = Counter()
+    for pr_id, user_id in added:
+        pr_deltas[pr_id] += 1
+        user_deltas[user_id] += 1
+    for pr_id, user_id in removed:
+        pr_deltas[pr_id] -= 1
+        user_deltas[user_id] -= 1
+
+    _bump_versions(user_deltas)
+    _apply(PullRequestReviewStats, pr_deltas, ('reviewers_count',))
+    _apply(UserReviewStats, user_deltas,
+           ('assignments_count', 'open_assignments_count') if is_open
+           else ('assignments_count',))
+
+
+def pull_request_merged(user_ids):
+    """Снять открытое назначение с ревьюверов смёрженного PR."""
+    _bump_versions(user_ids)
+    _apply(UserReviewStats, dict.fromkeys(user_ids, -1),
+           ('open_assignments_count',))
+
+
+def pull_requests_archived(reviewers):
+    """Перенести назначения PR, ушедших в архив, в архивный счётчик.
+
+    ``reviewers`` — {pr_id: [user_id, ...]}. Строки статистики самих PR
+    удаляет архивация: их число ревьюверов хранится в архивной таблице.
+    """
+    moved = Counter(user_id for user_ids in reviewers.values() for user_id in user_ids)
+    _bump_versions(moved)
+    _apply(UserReviewStats, {user_id: -count for user_id, count in moved.items()},
+           ('assignments_count',))
+    _apply(UserReviewStats, moved, ('archived_assignments_count',))
+
+
+def _bulk_insert(model, objs, batch_size):
+    objs = iter(objs)
+    while batch := list(islice(objs, batch_size)):
+        model.objects.bulk_create(batch)
+
+
+def rebuild(batch_size=5000):
+    """Пересчитать все счётчики с нуля по таблицам ревьюверов."""
+    links = PullRequest.assigned_reviewers.through.objects.order_by()
+    archived_links = ArchivedPullRequest.assigned_reviewers.through.objects.order_by()
+
+    with transaction.atomic():
+        UserReviewStats.objects.all().delete()
+        PullRequestReviewStats.objects.all().delete()
+
+        _bulk_insert(UserReviewStats, (
+            UserReviewStats(user_id=row['user_id'],
+                            assignments_count=row['total'],
+                            open_assignments_count=row['open'])
+            for row in links.values('user_id').annotate(
+                total=Count('pk'),
+                open=Count('pk', filter=Q(pullrequest__status='OPEN'))
+            ).iterator()
+        ), batch_size)
+        _apply(UserReviewStats, dict(
+            archived_links.values('user_id').annotate(total=Count('pk')).values_list(
+                'user_id', 'total').iterator()
+        ), ('archived_assignments_count',))
+
+        _bulk_insert(PullRequestReviewStats, (
+            PullRequestReviewStats(pull_request_id=row['pullrequest_id'],
+                                   reviewers_count=row['total'])
+            for row in links.values('pullrequest_id').annotate(
+                total=Count('pk')
+            ).iterator()
+        ), batch_size)
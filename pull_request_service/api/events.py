@@ -0,0 +1,213 @@
+"""Журнал событий назначений ревьюверов (transactional outbox).
+
+Пути записи добавляют события в ``api_reviewevent`` в той же транзакции,
+что и сами изменения, одним INSERT на запрос. Клиенты читают журнал с
+курсора через ``/api/events/``.
+
+Курсор — пара (номер транзакции PostgreSQL, id события). Идентификаторы
+выдаются при вставке, а транзакции коммитятся в другом порядке, поэтому
+читаются только события транзакций старше самой старой незавершённой:
+события, которые появятся позже, гарантированно окажутся после курсора.
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.timezone import now
+
+from .async_views import run
+from .models import ReviewEvent
+from .versions import versions
+
+SCOPE = 'events'
+
+PULL_REQUEST_CREATED = 'pull_request.created'
+PULL_REQUEST_REASSIGNED = 'pull_request.reassigned'
+PULL_REQUEST_MERGED = 'pull_request.merged'
+USER_ACTIVATED = 'user.activated'
+USER_DEACTIVATED = 'user.deactivated'
+
+# Сколько проверок версии в кэше пропустить между чтениями журнала из БД:
+# события из других процессов (при кэше в памяти процесса) и события,
+# скрытые до завершения старших транзакций, не меняют версию.
+_READS_EVERY = 5
+
+
+class CursorExpired(Exception):
+    """Событие курсора удалено ``prune_events``: часть журнала потеряна."""
+
+
+def encode_cursor(txid, pk):
+    return f'{txid}-{pk}'
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор в пару (txid, pk), ValueError при ошибке."""
+    try:
+        txid, pk = map(int, cursor.split('-'))
+    except (AttributeError, ValueError) as e:
+        raise ValueError('invalid cursor') from e
+    return txid, pk
+
+
+def _emit(events):
+    """Добавить события (kind, data) одним INSERT в текущей транзакции."""
+    events = list(events)
+    if not events:
+        return
+    txid = RawSQL('txid_current()', ()) if connection.vendor == 'postgresql' else 0
+    ReviewEvent.objects.bulk_create(
+        ReviewEvent(kind=kind, txid=txid, data=data) for kind, data in events)
+    versions.bump(SCOPE)
+
+
+def pull_requests_created(created):
+    """``created`` — словари PR с ключами ответа ``pullRequest/create``."""
+    _emit((PULL_REQUEST_CREATED, {
+        'pull_request_id': pr['pull_request_id'],
+        'pull_request_name': pr['pull_request_name'],
+        'author_id': pr['author_id'],
+        'reviewers': list(pr['assigned_reviewers']),
+    }) for pr in created)
+
+
+def reviewers_changed(added=(), removed=()):
+    """Событие на каждый PR, у которого сменились ревьюверы."""
+    changes = {}
+    for key, pairs in (('added', added), ('removed', removed)):
+        for pr_id, user_id in pairs:
+            changes.setdefault(pr_id, {'added': [], 'removed': []})[key].append(user_id)
+    _emit((PULL_REQUEST_REASSIGNED, {'pull_request_id': pr_id, **change})
+          for pr_id, change in sorted(changes.items()))
+
+
+def pull_request_merged(pull_request_id, reviewer_ids):
+    _emit([(PULL_REQUEST_MERGED, {'pull_request_id': pull_request_id,
+                                  'reviewers': list(reviewer_ids)})])
+
+
+def users_changed(user_ids, is_active):
+    kind = USER_ACTIVATED if is_active else USER_DEACTIVATED
+    _emit((kind, {'user_id': user_id}) for user_id in user_ids)
+
+
+def _visible():
+    """События завершённых транзакций, упорядоченные по курсору.
+
+    Собственная транзакция читающего тоже видна: без этого события не
+    читались бы в транзакции, которая их записала (например, в тестах).
+    """
+    events = ReviewEvent.objects.order_by('txid', 'pk')
+    if connection.vendor == 'postgresql':
+        events = events.filter(
+            Q(txid__lt=RawSQL('txid_snapshot_xmin(txid_current_snapshot())', ()))
+            | Q(txid=RawSQL('txid_current_if_assigned()', ())))
+    return events
+
+
+def latest():
+    """Курсор последнего видимого события или ``None``, если журнал пуст."""
+    last = _visible().values_list('txid', 'pk').last()
+    return encode_cursor(*last) if last else None
+
+
+def read(cursor, limit):
+    """Не больше ``limit`` событий после курсора одним запросом.
+
+    Вместе с событиями выбирается и событие самого курсора: если его уже
+    нет, журнал после курсора мог быть обрезан, и клиенту нужно
+    пересинхронизироваться.
+    """
+    events = _visible()
+    if cursor is not None:
+        txid, pk = decode_cursor(cursor)
+        events = events.filter(Q(txid=txid, pk=pk) | Q(txid__gt=txid)
+                               | Q(txid=txid, pk__gt=pk))
+    rows = list(events.values('pk', 'txid', 'kind', 'data', 'created_at')[:limit + 1])
+    if cursor is not None:
+        if not rows or (rows[0]['txid'], rows[0]['pk']) != (txid, pk):
+            raise CursorExpired(cursor)
+        rows = rows[1:]
+    return rows[:limit]
+
+
+def wait(cursor, limit, timeout):
+    """Как ``read``, но до ``timeout`` секунд ждать появления событий.
+
+    Пока версия журнала в кэше не меняется, БД читается только раз в
+    ``_READS_EVERY`` интервалов ``EVENTS_POLL_INTERVAL``.
+    """
+    deadline = time.monotonic() + timeout
+    checks = 0
+    while True:
+        token, _ = versions.current(SCOPE)
+        rows = read(cursor, limit)
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            return rows
+        while remaining > 0:
+            time.sleep(min(settings.EVENTS_POLL_INTERVAL, remaining))
+            remaining = deadline - time.monotonic()
+            checks += 1
+            if checks % _READS_EVERY == 0 or versions.current(SCOPE)[0] != token:
+                break
+
+
+async def wait_async(cursor, limit, timeout):
+    """``wait`` для асинхронных представлений: паузы идут в цикле событий.
+
+    Поток из общего пула занят только на время чтения журнала и проверки
+    версии, поэтому ждущие клиенты не вытесняют другие запросы.
+    """
+    deadline = time.monotonic() + timeout
+    checks = 0
+    while True:
+        token, _ = await run(versions.current, SCOPE)
+        rows = await run(read, cursor, limit)
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            return rows
+        while remaining > 0:
+            await asyncio.sleep(min(settings.EVENTS_POLL_INTERVAL, remaining))
+            remaining = deadline - time.monotonic()
+            checks += 1
+            if checks % _READS_EVERY == 0 or (await run(versions.current, SCOPE))[0] != token:
+                break
+
+
+def to_representation(row):
+    return {
+        'cursor': encode_cursor(row['txid'], row['pk']),
+        'type': row['kind'],
+        'created_at': row['created_at'],
+        'data': row['data'],
+    }
+
+
+def prune(retention=None, batch_size=10000):
+    """Удалить события старше ``retention`` секунд, кроме последнего из них.
+
+    Последнее удаляемое по возрасту событие остаётся в журнале: клиент, чей
+    курсор указывает на него, получил всё и может продолжить чтение, а
+    курсор на удалённое событие означает потерю части журнала.
+    """
+    if retention is None:
+        retention = settings.EVENTS_RETENTION
+    boundary = ReviewEvent.objects.filter(
+        created_at__lt=now() - timedelta(seconds=retention)
+    ).order_by('txid', 'pk').values_list('txid', 'pk').last()
+    if boundary is None:
+        return 0
+    txid, pk = boundary
+    expired = ReviewEvent.objects.filter(Q(txid__lt=txid) | Q(txid=txid, pk__lt=pk))
+    deleted = 0
+    while True:
+        count, _ = ReviewEvent.objects.filter(
+            pk__in=list(expired.values_list('pk', flat=True)[:batch_size])).delete()
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,84 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+
+
+def _request_hash(request):
+    """Хэш тела и параметров запроса, не зависящий от порядка ключей."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([data, sorted(request.query_params.lists())],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(stored, request_hash):
+    # У ключей, сохранённых до появления хэша, он пустой.
+    if stored.request_hash and stored.request_hash != request_hash:
+        return Response(
+            {'error': {'code': 'IDEMPOTENCY_KEY_REUSED',
+                       'message': f'{HEADER} was already used with a different request'}},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored.response, status=stored.status_code,
+                    headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """Повторить сохранённый ответ для уже обработанного Idempotency-Key.
+
+    Действие и сохранение ответа выполняются в одной транзакции, поэтому
+    при гонке двух запросов с одним ключом второй откатывается на
+    уникальном ограничении и получает ответ первого. Ключ с другим телом
+    запроса получает 422, а ключ старше IDEMPOTENCY_KEY_TTL считается
+    новым, даже если ``prune_idempotency_keys`` его ещё не удалила.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'error': {'code': 'BAD_REQUEST',
+                           'message': f'{HEADER} is too long'}},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        route = f'{self.basename}.{self.action}'
+        request_hash = _request_hash(request)
+        deadline = now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        keys = IdempotencyKey.objects.filter(route=route, key=key)
+        stored = keys.filter(created_at__gte=deadline).first()
+        if stored is not None:
+            return _replay(stored, request_hash)
+
+        try:
+            with transaction.atomic():
+                # Устаревший ключ, ещё не удалённый prune_idempotency_keys,
+                # занимает уникальное ограничение.
+                keys.filter(created_at__lt=deadline).delete()
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    IdempotencyKey.objects.create(
+                        route=route, key=key, request_hash=request_hash,
+                        status_code=response.status_code, response=response.data)
+        except IntegrityError:
+            stored = keys.filter(created_at__gte=deadline).first()
+            if stored is None:
+                raise
+            return _replay(stored, request_hash)
+        return response
+
+    return wrapper
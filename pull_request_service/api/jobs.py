@@ -0,0 +1,177 @@
+"""Очередь фоновых задач в таблице ``api_job`` без внешнего брокера.
+
+Представления с ``?async=true`` ставят задачу в очередь и сразу отвечают
+202; ``manage.py run_jobs`` забирает задачи по одной через
+``SELECT ... FOR UPDATE SKIP LOCKED`` и выполняет их пакетами по
+``JOB_BATCH_SIZE``. Каждый пакет — отдельная транзакция, в которой
+сохраняется и прогресс задачи, поэтому блокировки держатся недолго, а
+задача, чей воркер упал, продолжается другим воркером с последнего
+сохранённого пакета после истечения ``JOB_LEASE``.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from pull_requests.models import PullRequest
+from teams.models import Team
+from users.models import User
+
+from . import events
+from .assignments import create_pull_requests, reassign_open_reviews_batch
+from .bulk import create_teams
+from .models import Job
+from .rosters import roster_cache
+from .selection import workload
+from .serializers import TeamReadSerializer, UserTeamReadSerializer
+
+logger = logging.getLogger('api.jobs')
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Зарегистрировать функцию, выполняющую задачи типа ``kind``."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, params):
+    return Job.objects.create(kind=kind, params=params)
+
+
+def claim():
+    """Занять самую старую ожидающую задачу или задачу упавшего воркера."""
+    with transaction.atomic():
+        while True:
+            job = Job.objects.select_for_update(skip_locked=True).filter(
+                Q(status='QUEUED') | Q(status='RUNNING', locked_until__lt=now())
+            ).order_by('pk').first()
+            if job is None:
+                return None
+            if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+                _finish(job, 'FAILED', error='worker lost the job too many times')
+                continue
+            job.status = 'RUNNING'
+            job.attempts += 1
+            job.started_at = job.started_at or now()
+            job.locked_until = now() + timedelta(seconds=settings.JOB_LEASE)
+            job.save(update_fields=['status', 'attempts', 'started_at', 'locked_until'])
+            return job
+
+
+def checkpoint(job, **progress):
+    """Сохранить прогресс и продлить аренду в транзакции текущего пакета."""
+    job.progress.update(progress)
+    job.locked_until = now() + timedelta(seconds=settings.JOB_LEASE)
+    job.save(update_fields=['progress', 'locked_until'])
+
+
+def _finish(job, status, result=None, error=''):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.locked_until = None
+    job.finished_at = now()
+    job.save(update_fields=['status', 'progress', 'result', 'error',
+                            'locked_until', 'finished_at'])
+
+
+def run(job):
+    """Выполнить занятую задачу и записать результат или ошибку."""
+    try:
+        result = HANDLERS[job.kind](job)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        _finish(job, 'FAILED', error=f'{type(e).__name__}: {e}')
+    else:
+        _finish(job, 'SUCCEEDED', result=result)
+
+
+def _reassign(job, user_ids):
+    """Переназначить открытые PR пользователей пакетами по JOB_BATCH_SIZE."""
+    summary = job.progress.get(
+        'reassignment', {'reassigned': 0, 'short': 0, 'orphaned': 0})
+    while True:
+        with transaction.atomic():
+            batch, processed = reassign_open_reviews_batch(
+                user_ids, limit=settings.JOB_BATCH_SIZE)
+            if not processed:
+                return summary
+            for key, value in batch.items():
+                summary[key] += value
+            checkpoint(job, done=job.progress.get('done', 0) + processed,
+                       reassignment=summary)
+
+
+def _open_reviews(user_ids):
+    return PullRequest.objects.filter(
+        status='OPEN', assigned_reviewers__in=user_ids).distinct().count()
+
+
+@handler('team.deactivate')
+def deactivate_team(job):
+    team = Team.objects.get(team_name=job.params['team_name'])
+    with transaction.atomic():
+        members = dict(team.members.values_list('pk', 'is_active'))
+        team.members.update(is_active=False)
+        events.users_changed(
+            [pk for pk, is_active in members.items() if is_active], is_active=False)
+        roster_cache.invalidate(team_ids=[team.pk], team_names=[team.team_name])
+        checkpoint(job, total=job.progress.get('done', 0) + _open_reviews(list(members)))
+
+    reassignment = _reassign(job, list(members))
+    team_data = TeamReadSerializer.from_queryset(Team.objects.filter(pk=team.pk)).data[0]
+    return {'team': team_data, 'reassignment': reassignment}
+
+
+@handler('users.setIsActive')
+def set_user_active(job):
+    is_active = job.params['is_active']
+    with transaction.atomic():
+        user = User.objects.select_related('team').get(pk=job.params['user_id'])
+        if user.is_active != is_active:
+            events.users_changed([user.pk], is_active)
+            user.is_active = is_active
+            user.save(update_fields=['is_active'])
+        roster_cache.invalidate(team_ids=[user.team_id], team_names=[user.team.team_name])
+        checkpoint(job, total=0 if is_active else
+                   job.progress.get('done', 0) + _open_reviews([user.pk]))
+
+    data = {'user': UserTeamReadSerializer(UserTeamReadSerializer.row(user)).data}
+    if not is_active:
+        data['reassignment'] = _reassign(job, [user.pk])
+    if is_active:
+        workload.refresh(user.team_id, [user.pk])
+    else:
+        workload.forget([user.pk])
+    return data
+
+
+def _import(job, create):
+    """Импортировать ``params['items']`` пакетами, копя результаты в прогрессе."""
+    items = job.params['items']
+    results = job.progress.get('results', [])
+    while len(results) < len(items):
+        batch = items[len(results):len(results) + settings.JOB_BATCH_SIZE]
+        with transaction.atomic():
+            results = results + create(batch)
+            checkpoint(job, done=len(results), total=len(items), results=results)
+    # Готовые результаты переезжают из прогресса в результат задачи.
+    job.progress.pop('results', None)
+    return {'results': results}
+
+
+@handler('team.bulkAdd')
+def bulk_add_teams(job):
+    return _import(job, create_teams)
+
+
+@handler('pullRequest.bulkCreate')
+def bulk_create_pull_requests(job):
+    return _import(job, create_pull_requests)
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = 'Перенести в архив PR, смёрженные больше ARCHIVE_AFTER_DAYS дней назад'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='сколько дней смёрженный PR остаётся в горячих таблицах')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help='сколько PR переносить одной транзакцией')
+
+    def handle(self, *args, **options):
+        archived = archive.archive(now() - timedelta(days=options['older_than']),
+                                   options['batch_size'])
+        self.stdout.write(f'Archived {archived} pull requests')
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import events
+
+
+class Command(BaseCommand):
+    help = 'Удалить события журнала /api/events/ старше EVENTS_RETENTION секунд'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, default=settings.EVENTS_RETENTION,
+                            help='сколько секунд хранить события')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = events.prune(options['retention'], options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} events')
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удалить ключи идемпотентности старше IDEMPOTENCY_KEY_TTL секунд'
+
+    def handle(self, *args, **options):
+        deadline = now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=deadline).delete()
+        self.stdout.write(f'Deleted {deleted} idempotency keys')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счётчики статистики назначений с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        counters.rebuild(batch_size=options['batch_size'])
+        self.stdout.write('Review statistics rebuilt')
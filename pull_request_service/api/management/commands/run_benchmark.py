@@ -0,0 +1,239 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from pull_requests.models import PullRequest
+from teams.models import Team
+from users.models import User
+
+Reviewer = PullRequest.assigned_reviewers.through
+
+
+def _percentile(values, q):
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _host():
+    """Имя хоста из ALLOWED_HOSTS, с которым тестовый клиент пройдёт проверку."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class Scenarios:
+    """Запросы к каждому эндпоинту на данных, уже лежащих в базе."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        self.counter = 0
+        self.team_names = list(Team.objects.values_list('team_name', flat=True)[:1000])
+        self.user_ids = list(User.objects.filter(is_active=True).values_list('pk', flat=True)[:5000])
+        if not self.team_names or not self.user_ids:
+            raise CommandError('В базе нет данных: сначала выполните seed_benchmark')
+        self.review_links = list(Reviewer.objects.filter(
+            pullrequest__status='OPEN').values_list('pullrequest_id', 'user_id')[:5000])
+        self.rng.shuffle(self.review_links)
+        self.idle_users = list(User.objects.exclude(
+            review_assignments__status='OPEN').values_list('pk', flat=True)[:1000])
+        self.created_prs = []
+        self.created_teams = []
+
+    def name(self, kind):
+        self.counter += 1
+        return f'{self.prefix}-{kind}-{self.counter}'
+
+    def reads(self):
+        rng = self.rng
+        return {
+            'team/get': lambda: ('get', '/api/team/get/',
+                                 {'team_name': rng.choice(self.team_names)}),
+            'users/getReview': lambda: ('get', '/api/users/getReview/',
+                                        {'user_id': rng.choice(self.user_ids)}),
+            'statisticsUser': lambda: ('get', '/api/statisticsUser/', {'limit': 100}),
+            'statisticsPR': lambda: ('get', '/api/statisticsPR/', {'limit': 100}),
+            'statisticsCache': lambda: ('get', '/api/statisticsCache/', {}),
+            'metrics': lambda: ('get', '/api/metrics', {}),
+            'events': lambda: ('get', '/api/events/', {'limit': 100}),
+        }
+
+    def writes(self):
+        rng = self.rng
+
+        def create_pr():
+            name = self.name('pr')
+            self.created_prs.append(name)
+            return ('post', '/api/pullRequest/create/',
+                    {'pull_request_name': name, 'author_id': rng.choice(self.user_ids)})
+
+        def merge_pr():
+            pk = PullRequest.objects.filter(
+                pull_request_name=self.created_prs.pop()).values_list('pk', flat=True).first()
+            return 'post', '/api/pullRequest/merge/', {'pull_request_id': pk}
+
+        def reassign():
+            pull_request_id, user_id = self.review_links.pop()
+            return ('post', '/api/pullRequest/reassign/',
+                    {'pull_request_id': pull_request_id, 'old_user_id': user_id})
+
+        def add_team():
+            name = self.name('team')
+            self.created_teams.append(name)
+            return ('post', '/api/team/add/', {'team_name': name, 'members': [
+                {'username': f'{name}-{i}', 'is_active': True} for i in range(10)]})
+
+        def set_active():
+            return ('post', '/api/users/setIsActive/',
+                    {'user_id': rng.choice(self.user_ids), 'is_active': True})
+
+        def change_team():
+            return ('post', '/api/users/changeTeam/',
+                    {'user_id': rng.choice(self.idle_users),
+                     'team_name': rng.choice(self.team_names)})
+
+        scenarios = {
+            'users/setIsActive': set_active,
+            'users/changeTeam': change_team,
+            'pullRequest/create': create_pr,
+            'pullRequest/bulkCreate': lambda: ('post', '/api/pullRequest/bulkCreate/', {
+                'pull_requests': [{'pull_request_name': self.name('pr'),
+                                   'author_id': rng.choice(self.user_ids)}
+                                  for _ in range(10)]}),
+            'pullRequest/merge': merge_pr,
+            'pullRequest/reassign': reassign,
+            'team/add': add_team,
+            'team/bulkAdd': lambda: ('post', '/api/team/bulkAdd/', {'teams': [
+                {'team_name': name, 'members': [
+                    {'username': f'{name}-{i}', 'is_active': True} for i in range(10)]}
+                for name in (self.name('team') for _ in range(5))]}),
+            'team/deactivate': lambda: ('post', '/api/team/deactivate/',
+                                        {'team_name': self.created_teams.pop()}),
+        }
+        if not self.idle_users:
+            del scenarios['users/changeTeam']
+        return scenarios
+
+    def limit(self, endpoint, requests):
+        """Сколько запросов можно сделать, не исчерпав подготовленные данные."""
+        available = {
+            'pullRequest/merge': len(self.created_prs),
+            'pullRequest/reassign': len(self.review_links),
+            'team/deactivate': len(self.created_teams),
+        }
+        return min(requests, available.get(endpoint, requests))
+
+
+class Command(BaseCommand):
+    help = ('Прогнать каждый эндпоинт через тестовый клиент Django и вывести '
+            'пропускную способность, перцентили задержки и число SQL-запросов в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='запросов к каждому эндпоинту')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='неучитываемых запросов перед замером')
+        parser.add_argument('--read-only', action='store_true',
+                            help='только читающие эндпоинты, без изменения данных')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', default=None,
+                            help='файл для JSON-отчёта; по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        client = Client(SERVER_NAME=_host())
+        dataset = {
+            'teams': Team.objects.count(),
+            'users': User.objects.count(),
+            'pull_requests': PullRequest.objects.count(),
+            'review_links': Reviewer.objects.count(),
+        }
+        scenarios = Scenarios(random.Random(options['seed']))
+
+        plan = list(scenarios.reads().items())
+        if not options['read_only']:
+            plan.extend(scenarios.writes().items())
+
+        endpoints = {}
+        for endpoint, build in plan:
+            for _ in range(scenarios.limit(endpoint, options['warmup'])):
+                self.request(client, build)
+            endpoints[endpoint] = self.measure(
+                client, build, scenarios.limit(endpoint, options['requests']))
+
+        report = {
+            'commit': _commit(),
+            'database': connection.vendor,
+            'dataset': dataset,
+            'endpoints': endpoints,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def request(client, build):
+        """Выполнить запрос; вернуть статус, время и число SQL-запросов."""
+        method, path, data = build()
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            if method == 'get':
+                response = client.get(path, data)
+            else:
+                response = client.post(path, json.dumps(data),
+                                       content_type='application/json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, queries
+
+    def measure(self, client, build, requests):
+        latencies, queries, statuses = [], [], {}
+        started = time.perf_counter()
+        for _ in range(requests):
+            status, elapsed, count = self.request(client, build)
+            latencies.append(elapsed)
+            queries.append(count)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        total = time.perf_counter() - started
+        if not latencies:
+            return {'requests': 0}
+
+        latencies.sort()
+        return {
+            'requests': requests,
+            'statuses': statuses,
+            'rps': round(requests / total, 1),
+            'p50_ms': _percentile(latencies, 0.50),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+            'queries': {'min': min(queries), 'max': max(queries),
+                        'mean': round(statistics.mean(queries), 2)},
+        }
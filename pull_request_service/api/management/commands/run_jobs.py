@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Выполнять фоновые задачи из очереди api_job'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='выполнить задачи, уже стоящие в очереди, и выйти')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='выйти после стольких задач')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='пауза в секундах, когда очередь пуста')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while options['max_jobs'] is None or processed < options['max_jobs']:
+            job = jobs.claim()
+            if job is None:
+                if options['once']:
+                    break
+                # Как после запроса: закрыть соединение, если оно сломано
+                # или старше CONN_MAX_AGE.
+                close_old_connections()
+                time.sleep(options['poll_interval'])
+                continue
+            jobs.run(job)
+            processed += 1
+            self.stdout.write(f'Job {job.pk} ({job.kind}): {job.status}')
+        self.stdout.write(f'Processed {processed} jobs')
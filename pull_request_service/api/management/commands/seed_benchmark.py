@@ -0,0 +1,105 @@
+import random
+import uuid
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+
+from api import counters
+from api.versions import versions
+from pull_requests.models import PullRequest
+from teams.models import Team
+from users.models import User
+
+Reviewer = PullRequest.assigned_reviewers.through
+
+
+def _insert(model, objs, batch_size):
+    objs = iter(objs)
+    total = 0
+    while batch := list(islice(objs, batch_size)):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Сгенерировать синтетические команды, пользователей, PR и назначения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=100)
+        parser.add_argument('--members', type=int, default=10,
+                            help='участников в каждой команде')
+        parser.add_argument('--prs', type=int, default=10000)
+        parser.add_argument('--reviewers', type=int, default=2,
+                            help='ревьюверов на PR (не больше, чем есть в команде)')
+        parser.add_argument('--merged', type=float, default=0.5,
+                            help='доля PR в статусе MERGED')
+        parser.add_argument('--inactive', type=float, default=0.05,
+                            help='доля неактивных пользователей')
+        parser.add_argument('--prefix', default=None,
+                            help='префикс имён; по умолчанию выводится из --seed')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='зерно генератора для воспроизводимых данных')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix'] or uuid.UUID(int=rng.getrandbits(128)).hex[:8]
+        batch_size = options['batch_size']
+
+        if Team.objects.filter(team_name__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Данные с префиксом {prefix} уже есть: '
+                               f'укажите другой --prefix или --seed')
+
+        # bulk_create на SQLite не возвращает первичные ключи, поэтому
+        # созданные строки перечитываются по префиксу имени.
+        with transaction.atomic():
+            teams = _insert(Team, (
+                Team(team_name=f'{prefix}-team-{i}') for i in range(options['teams'])
+            ), batch_size)
+            team_ids = list(Team.objects.filter(
+                team_name__startswith=f'{prefix}-team-').order_by('pk').values_list('pk', flat=True))
+
+            users = _insert(User, (
+                User(username=f'{prefix}-user-{team_id}-{j}', team_id=team_id,
+                     is_active=rng.random() >= options['inactive'])
+                for team_id in team_ids for j in range(options['members'])
+            ), batch_size)
+            members = {}
+            user_teams = {}
+            for pk, team_id, is_active in User.objects.filter(
+                    team_id__in=team_ids).order_by('pk').values_list('pk', 'team_id', 'is_active'):
+                members.setdefault(team_id, []).append((pk, is_active))
+                user_teams[pk] = team_id
+            authors = list(user_teams)
+
+            def pull_requests():
+                for i in range(options['prs'] if authors else 0):
+                    author_id = rng.choice(authors)
+                    merged = rng.random() < options['merged']
+                    yield PullRequest(pull_request_name=f'{prefix}-pr-{i}', author_id=author_id,
+                                      status='MERGED' if merged else 'OPEN',
+                                      merged_at=seeded_at if merged else None)
+
+            seeded_at = now()
+            prs = _insert(PullRequest, pull_requests(), batch_size)
+
+            def links():
+                for pr_id, author_id in PullRequest.objects.filter(
+                        pull_request_name__startswith=f'{prefix}-pr-'
+                ).order_by('pk').values_list('pk', 'author_id').iterator():
+                    candidates = [pk for pk, is_active in members[user_teams[author_id]]
+                                  if is_active and pk != author_id]
+                    for user_id in rng.sample(
+                            candidates, min(options['reviewers'], len(candidates))):
+                        yield Reviewer(pullrequest_id=pr_id, user_id=user_id)
+
+            review_links = _insert(Reviewer, links(), batch_size)
+            counters.rebuild(batch_size=batch_size)
+            versions.bump('stats')
+
+        self.stdout.write(
+            f'Seeded {teams} teams, {users} users, {prs} pull requests and '
+            f'{review_links} review links with prefix {prefix}')
@@ -0,0 +1,297 @@
+"""Метрики запросов в формате Prometheus.
+
+Для каждого маршрута (``pullRequest/create``, ``statisticsUser`` …) процесс
+накапливает гистограммы задержки, числа SQL-запросов, времени в БД, времени
+рендеринга ответа и размера ответа. Запросы к БД считает обёртка
+``execute_wrapper``, которую сигнал ``connection_created`` ставит на каждое
+соединение; текущий запрос она находит через contextvar, поэтому учитываются
+и запросы из потоков ``sync_to_async``.
+
+Реестр у каждого процесса свой. Чтобы при нескольких воркерах gunicorn
+счётчики не зависели от того, какой воркер ответил на сбор метрик, воркеры
+сохраняют снимки реестра в общий каталог ``METRICS_MULTIPROC_DIR``
+(``SnapshotFiles``), а ``/api/metrics`` суммирует снимки всех воркеров.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+logger = logging.getLogger(__name__)
+
+_ROUTE_NOISE = re.compile(r'\^|\$|\\\.\(\?P<format>[^)]*\)/\?|/\?$')
+
+
+def route_name(resolver_match):
+    """Маршрут запроса без префикса ``api/`` и служебных символов регулярок."""
+    if resolver_match is None:
+        return 'unmatched'
+    route = _ROUTE_NOISE.sub('', resolver_match.route or '')
+    if route.startswith('api/'):
+        route = route[len('api/'):]
+    return route.strip('/') or resolver_match.url_name or 'root'
+
+
+class RequestStats:
+    """Счётчики одного запроса, которые пополняет обёртка над курсором."""
+
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = None
+        self.sql = [] if capture_sql else None
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.sql is not None:
+            self.sql.append((duration, sql))
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def start_request(capture_sql=False):
+    stats = RequestStats(capture_sql)
+    return stats, _current.set(stats)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_request():
+    """Статистика обрабатываемого запроса или ``None`` вне запроса."""
+    return _current.get()
+
+
+def record_queries(execute, sql, params, many, context):
+    """``execute_wrapper``: учесть запрос в статистике текущего HTTP-запроса."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Обработчик ``connection_created``."""
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+METRICS = (
+    # имя, тип, описание, границы корзин
+    ('api_requests_total', 'counter', 'Обработанные запросы.', None),
+    ('api_request_duration_seconds', 'histogram',
+     'Время обработки запроса.', LATENCY_BUCKETS),
+    ('api_db_queries', 'histogram', 'SQL-запросов на один запрос.', QUERY_BUCKETS),
+    ('api_db_duration_seconds', 'histogram',
+     'Время выполнения SQL за запрос.', LATENCY_BUCKETS),
+    ('api_render_duration_seconds', 'histogram',
+     'Время рендеринга ответа DRF.', LATENCY_BUCKETS),
+    ('api_response_size_bytes', 'histogram', 'Размер тела ответа.', SIZE_BUCKETS),
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Потокобезопасное хранилище метрик одного процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._requests = {}
+            self._histograms = {name: {} for name, kind, _, _ in METRICS
+                                if kind == 'histogram'}
+
+    def _observe(self, name, route, value):
+        buckets = next(b for metric, _, _, b in METRICS if metric == name)
+        histogram = self._histograms[name].get(route)
+        if histogram is None:
+            histogram = self._histograms[name][route] = Histogram(buckets)
+        histogram.observe(value)
+
+    def observe_request(self, route, method, status, duration, stats, size=None):
+        with self._lock:
+            key = (route, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._observe('api_request_duration_seconds', route, duration)
+            self._observe('api_db_queries', route, stats.queries)
+            self._observe('api_db_duration_seconds', route, stats.db_time)
+            if stats.render_time is not None:
+                self._observe('api_render_duration_seconds', route, stats.render_time)
+            if size is not None:
+                self._observe('api_response_size_bytes', route, size)
+
+    def observe_size(self, route, size):
+        """Размер потокового ответа, известный только после его отправки."""
+        with self._lock:
+            self._observe('api_response_size_bytes', route, size)
+
+    def snapshot(self):
+        """Состояние реестра в виде, пригодном для JSON и ``merge``."""
+        with self._lock:
+            return {
+                'requests': [[*key, value] for key, value in self._requests.items()],
+                'histograms': {
+                    name: {route: {'counts': list(histogram.counts), 'sum': histogram.sum}
+                           for route, histogram in histograms.items()}
+                    for name, histograms in self._histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        """Прибавить к реестру снимок другого процесса."""
+        with self._lock:
+            for route, method, status, value in snapshot['requests']:
+                key = (route, method, status)
+                self._requests[key] = self._requests.get(key, 0) + value
+            for name, histograms in snapshot['histograms'].items():
+                buckets = next(b for metric, _, _, b in METRICS if metric == name)
+                for route, data in histograms.items():
+                    histogram = self._histograms[name].get(route)
+                    if histogram is None:
+                        histogram = self._histograms[name][route] = Histogram(buckets)
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, data['counts'])]
+                    histogram.sum += data['sum']
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+        lines = []
+        with self._lock:
+            for name, kind, description, _ in METRICS:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind == 'counter':
+                    for (route, method, status), value in sorted(self._requests.items()):
+                        labels = _labels((('route', route), ('method', method),
+                                          ('status', status)))
+                        lines.append(f'{name}{labels} {value}')
+                    continue
+                for route, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    bounds = [*map(_number, histogram.buckets), '+Inf']
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        labels = _labels((('route', route), ('le', bound)))
+                        lines.append(f'{name}_bucket{labels} {cumulative}')
+                    labels = _labels((('route', route),))
+                    lines.append(f'{name}_sum{labels} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{labels} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class SnapshotFiles:
+    """Снимки реестра процесса в каталоге, общем для воркеров.
+
+    Каждый процесс пишет свой файл не чаще раза в ``interval`` секунд после
+    очередного запроса; файлы завершившихся воркеров остаются, поэтому
+    суммы не убывают. Каталог очищает ``gunicorn.conf.py`` при старте.
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._timer = None
+        self._name = None
+        self._pid = None
+
+    def _path(self, directory):
+        # Имя выбирается в самом процессе: воркер, перезапущенный с тем же
+        # pid, не перезапишет снимок предшественника.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._name = f'{self._pid}-{uuid.uuid4().hex[:8]}{self.SUFFIX}'
+        return os.path.join(directory, self._name)
+
+    def write(self, directory):
+        path = self._path(directory)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.registry.snapshot(), file)
+        os.replace(temporary, path)
+
+    def schedule(self, directory, interval):
+        """Записать снимок через ``interval`` секунд, если запись ещё не ждёт."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(interval, self._flush, (directory,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _flush(self, directory):
+        with self._lock:
+            self._timer = None
+        try:
+            self.write(directory)
+        except OSError:
+            logger.exception('Cannot write metrics snapshot to %s', directory)
+
+    def collect(self, directory):
+        """Реестр с суммой снимков всех процессов, включая свежий свой."""
+        self.cancel()
+        self.write(directory)
+        total = MetricsRegistry()
+        for name in os.listdir(directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as file:
+                    total.merge(json.load(file))
+            except FileNotFoundError:
+                continue
+        return total
+
+
+files = SnapshotFiles(registry)
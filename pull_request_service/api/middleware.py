@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics, replicas
+
+slow_requests = logging.getLogger('api.slow_requests')
+
+
+def publish():
+    """Отложенно сохранить снимок метрик для соседних воркеров."""
+    if settings.METRICS_MULTIPROC_DIR:
+        metrics.files.schedule(settings.METRICS_MULTIPROC_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+
+class MetricsMiddleware:
+    """Записывает метрики запроса в ``metrics.registry``.
+
+    Работает и в синхронном, и в асинхронном стеке без перехода в поток:
+    статистика запроса живёт в contextvar. Время рендеринга ответа DRF
+    измеряется хуками ``process_template_response``/post-render callback.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознаёт асинхронное middleware (см. MiddlewareMixin).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        stats, token = metrics.start_request(capture_sql=self.slow_threshold is not None)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        stats, token = metrics.start_request(capture_sql=self.slow_threshold is not None)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def process_template_response(self, request, response):
+        stats = metrics.current_request()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time = time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    @property
+    def slow_threshold(self):
+        threshold = settings.METRICS_SLOW_REQUEST_MS
+        return threshold / 1000 if threshold > 0 else None
+
+    def record(self, request, response, stats, duration):
+        route = metrics.route_name(getattr(request, 'resolver_match', None))
+        size = None
+        if response.streaming:
+            response.streaming_content = self.count_bytes(
+                route, response.streaming_content)
+        else:
+            size = len(response.content)
+        metrics.registry.observe_request(
+            route, request.method, response.status_code, duration, stats, size)
+        publish()
+
+        threshold = self.slow_threshold
+        if threshold is not None and duration >= threshold:
+            statements = ''.join(
+                f'\n  [{elapsed * 1000:.1f} ms] {sql}' for elapsed, sql in stats.sql)
+            slow_requests.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in DB%s',
+                request.method, request.get_full_path(), route, duration * 1000,
+                stats.queries, stats.db_time * 1000, statements)
+
+    @staticmethod
+    def count_bytes(route, content):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.registry.observe_size(route, size)
+            publish()
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """После успешной записи отправляет клиенту куку, с которой его чтения
+    ``REPLICA_STICKY_SECONDS`` секунд идут в основную базу, а не в
+    реплику, ещё не получившую эту запись."""
+
+    def process_response(self, request, response):
+        if (settings.REPLICA_DATABASE and request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and response.status_code < 400):
+            response.set_cookie(replicas.STICKY_COOKIE, '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
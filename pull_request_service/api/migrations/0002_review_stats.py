@@ -0,0 +1,54 @@
+# Generated by Django 3.2 on 2026-10-18 14:58
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def fill_review_stats(apps, schema_editor):
+    PullRequest = apps.get_model('pull_requests', 'PullRequest')
+    UserReviewStats = apps.get_model('api', 'UserReviewStats')
+    PullRequestReviewStats = apps.get_model('api', 'PullRequestReviewStats')
+    links = PullRequest.assigned_reviewers.through.objects.order_by()
+
+    UserReviewStats.objects.bulk_create([
+        UserReviewStats(user_id=row['user_id'],
+                        assignments_count=row['total'],
+                        open_assignments_count=row['open'])
+        for row in links.values('user_id').annotate(
+            total=Count('pk'),
+            open=Count('pk', filter=Q(pullrequest__status='OPEN')))
+    ], batch_size=5000)
+    PullRequestReviewStats.objects.bulk_create([
+        PullRequestReviewStats(pull_request_id=row['pullrequest_id'],
+                               reviewers_count=row['total'])
+        for row in links.values('pullrequest_id').annotate(total=Count('pk'))
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_team_active_idx'),
+        ('pull_requests', '0003_reviewer_user_idx'),
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PullRequestReviewStats',
+            fields=[
+                ('pull_request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='pull_requests.pullrequest', verbose_name='Pull Request')),
+                ('reviewers_count', models.PositiveIntegerField(default=0, verbose_name='Количество ревьюверов')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserReviewStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='users.user', verbose_name='Пользователь')),
+                ('assignments_count', models.PositiveIntegerField(default=0, verbose_name='Всего назначений')),
+                ('open_assignments_count', models.PositiveIntegerField(default=0, verbose_name='Назначений на открытые PR')),
+            ],
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-18 15:38
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_review_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=64, verbose_name='Тип')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='QUEUED', max_length=9, verbose_name='Статус')),
+                ('params', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Параметры')),
+                ('progress', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Прогресс')),
+                ('result', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Результат')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('locked_until', models.DateTimeField(null=True, verbose_name='Занята воркером до')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время создания')),
+                ('started_at', models.DateTimeField(null=True, verbose_name='Начало выполнения')),
+                ('finished_at', models.DateTimeField(null=True, verbose_name='Завершение')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(status__in=['QUEUED', 'RUNNING']), fields=['id'], name='job_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userreviewstats',
+            name='archived_assignments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Назначений на PR в архиве'),
+        ),
+    ]
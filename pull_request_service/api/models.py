@@ -0,0 +1,136 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from pull_requests.models import PullRequest
+from users.models import User
+
+
+class IdempotencyKey(models.Model):
+    """Сохранённый ответ на запрос с заголовком Idempotency-Key."""
+
+    key = models.CharField(max_length=255, verbose_name="Ключ")
+    route = models.CharField(max_length=64, verbose_name="Действие")
+    request_hash = models.CharField(
+        max_length=64, blank=True, default='', verbose_name="Хэш запроса")
+    status_code = models.PositiveSmallIntegerField(verbose_name="Код ответа")
+    response = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Тело ответа")
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Дата и время создания"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['route', 'key'],
+                                    name='idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.route}:{self.key}'
+
+
+class UserReviewStats(models.Model):
+    """Счётчики назначений пользователя ревьювером."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='review_stats',
+        verbose_name="Пользователь"
+    )
+    assignments_count = models.PositiveIntegerField(
+        default=0, verbose_name="Всего назначений")
+    open_assignments_count = models.PositiveIntegerField(
+        default=0, verbose_name="Назначений на открытые PR")
+    archived_assignments_count = models.PositiveIntegerField(
+        default=0, verbose_name="Назначений на PR в архиве")
+
+    def __str__(self):
+        return f'{self.user_id}: {self.assignments_count}'
+
+
+class PullRequestReviewStats(models.Model):
+    """Счётчик ревьюверов pull request'а."""
+
+    pull_request = models.OneToOneField(
+        PullRequest,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='review_stats',
+        verbose_name="Pull Request"
+    )
+    reviewers_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество ревьюверов")
+
+    def __str__(self):
+        return f'{self.pull_request_id}: {self.reviewers_count}'
+
+
+class ReviewEvent(models.Model):
+    """Событие изменения назначений ревьюверов для ``/api/events/``."""
+
+    kind = models.CharField(max_length=32, verbose_name="Тип")
+    txid = models.BigIntegerField(default=0, verbose_name="Транзакция")
+    data = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Данные")
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Дата и время создания"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='review_event_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.pk}: {self.kind}'
+
+
+JOB_STATUS_CHOICES = (
+    ('QUEUED', 'Queued'),
+    ('RUNNING', 'Running'),
+    ('SUCCEEDED', 'Succeeded'),
+    ('FAILED', 'Failed'),
+)
+
+
+class Job(models.Model):
+    """Фоновая задача, которую выполняет ``manage.py run_jobs``."""
+
+    kind = models.CharField(max_length=64, verbose_name="Тип")
+    status = models.CharField(
+        max_length=9,
+        choices=JOB_STATUS_CHOICES,
+        default='QUEUED',
+        verbose_name="Статус"
+    )
+    params = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Параметры")
+    progress = models.JSONField(
+        encoder=DjangoJSONEncoder, default=dict, verbose_name="Прогресс")
+    result = models.JSONField(
+        encoder=DjangoJSONEncoder, null=True, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попытки")
+    locked_until = models.DateTimeField(
+        null=True, verbose_name="Занята воркером до")
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата и время создания"
+    )
+    started_at = models.DateTimeField(null=True, verbose_name="Начало выполнения")
+    finished_at = models.DateTimeField(null=True, verbose_name="Завершение")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(status__in=['QUEUED', 'RUNNING']),
+                name='job_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.pk}: {self.kind} ({self.status})'
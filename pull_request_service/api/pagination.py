@@ -0,0 +1,43 @@
+import base64
+
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор в пару (created_at, pk), ValueError при ошибке."""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('invalid cursor') from e
+    if created_at is None:
+        raise ValueError('invalid cursor')
+    return created_at, pk
+
+
+def parse_limit(value, default, maximum):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError as e:
+        raise ValueError('limit must be an integer') from e
+    if not 0 < limit <= maximum:
+        raise ValueError(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def parse_after(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ValueError('after must be an integer') from e
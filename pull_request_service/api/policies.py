@@ -0,0 +1,159 @@
+"""Правила назначения ревьюверов по командам (``teams.ReviewPolicy``).
+
+``policy_engine.plans`` собирает для команд авторов план назначения:
+число ревьюверов, участников команды, общий резервный пул из активных
+участников резервных команд и последних назначенных ревьюверов. Правила
+команд кэшируются в ROSTER_CACHE_ALIAS (``policy:<team_id>``), пулы берутся
+из кэша составов, а последние ревьюверы хранятся в кэше
+(``recent:<team_id>``), поэтому с тёплым кэшем план не стоит ни одного
+запроса, а с холодным — не больше двух, сколько бы команд и правил ни
+участвовало. Кэш правил сбрасывают обработчики сигналов ``api.signals``
+при изменении правил команды; смена составов команд сбрасывает кэш
+составов, из которого пулы читаются при каждом плане.
+"""
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from teams.models import ReviewPolicy
+
+from .rosters import roster_cache
+from .selection import get_reviewer_strategy
+
+
+class Policy(NamedTuple):
+    reviewers_count: int = 2
+    fallback_team_ids: tuple = ()
+    exclude_recent: int = 0
+
+
+DEFAULT_POLICY = Policy()
+
+
+class Plan:
+    """План назначения для одной команды на время одного запроса."""
+
+    __slots__ = ('team_id', 'policy', 'members', 'fallback', 'recent')
+
+    def __init__(self, team_id, policy, members, fallback, recent):
+        self.team_id = team_id
+        self.policy = policy
+        self.members = members
+        self.fallback = fallback
+        self.recent = recent
+
+
+def _policy_key(team_id):
+    return f'policy:{team_id}'
+
+
+def _recent_key(team_id):
+    return f'recent:{team_id}'
+
+
+class PolicyEngine:
+    @property
+    def cache(self):
+        return caches[settings.ROSTER_CACHE_ALIAS]
+
+    def policies(self, team_ids):
+        """Правила команд: {team_id: Policy}, промахи — одним запросом."""
+        team_ids = set(team_ids)
+        keys = {_policy_key(team_id): team_id for team_id in team_ids}
+        policies = {keys[key]: Policy(*value)
+                    for key, value in self.cache.get_many(keys).items()}
+
+        missing = team_ids - policies.keys()
+        if missing:
+            loaded = dict.fromkeys(missing, DEFAULT_POLICY)
+            fallbacks = {}
+            for team_id, count, exclude_recent, fallback_id in ReviewPolicy.objects.filter(
+                    pk__in=missing
+            ).order_by('pk', 'fallback_teams').values_list(
+                    'pk', 'reviewers_count', 'exclude_recent', 'fallback_teams'):
+                loaded[team_id] = Policy(count, (), exclude_recent)
+                if fallback_id is not None:
+                    fallbacks.setdefault(team_id, []).append(fallback_id)
+            for team_id, fallback_ids in fallbacks.items():
+                loaded[team_id] = loaded[team_id]._replace(fallback_team_ids=tuple(fallback_ids))
+            self.cache.set_many(
+                {_policy_key(team_id): tuple(policy) for team_id, policy in loaded.items()},
+                settings.ROSTER_CACHE_TTL)
+            policies.update(loaded)
+        return policies
+
+    def plans(self, team_ids, exclude=()):
+        """Планы назначения для команд авторов: {team_id: Plan}.
+
+        ``exclude`` — пользователи, которых нельзя назначать ни в одном
+        плане (например, деактивируемые).
+        """
+        policies = self.policies(team_ids)
+        pool_team_ids = set(policies)
+        for policy in policies.values():
+            pool_team_ids.update(policy.fallback_team_ids)
+        rosters = roster_cache.members(pool_team_ids, exclude=exclude)
+
+        tracked = [team_id for team_id, policy in policies.items() if policy.exclude_recent]
+        recent = self.cache.get_many([_recent_key(team_id) for team_id in tracked])
+
+        prepare = getattr(get_reviewer_strategy(), 'prepare', None)
+        if prepare is not None:
+            prepare(pool_team_ids)
+
+        plans = {}
+        for team_id, policy in policies.items():
+            fallback = []
+            for fallback_id in policy.fallback_team_ids:
+                if fallback_id != team_id:
+                    fallback.extend(rosters[fallback_id])
+            plans[team_id] = Plan(team_id, policy, rosters[team_id], fallback,
+                                  list(recent.get(_recent_key(team_id), [])))
+        return plans
+
+    def choose(self, plan, exclude=(), k=None, pending=None):
+        """Выбрать ``k`` ревьюверов (по умолчанию — число из правил).
+
+        Сначала берутся участники команды, затем резервный пул; в каждом
+        из них недавно назначенные ревьюверы идут последними, только если
+        остальных не хватает.
+        """
+        if k is None:
+            k = plan.policy.reviewers_count
+        exclude = set(exclude)
+        recent = set(plan.recent)
+        strategy = get_reviewer_strategy()
+        chosen = []
+        for pool in (plan.members, plan.fallback):
+            for is_recent in (False, True):
+                if len(chosen) >= k:
+                    break
+                candidates = [member_id for member_id in pool
+                              if member_id not in exclude
+                              and (member_id in recent) is is_recent]
+                picked = strategy.choose(plan.team_id, candidates, k - len(chosen), pending)
+                chosen.extend(picked)
+                exclude.update(picked)
+
+        if plan.policy.exclude_recent:
+            plan.recent = (plan.recent + chosen)[-plan.policy.exclude_recent:]
+        return chosen
+
+    def remember(self, plans):
+        """Сохранить последних назначенных ревьюверов команд из планов."""
+        self.cache.set_many(
+            {_recent_key(plan.team_id): plan.recent
+             for plan in plans if plan.policy.exclude_recent},
+            settings.ROSTER_CACHE_TTL)
+
+    def invalidate(self, team_ids):
+        keys = [_policy_key(team_id) for team_id in team_ids]
+        if not keys:
+            return
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+
+policy_engine = PolicyEngine()
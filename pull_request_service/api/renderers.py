@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же побайтовым выводом.
+
+    Без orjson, с отступами (``; indent=4``, browsable API) и для данных,
+    которые orjson не принимает (нестроковые ключи, целые больше 64 бит),
+    рендеринг выполняет стандартный JSONRenderer. Даты и прочие типы вне
+    JSON сериализует тот же ``encoder_class``, что и в DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=self.encoder_class().default,
+                                   option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранируем U+2028 и U+2029.
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class StreamingRenderer(BaseRenderer):
+    """Рендерер, умеющий отдавать строки по одной без сборки ответа в памяти."""
+
+    def stream(self, rows, fields):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = [data]
+        fields = list(data[0]) if data else []
+        return ''.join(self.stream(data, fields)).encode(self.charset)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def stream(self, rows, fields):
+        default = DjangoJSONEncoder().default
+        for row in rows:
+            if orjson is not None:
+                try:
+                    yield orjson.dumps(row, default=default, option=(
+                        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE)).decode()
+                    continue
+                except orjson.JSONEncodeError:
+                    pass
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False,
+                             separators=(',', ':')) + '\n'
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def stream(self, rows, fields):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Server-Sent Events; ``event`` форматирует одно событие потока.
+
+    Ответы без потока (ошибки) отдаются одним событием ``error``.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def event(self, data, event=None, event_id=None):
+        lines = []
+        if event_id is not None:
+            lines.append(f'id: {event_id}')
+        if event is not None:
+            lines.append(f'event: {event}')
+        lines.append('data: ' + FastJSONRenderer().render(data).decode())
+        return '\n'.join(lines) + '\n\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.event(data, event='error').encode(self.charset)
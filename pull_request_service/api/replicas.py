@@ -0,0 +1,128 @@
+"""Чтение с реплики БД для читающих эндпоинтов.
+
+Представления с ``read_replica`` выполняют запросы на чтение через
+``ReplicaRouter`` на базе ``REPLICA_DATABASE``; остальные запросы и все
+записи идут в ``default``. Клиент, только что изменивший данные, читает
+с основной базы, пока жива кука ``read_primary`` из ответа на запись (или
+если сам передаёт заголовок ``X-Read-Primary``). Реплика с отставанием
+больше ``REPLICA_MAX_LAG`` секунд или недоступная пропускается, пока
+следующий замер не покажет, что она догнала основную базу.
+"""
+import contextvars
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.request import Request
+
+logger = logging.getLogger('api.replicas')
+
+STICKY_COOKIE = 'read_primary'
+STICKY_HEADER = 'X-Read-Primary'
+
+_alias = contextvars.ContextVar('replica_alias', default=None)
+
+_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+             OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+
+class ReplicaLag:
+    """Отставание реплики, замеряемое не чаще REPLICA_LAG_CHECK_INTERVAL.
+
+    Недоступная реплика считается бесконечно отстающей.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._measured = {}
+
+    def measure(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            logger.warning('Replica %s is unavailable', alias, exc_info=True)
+            return float('inf')
+        return float(lag or 0)
+
+    def get(self, alias):
+        measured_at, lag = self._measured.get(alias, (None, None))
+        interval = settings.REPLICA_LAG_CHECK_INTERVAL
+        if measured_at is None or time.monotonic() - measured_at >= interval:
+            lag = self.measure(alias)
+            with self._lock:
+                self._measured[alias] = (time.monotonic(), lag)
+        return lag
+
+    def clear(self):
+        with self._lock:
+            self._measured.clear()
+
+
+lag = ReplicaLag()
+
+
+def current():
+    """Алиас реплики, с которой читает текущее представление, или ``None``."""
+    return _alias.get()
+
+
+def may_lag(modified):
+    """Могла ли реплика текущего запроса ещё не получить изменение,
+    сделанное в момент ``modified`` (секунды эпохи)."""
+    if current() is None:
+        return False
+    window = settings.REPLICA_MAX_LAG + settings.REPLICA_LAG_CHECK_INTERVAL
+    return time.time() - modified < window
+
+
+def choose(request):
+    """Реплика для запроса или ``None``, если читать нужно с основной базы."""
+    alias = settings.REPLICA_DATABASE
+    if not alias:
+        return None
+    if request.COOKIES.get(STICKY_COOKIE) or request.headers.get(STICKY_HEADER):
+        return None
+    if lag.get(alias) > settings.REPLICA_MAX_LAG:
+        return None
+    return alias
+
+
+def read_replica(view):
+    """Выполнять запросы на чтение представления на реплике, если можно."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        token = _alias.set(choose(request))
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _alias.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схему реплики создаёт репликация с основной базы.
+        return db != settings.REPLICA_DATABASE
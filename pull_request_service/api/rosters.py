@@ -0,0 +1,108 @@
+"""Кэш составов команд.
+
+Хранит идентификаторы активных участников (``roster:<team_id>``) и
+сериализованные команды (``team:<hash>``) в кэше ROSTER_CACHE_ALIAS.
+Пути записи сбрасывают записи сразу и ещё раз после коммита, чтобы
+конкурентный запрос не успел закэшировать состав до фиксации транзакции,
+и меняют версии команд и статистики для условных запросов.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from users.models import User
+
+from .versions import team_scope, versions
+
+
+def _roster_key(team_id):
+    return f'roster:{team_id}'
+
+
+def _team_key(team_name):
+    return 'team:' + hashlib.sha1(team_name.encode()).hexdigest()
+
+
+class RosterCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.reset_stats()
+
+    @property
+    def cache(self):
+        return caches[settings.ROSTER_CACHE_ALIAS]
+
+    def _record(self, kind, hits, misses):
+        with self._lock:
+            self._stats[kind]['hits'] += hits
+            self._stats[kind]['misses'] += misses
+
+    def members(self, team_ids, exclude=()):
+        """Активные участники команд в порядке pk: {team_id: [user_id, ...]}."""
+        team_ids = set(team_ids)
+        keys = {_roster_key(team_id): team_id for team_id in team_ids}
+        found = self.cache.get_many(keys)
+        rosters = {keys[key]: members for key, members in found.items()}
+
+        missing = team_ids - rosters.keys()
+        self._record('rosters', len(rosters), len(missing))
+        if missing:
+            loaded = {team_id: [] for team_id in missing}
+            for team_id, member_id in User.objects.filter(
+                    team_id__in=missing, is_active=True
+            ).order_by('pk').values_list('team_id', 'pk'):
+                loaded[team_id].append(member_id)
+            self.cache.set_many(
+                {_roster_key(team_id): members for team_id, members in loaded.items()},
+                settings.ROSTER_CACHE_TTL)
+            rosters.update(loaded)
+
+        if exclude:
+            exclude = set(exclude)
+            rosters = {team_id: [member_id for member_id in members
+                                 if member_id not in exclude]
+                       for team_id, members in rosters.items()}
+        return rosters
+
+    def team(self, team_name, build, store=True):
+        """Сериализованная команда; ``build`` вызывается при промахе.
+
+        Результат ``None`` (команда не найдена) и результат при
+        ``store=False`` не кэшируются.
+        """
+        key = _team_key(team_name)
+        payload = self.cache.get(key)
+        if payload is not None:
+            self._record('teams', 1, 0)
+            return payload
+
+        self._record('teams', 0, 1)
+        payload = build()
+        if payload is not None and store:
+            self.cache.set(key, payload, settings.ROSTER_CACHE_TTL)
+        return payload
+
+    def invalidate(self, team_ids=(), team_names=()):
+        keys = ([_roster_key(team_id) for team_id in team_ids]
+                + [_team_key(team_name) for team_name in team_names])
+        if not keys:
+            return
+        self.cache.delete_many(keys)
+        versions.bump('stats', *(team_scope(team_name) for team_name in team_names))
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+    def stats(self):
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {kind: {'hits': 0, 'misses': 0}
+                           for kind in ('rosters', 'teams')}
+
+
+roster_cache = RosterCache()
@@ -0,0 +1,119 @@
+import heapq
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from users.models import User
+
+
+class WorkloadIndex:
+    """Число открытых ревью на каждого участника, загружаемое покомандно.
+
+    Команда загружается из счётчиков статистики при первом обращении и
+    перечитывается по истечении REVIEWER_WORKLOAD_TTL, между загрузками
+    счётчики поддерживаются инкрементально путями записи.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._loaded_at = {}
+
+    def load(self, team_ids):
+        deadline = time.monotonic() - settings.REVIEWER_WORKLOAD_TTL
+        stale = {team_id for team_id in team_ids
+                 if self._loaded_at.get(team_id, deadline) <= deadline}
+        if not stale:
+            return
+
+        rows = User.objects.filter(team_id__in=stale).values_list(
+            'pk', Coalesce('review_stats__open_assignments_count', 0))
+
+        loaded_at = time.monotonic()
+        with self._lock:
+            self._counts.update(rows)
+            self._loaded_at.update(dict.fromkeys(stale, loaded_at))
+
+    def count(self, user_id):
+        return self._counts.get(user_id, 0)
+
+    def assign(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._counts[user_id] = self._counts.get(user_id, 0) + 1
+
+    def release(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                if self._counts.get(user_id):
+                    self._counts[user_id] -= 1
+
+    def refresh(self, team_id, user_ids):
+        """Перечитать из счётчиков статистики нагрузку участников команды,
+        если она уже загружена."""
+        if team_id not in self._loaded_at:
+            return
+        rows = User.objects.filter(pk__in=user_ids).values_list(
+            'pk', Coalesce('review_stats__open_assignments_count', 0))
+        with self._lock:
+            self._counts.update(rows)
+
+    def forget(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._counts.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self._loaded_at.clear()
+
+
+workload = WorkloadIndex()
+
+
+class RandomStrategy:
+    """Случайный выбор среди кандидатов."""
+
+    def choose(self, team_id, candidates, k, pending=None):
+        return random.sample(candidates, k=min(k, len(candidates)))
+
+
+class LeastLoadedStrategy:
+    """Выбор кандидатов с наименьшим числом открытых ревью."""
+
+    def __init__(self, index=workload):
+        self.index = index
+
+    def prepare(self, team_ids):
+        """Прочитать нагрузку всех команд, из которых будут выбираться
+        кандидаты, одним запросом."""
+        self.index.load(team_ids)
+
+    def choose(self, team_id, candidates, k, pending=None):
+        self.index.load([team_id])
+        pending = pending or {}
+        return heapq.nsmallest(
+            k, candidates,
+            key=lambda user_id: (self.index.count(user_id) + pending.get(user_id, 0),
+                                 random.random()))
+
+
+STRATEGIES = {
+    'random': RandomStrategy,
+    'least_loaded': LeastLoadedStrategy,
+}
+
+_strategies = {}
+
+
+def get_reviewer_strategy():
+    name = settings.REVIEWER_SELECTION_STRATEGY
+    if name not in _strategies:
+        strategy_class = STRATEGIES.get(name) or import_string(name)
+        _strategies[name] = strategy_class()
+    return _strategies[name]
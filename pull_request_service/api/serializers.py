@@ -1,12 +1,24 @@
-import random
+from collections import defaultdict
+from operator import attrgetter
 
 from teams.models import Team
 from users.models import User
-from pull_requests.models import PullRequest
+from pull_requests.models import ArchivedPullRequest, PullRequest
 
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
+from . import counters, events
+from .assignments import Reviewer
+from .policies import policy_engine
+from .selection import workload
+
+
+def _is_name_conflict(error):
+    """Вызвана ли ошибка уникальностью названия PR, а не другим ограничением."""
+    return 'pull_request_name' in str(error)
+
 
 class UserSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(source='id', read_only=True)
@@ -31,66 +43,212 @@ class TeamSerializer(serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = ('team_name', 'members')
+        extra_kwargs = {'team_name': {'validators': []}}
 
     def create(self, validated_data):
         members = validated_data.pop('members')
 
         with transaction.atomic():
             team = Team.objects.create(**validated_data)
-
-            for user in members:
-                User.objects.create(team=team, **user)
+            User.objects.bulk_create(
+                User(team=team, **user) for user in members)
 
         return team
 
 
+class TeamBulkAddSerializer(serializers.Serializer):
+    teams = TeamSerializer(many=True, allow_empty=False)
+
+    def validate_teams(self, value):
+        if len(value) > settings.BULK_CREATE_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'at most {settings.BULK_CREATE_MAX_ITEMS} teams per request')
+        return value
+
+
+class ReviewPolicySerializer(serializers.Serializer):
+    team_name = serializers.CharField(max_length=128)
+    reviewers_count = serializers.IntegerField(min_value=1, max_value=100, default=2)
+    fallback_teams = serializers.ListField(
+        child=serializers.CharField(max_length=128), default=list)
+    exclude_recent = serializers.IntegerField(min_value=0, max_value=100, default=0)
+
+    def validate(self, data):
+        if data['team_name'] in data['fallback_teams']:
+            raise serializers.ValidationError(
+                {'fallback_teams': 'a team cannot be its own fallback'})
+        data['fallback_teams'] = list(dict.fromkeys(data['fallback_teams']))
+        return data
+
+
 class PullRequestSerializer(serializers.ModelSerializer):
     pull_request_id = serializers.IntegerField(source='id', read_only=True)
-    author_id = serializers.PrimaryKeyRelatedField(source='author', queryset=User.objects.all())
+    author_id = serializers.PrimaryKeyRelatedField(
+        source='author', queryset=User.objects.only('pk', 'team_id'))
 
     class Meta:
         model = PullRequest
         fields = ('pull_request_id', 'pull_request_name', 'author_id',
                   'status', 'assigned_reviewers')
         read_only_fields = ('status', 'assigned_reviewers')
+        extra_kwargs = {'pull_request_name': {'validators': []}}
 
     def create(self, validated_data):
         author = validated_data.pop('author')
 
-        if PullRequest.objects.filter(pull_request_name=validated_data['pull_request_name']).exists():
-            raise serializers.ValidationError(
-                {"pull_request_name": "PR already exists"})
-
         with transaction.atomic():
-            pull_request = PullRequest.objects.create(
-                author=author, status='OPEN', **validated_data)
-
-            team_members = list(author.team.members.filter(
-                is_active=True).exclude(pk=author.pk))
-            assigned_reviewers = random.sample(
-                team_members, k=min(2, len(team_members)))
-
-            pull_request.assigned_reviewers.set(assigned_reviewers)
-            pull_request.save()
+            try:
+                pull_request = PullRequest.objects.create(
+                    author=author, status='OPEN', **validated_data)
+            except IntegrityError as error:
+                if not _is_name_conflict(error):
+                    raise
+                raise serializers.ValidationError(
+                    {"pull_request_name": "PR already exists"})
+            # Имена PR из архива заняты. Проверка идёт после вставки:
+            # вставка ждёт транзакцию, переносящую PR с тем же именем в
+            # архив, и после неё уже видит архивную строку.
+            if ArchivedPullRequest.objects.filter(
+                    pull_request_name=pull_request.pull_request_name).exists():
+                raise serializers.ValidationError(
+                    {"pull_request_name": "PR already exists"})
+
+            plan = policy_engine.plans([author.team_id])[author.team_id]
+            assigned_reviewers = policy_engine.choose(plan, exclude=[author.pk])
+
+            # Связи и счётчики пишутся как в пакетном создании: без выборки
+            # уже назначенных ревьюверов, которых у нового PR нет.
+            Reviewer.objects.bulk_create(
+                Reviewer(pullrequest_id=pull_request.pk, user_id=member_id)
+                for member_id in assigned_reviewers)
+            counters.pull_requests_created({pull_request.pk: assigned_reviewers})
+            events.pull_requests_created([{
+                'pull_request_id': pull_request.pk,
+                'pull_request_name': pull_request.pull_request_name,
+                'author_id': author.pk,
+                'assigned_reviewers': assigned_reviewers}])
+
+        workload.assign(assigned_reviewers)
+        policy_engine.remember([plan])
+        # Ответ строится без повторного чтения ревьюверов из БД.
+        pull_request.reviewer_ids = assigned_reviewers
         return pull_request
 
 
-class PullRequestMergeSerializer(serializers.ModelSerializer):
-    pull_request_id = serializers.IntegerField(source='id', read_only=True)
-    author_id = serializers.PrimaryKeyRelatedField(source='author', queryset=User.objects.all())
-
-    class Meta:
-        model = PullRequest
-        fields = ('pull_request_id', 'pull_request_name', 'author_id',
-                  'status', 'assigned_reviewers', 'merged_at')
-        read_only_fields = ('status', 'assigned_reviewers', 'merged_at')
+class PullRequestBulkItemSerializer(serializers.Serializer):
+    pull_request_name = serializers.CharField(max_length=128)
+    author_id = serializers.IntegerField()
 
 
-class PullRequestShortSerializer(serializers.ModelSerializer):
-    pull_request_id = serializers.IntegerField(source='id', read_only=True)
-    author_id = serializers.PrimaryKeyRelatedField(source='author', queryset=User.objects.all())
+class PullRequestBulkCreateSerializer(serializers.Serializer):
+    pull_requests = PullRequestBulkItemSerializer(many=True, allow_empty=False)
 
-    class Meta:
-        model = PullRequest
-        fields = ('pull_request_id', 'pull_request_name', 'author_id', 'status')
-        read_only_fields = ('status',)
+    def validate_pull_requests(self, value):
+        if len(value) > settings.BULK_CREATE_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'at most {settings.BULK_CREATE_MAX_ITEMS} pull requests per request')
+        return value
+
+
+class ReadSerializer:
+    """Сериализатор ответа поверх словарей из ``values()``.
+
+    В отличие от ModelSerializer не строит поля по модели и не обходит
+    объекты полей для каждой строки: ``fields`` сопоставляет ключ ответа
+    ключу строки, так что сериализация списка — один проход по словарям.
+    """
+    fields = {}
+
+    def __init__(self, instance, many=False):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.fields.values())
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls(cls.values(queryset), many=True)
+
+    @classmethod
+    def row(cls, obj, **extra):
+        """Строка из уже загруженного экземпляра модели."""
+        row = {source: attrgetter(source.replace('__', '.'))(obj)
+               for source in cls.fields.values() if source not in extra}
+        row.update(extra)
+        return row
+
+    def to_representation(self, row):
+        return {name: row[source] for name, source in self.fields.items()}
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
+
+
+class UserReadSerializer(ReadSerializer):
+    fields = {'user_id': 'id', 'username': 'username', 'is_active': 'is_active'}
+
+
+class UserTeamReadSerializer(ReadSerializer):
+    fields = {'user_id': 'id', 'username': 'username',
+              'team': 'team__team_name', 'is_active': 'is_active'}
+
+
+class TeamReadSerializer(ReadSerializer):
+    fields = {'team_name': 'team_name', 'members': 'members'}
+
+    @classmethod
+    def values(cls, queryset):
+        """Команды и их участники двумя запросами."""
+        rows = list(queryset.values('id', 'team_name'))
+        members = defaultdict(list)
+        for member in User.objects.filter(
+                team_id__in=[row['id'] for row in rows]
+        ).order_by('pk').values('team_id', *UserReadSerializer.fields.values()):
+            members[member.pop('team_id')].append(member)
+        for row in rows:
+            row['members'] = UserReadSerializer(members[row['id']], many=True).data
+        return rows
+
+
+class PullRequestReadSerializer(ReadSerializer):
+    fields = {'pull_request_id': 'id', 'pull_request_name': 'pull_request_name',
+              'author_id': 'author_id', 'status': 'status',
+              'assigned_reviewers': 'assigned_reviewers'}
+
+    @classmethod
+    def values(cls, queryset):
+        """PR и идентификаторы их ревьюверов двумя запросами."""
+        sources = [source for source in cls.fields.values()
+                   if source != 'assigned_reviewers']
+        rows = list(queryset.values(*sources))
+        reviewers = defaultdict(list)
+        for pr_id, user_id in PullRequest.assigned_reviewers.through.objects.filter(
+                pullrequest_id__in=[row['id'] for row in rows]
+        ).order_by('pk').values_list('pullrequest_id', 'user_id'):
+            reviewers[pr_id].append(user_id)
+        for row in rows:
+            row['assigned_reviewers'] = reviewers[row['id']]
+        return rows
+
+
+class PullRequestMergeReadSerializer(PullRequestReadSerializer):
+    fields = {**PullRequestReadSerializer.fields, 'merged_at': 'merged_at'}
+    merged_at = serializers.DateTimeField()
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        if data['merged_at'] is not None:
+            data['merged_at'] = self.merged_at.to_representation(data['merged_at'])
+        return data
+
+
+class JobReadSerializer(ReadSerializer):
+    fields = {'job_id': 'id', 'kind': 'kind', 'status': 'status',
+              'progress': 'progress', 'result': 'result', 'error': 'error',
+              'created_at': 'created_at', 'started_at': 'started_at',
+              'finished_at': 'finished_at'}
@@ -0,0 +1,79 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from pull_requests.models import PullRequest
+from teams.models import ReviewPolicy
+from users.models import User
+
+from . import counters
+from .policies import policy_engine
+from .versions import versions
+
+
+Reviewer = PullRequest.assigned_reviewers.through
+
+
+def _record(pairs, statuses, added):
+    for is_open in (True, False):
+        selected = [(pr_id, user_id) for pr_id, user_id in pairs
+                    if (statuses[pr_id] == 'OPEN') is is_open]
+        if selected:
+            counters.reviewers_changed(
+                **{'added' if added else 'removed': selected}, is_open=is_open)
+
+
+@receiver(m2m_changed, sender=Reviewer)
+def track_reviewer_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        field = 'pullrequest_id' if reverse else 'user_id'
+        instance._cleared_ids = set(Reviewer.objects.filter(
+            **{'user_id' if reverse else 'pullrequest_id': instance.pk}
+        ).values_list(field, flat=True))
+        return
+    if action == 'post_clear':
+        pk_set, added = instance.__dict__.pop('_cleared_ids', set()), False
+    elif action in ('post_add', 'post_remove'):
+        added = action == 'post_add'
+    else:
+        return
+    if not pk_set:
+        return
+
+    if reverse:
+        pairs = [(pr_id, instance.pk) for pr_id in pk_set]
+        statuses = dict(PullRequest.objects.filter(
+            pk__in=pk_set).values_list('pk', 'status'))
+    else:
+        pairs = [(instance.pk, user_id) for user_id in pk_set]
+        statuses = {instance.pk: instance.status}
+    _record(pairs, statuses, added)
+
+
+@receiver(pre_delete, sender=PullRequest)
+def forget_pull_request_links(sender, instance, **kwargs):
+    versions.bump('stats')
+    user_ids = list(Reviewer.objects.filter(
+        pullrequest_id=instance.pk).values_list('user_id', flat=True))
+    _record([(instance.pk, user_id) for user_id in user_ids],
+            {instance.pk: instance.status}, added=False)
+
+
+@receiver(post_save, sender=ReviewPolicy)
+@receiver(post_delete, sender=ReviewPolicy)
+def forget_review_policy(sender, instance, **kwargs):
+    policy_engine.invalidate([instance.pk])
+
+
+@receiver(m2m_changed, sender=ReviewPolicy.fallback_teams.through)
+def forget_review_policy_fallbacks(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        policy_engine.invalidate([instance.pk])
+
+
+@receiver(pre_delete, sender=User)
+def forget_user_links(sender, instance, **kwargs):
+    versions.bump('stats')
+    links = list(Reviewer.objects.filter(
+        user_id=instance.pk).values_list('pullrequest_id', 'pullrequest__status'))
+    _record([(pr_id, instance.pk) for pr_id, _ in links],
+            dict(links), added=False)
@@ -0,0 +1,221 @@
+"""Число SQL-запросов каждого эндпоинта не зависит от объёма данных.
+
+Одни и те же проверки выполняются на маленьком наборе данных и на
+наборе, близком к рабочему (команды по 50 человек, у ревьювера 500
+назначений). ``assertNumQueries`` в обоих случаях ждёт одно и то же число,
+поэтому запрос в цикле по участникам или PR ломает тест.
+"""
+import json
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import counters, events, jobs, metrics
+from api.rosters import roster_cache
+from api.selection import workload
+
+from pull_requests.models import PullRequest
+from teams.models import ReviewPolicy, Team
+from users.models import User
+
+Reviewer = PullRequest.assigned_reviewers.through
+
+
+class QueryCountMixin:
+    members = None
+    assignments = None
+
+    @classmethod
+    def setUpTestData(cls):
+        teams = Team.objects.bulk_create(
+            Team(team_name=name) for name in ('alpha', 'beta', 'gamma'))
+        User.objects.bulk_create(
+            User(username=f'{team.team_name}-{i}', team=team)
+            for team in teams for i in range(cls.members))
+        alpha = list(User.objects.filter(team=teams[0]).order_by('pk'))
+        # Первые трое участвуют в PR, последний свободен для смены команды.
+        cls.reviewer, cls.author, cls.co_reviewer = alpha[:3]
+        cls.idle = alpha[-1]
+
+        merged = cls.assignments // 2
+        pull_requests = PullRequest.objects.bulk_create(
+            PullRequest(pull_request_name=f'PR{i}', author=cls.author,
+                        status='MERGED' if i < merged else 'OPEN')
+            for i in range(cls.assignments))
+        Reviewer.objects.bulk_create(
+            Reviewer(pullrequest_id=pr.pk, user_id=user.pk)
+            for pr in pull_requests for user in (cls.reviewer, cls.co_reviewer))
+        cls.open_pr = pull_requests[-1]
+        cls.merged_pr = pull_requests[0]
+        counters.rebuild()
+        events.pull_requests_created(
+            {'pull_request_id': pr.pk, 'pull_request_name': pr.pull_request_name,
+             'author_id': cls.author.pk,
+             'assigned_reviewers': [cls.reviewer.pk, cls.co_reviewer.pk]}
+            for pr in pull_requests)
+
+    def setUp(self):
+        cache.clear()
+        roster_cache.reset_stats()
+        workload.clear()
+        metrics.registry.clear()
+
+    def post(self, path, data):
+        return self.client.post(path, data=json.dumps(data), content_type='application/json')
+
+    def test_team_add(self):
+        with self.assertNumQueries(5):
+            response = self.post('/api/team/add/', {
+                'team_name': 'delta',
+                'members': [{'username': f'delta-{i}', 'is_active': True}
+                            for i in range(self.members)]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_team_bulk_add(self):
+        with self.assertNumQueries(6):
+            response = self.post('/api/team/bulkAdd/', {'teams': [
+                {'team_name': f'bulk-{t}',
+                 'members': [{'username': f'bulk-{t}-{i}', 'is_active': True}
+                             for i in range(self.members)]}
+                for t in range(3)]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_team_get(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/team/get/', {'team_name': 'alpha'})
+        self.assertEqual(len(response.json()['members']), self.members)
+
+    def test_team_deactivate(self):
+        with self.assertNumQueries(17):
+            response = self.post('/api/team/deactivate/', {'team_name': 'alpha'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_deactivate_reassigns_reviews(self):
+        with self.assertNumQueries(14):
+            response = self.post('/api/users/setIsActive/', {
+                'user_id': self.reviewer.pk, 'is_active': False})
+        self.assertEqual(response.json()['reassignment']['reassigned'],
+                         self.assignments - self.assignments // 2)
+
+    def test_user_activate(self):
+        with self.assertNumQueries(4):
+            response = self.post('/api/users/setIsActive/', {
+                'user_id': self.reviewer.pk, 'is_active': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_get_review(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/users/getReview/', {
+                'user_id': self.reviewer.pk, 'status': 'OPEN', 'limit': 1000})
+        self.assertEqual(len(response.json()['pull_requests']),
+                         self.assignments - self.assignments // 2)
+
+    def test_user_change_team(self):
+        with self.assertNumQueries(4):
+            response = self.post('/api/users/changeTeam/', {
+                'user_id': self.idle.pk, 'team_name': 'gamma'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_pull_request_create(self):
+        with self.assertNumQueries(12):
+            response = self.post('/api/pullRequest/create/', {
+                'pull_request_name': 'new', 'author_id': self.author.pk})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_pull_request_create_with_policy(self):
+        alpha, beta, gamma = Team.objects.order_by('pk')
+        policy = ReviewPolicy.objects.create(team=alpha, reviewers_count=self.members + 5,
+                                             exclude_recent=3)
+        policy.fallback_teams.set([beta, gamma])
+        cache.clear()
+        with self.assertNumQueries(12):
+            response = self.post('/api/pullRequest/create/', {
+                'pull_request_name': 'new', 'author_id': self.author.pk})
+        self.assertEqual(len(response.json()['pr']['assigned_reviewers']),
+                         self.members + 5)
+        # Правила, составы и последние ревьюверы уже в кэше.
+        with self.assertNumQueries(10):
+            self.post('/api/pullRequest/create/', {
+                'pull_request_name': 'newer', 'author_id': self.author.pk})
+
+    def test_pull_request_bulk_create(self):
+        with self.assertNumQueries(13):
+            response = self.post('/api/pullRequest/bulkCreate/', {'pull_requests': [
+                {'pull_request_name': f'bulk-{i}', 'author_id': self.author.pk}
+                for i in range(self.members)]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_pull_request_merge(self):
+        with self.assertNumQueries(8):
+            response = self.post('/api/pullRequest/merge/', {
+                'pull_request_id': self.open_pr.pk})
+        self.assertEqual(response.json()['pr']['status'], 'MERGED')
+
+    def test_pull_request_merge_already_merged(self):
+        with self.assertNumQueries(2):
+            self.post('/api/pullRequest/merge/', {'pull_request_id': self.merged_pr.pk})
+
+    def test_pull_request_reassign(self):
+        with self.assertNumQueries(11):
+            response = self.post('/api/pullRequest/reassign/', {
+                'pull_request_id': self.open_pr.pk, 'old_user_id': self.reviewer.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_team_set_policy(self):
+        data = {'team_name': 'alpha', 'reviewers_count': 3, 'exclude_recent': 2,
+                'fallback_teams': ['beta', 'gamma']}
+        with self.assertNumQueries(12):
+            response = self.post('/api/team/setPolicy/', data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Правило уже есть: UPDATE вместо INSERT и удаление лишней команды.
+        with self.assertNumQueries(9):
+            self.post('/api/team/setPolicy/', {**data, 'fallback_teams': ['beta']})
+
+    def test_events(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/events/', {'limit': 100})
+        self.assertEqual(len(response.json()['events']), min(100, self.assignments))
+        with self.assertNumQueries(1):
+            self.client.get('/api/events/', {'since': response.json()['next_cursor']})
+        with self.assertNumQueries(2):
+            self.client.get('/api/events/', {'since': 'now'})
+
+    def test_job_detail(self):
+        job = jobs.enqueue('team.deactivate', {'team_name': 'alpha'})
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertEqual(response.json()['status'], 'QUEUED')
+
+    def test_statistics_user(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/statisticsUser/', {'team_name': 'alpha'})
+        self.assertEqual(len(response.json()), self.members)
+
+    def test_statistics_pr(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/statisticsPR/', {'status': 'OPEN'})
+        self.assertEqual(len(response.json()), self.assignments - self.assignments // 2)
+
+    def test_statistics_cache_and_metrics(self):
+        with self.assertNumQueries(0):
+            self.client.get('/api/statisticsCache/')
+            self.client.get('/api/metrics')
+
+
+postgres_only = skipUnless(connection.vendor == 'postgresql',
+                           'query counts are pinned for PostgreSQL')
+
+
+@postgres_only
+class SmallDatasetQueryCountTestCase(QueryCountMixin, APITestCase):
+    members = 6
+    assignments = 4
+
+
+@postgres_only
+class LargeDatasetQueryCountTestCase(QueryCountMixin, APITestCase):
+    members = 50
+    assignments = 500
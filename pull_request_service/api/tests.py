@@ -1,15 +1,71 @@
+import asyncio
 import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import (
+    DatabaseError, IntegrityError, OperationalError, connection, connections, transaction)
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APITestCase
 
-from pull_requests.models import PullRequest
-from teams.models import Team
+from api import events, jobs, metrics, replicas
+from api.assignments import Reviewer
+from api.async_views import read_only
+from api.parsers import FastJSONParser
+from api.policies import policy_engine
+from api.renderers import FastJSONRenderer
+from api.middleware import MetricsMiddleware
+from api.models import IdempotencyKey, Job, PullRequestReviewStats, ReviewEvent, UserReviewStats
+from api.rosters import roster_cache
+from api.selection import workload
+from api.serializers import (
+    PullRequestReadSerializer,
+    PullRequestSerializer,
+    TeamReadSerializer,
+    TeamSerializer,
+    UserTeamReadSerializer,
+    UserTeamSerializer,
+)
+from api.views import TeamViewSet, get_events_async, get_pr_statistics
+
+from pull_request_service.postgresql.base import DatabaseWrapper
+from pull_requests.models import ArchivedPullRequest, PullRequest
+from teams.models import ReviewPolicy, Team
 from users.models import User
 
 
-class TeamAPITestCase(APITestCase):
+class ServiceAPITestCase(APITestCase):
+    """Сбрасывает кэши процесса, переживающие откат транзакции теста."""
+
     def setUp(self):
+        cache.clear()
+        roster_cache.reset_stats()
+        workload.clear()
+        metrics.registry.clear()
+
+
+class TeamAPITestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
         self.team_data = {
             "team_name": "TestTeam",
             "members": [
@@ -26,12 +82,28 @@ class TeamAPITestCase(APITestCase):
         team = Team.objects.get(team_name='TestTeam')
         self.assertEqual(team.members.count(), 2)
 
+    def test_add_team_inserts_members_in_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                '/api/team/add/', data=json.dumps(self.team_data), content_type='application/json')
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "users_user"')]
+        self.assertEqual(len(inserts), 1)
+
     def test_add_team_already_exists(self):
         Team.objects.create(team_name='TestTeam')
         response = self.client.post(
             '/api/team/add/', data=json.dumps(self.team_data), content_type='application/json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_add_team_idempotency_key_replays_response(self):
+        for _ in range(2):
+            response = self.client.post(
+                '/api/team/add/', data=json.dumps(self.team_data), content_type='application/json',
+                HTTP_IDEMPOTENCY_KEY='import-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(User.objects.count(), 2)
+
     def test_get_team_success(self):
         Team.objects.create(team_name='TestTeam')
         response = self.client.get('/api/team/get/', {'team_name': 'TestTeam'})
@@ -43,8 +115,105 @@ class TeamAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
-class UserAPITestCase(APITestCase):
+class TeamBulkAddAPITestCase(ServiceAPITestCase):
+    def bulk_add(self, teams):
+        return self.client.post('/api/team/bulkAdd/', data=json.dumps(
+            {'teams': teams}), content_type='application/json')
+
+    def test_bulk_add_success(self):
+        teams = [{'team_name': f'Team{i}',
+                  'members': [{'username': f'user{i}-{j}', 'is_active': True}
+                              for j in range(3)]}
+                 for i in range(5)]
+        response = self.bulk_add(teams)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([result['team']['team_name'] for result in results],
+                         [team['team_name'] for team in teams])
+        for result in results:
+            team = Team.objects.get(team_name=result['team']['team_name'])
+            self.assertEqual([member['user_id'] for member in result['team']['members']],
+                             list(team.members.order_by('pk').values_list('pk', flat=True)))
+
+    def test_bulk_add_reports_existing_teams(self):
+        Team.objects.create(team_name='Team1')
+        response = self.bulk_add([
+            {'team_name': 'Team1', 'members': [{'username': 'a'}]},
+            {'team_name': 'Team2', 'members': [{'username': 'b'}]},
+            {'team_name': 'Team2', 'members': [{'username': 'c'}]},
+        ])
+
+        codes = [result.get('error', {}).get('code')
+                 for result in response.json()['results']]
+        self.assertEqual(codes, ['TEAM_EXISTS', None, 'TEAM_EXISTS'])
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['b'])
+
+    def test_bulk_add_query_count_does_not_grow(self):
+        teams = [{'team_name': f'Team{i}',
+                  'members': [{'username': f'user{i}-{j}'} for j in range(20)]}
+                 for i in range(20)]
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk_add(teams)
+        self.assertLessEqual(len(queries), 8)
+
+
+class TeamDeactivationAPITestCase(ServiceAPITestCase):
     def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Leaving')
+        self.other_team = Team.objects.create(team_name='Staying')
+        self.leavers = [
+            User.objects.create(username=f'leaver{i}', team=self.team)
+            for i in range(3)]
+        self.author = User.objects.create(username='author', team=self.other_team)
+        self.stayers = [
+            User.objects.create(username=f'stayer{i}', team=self.other_team)
+            for i in range(2)]
+
+    def deactivate(self):
+        return self.client.post('/api/team/deactivate/', data=json.dumps(
+            {'team_name': 'Leaving'}), content_type='application/json')
+
+    def test_deactivate_team_reassigns_reviews(self):
+        pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.author, status='OPEN')
+        pr.assigned_reviewers.set(self.leavers[:2])
+
+        response = self.deactivate()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['reassignment'],
+                         {'reassigned': 1, 'short': 0, 'orphaned': 0})
+        self.assertEqual(set(pr.assigned_reviewers.all()), set(self.stayers))
+        self.assertFalse(self.team.members.filter(is_active=True).exists())
+
+    def test_deactivate_team_reports_orphaned_prs(self):
+        pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.leavers[0], status='OPEN')
+        pr.assigned_reviewers.set(self.leavers[1:])
+
+        response = self.deactivate()
+
+        self.assertEqual(response.json()['reassignment'],
+                         {'reassigned': 0, 'short': 1, 'orphaned': 1})
+        self.assertFalse(pr.assigned_reviewers.exists())
+
+    def test_deactivate_team_query_count_does_not_grow(self):
+        for i in range(20):
+            User.objects.create(username=f'extra{i}', team=self.team)
+        for i in range(20):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'PR{i}', author=self.author, status='OPEN')
+            pr.assigned_reviewers.set(self.leavers[:2])
+
+        with self.assertNumQueries(16):
+            self.deactivate()
+
+
+class UserAPITestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
         self.team = Team.objects.create(team_name='Team1')
         self.user = User.objects.create(
             username='user1', team=self.team, is_active=True)
@@ -57,6 +226,57 @@ class UserAPITestCase(APITestCase):
         self.user.refresh_from_db()
         self.assertFalse(self.user.is_active)
 
+    def test_set_active_reassigns_open_reviews(self):
+        author = User.objects.create(username='author', team=self.team)
+        colleague = User.objects.create(username='colleague', team=self.team)
+        spare = User.objects.create(username='spare', team=self.team)
+        prs = []
+        for i in range(5):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'pr{i}', author=author, status='OPEN')
+            pr.assigned_reviewers.set([self.user, colleague])
+            prs.append(pr)
+        merged = PullRequest.objects.create(
+            pull_request_name='merged', author=author, status='MERGED')
+        merged.assigned_reviewers.add(self.user)
+
+        response = self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': self.user.id, 'is_active': False}), content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['reassignment'],
+                         {'reassigned': 5, 'short': 0, 'orphaned': 0})
+        for pr in prs:
+            self.assertEqual(set(pr.assigned_reviewers.values_list('pk', flat=True)),
+                             {colleague.pk, spare.pk})
+        self.assertIn(self.user, merged.assigned_reviewers.all())
+
+    def test_set_active_reports_short_reviews(self):
+        author = User.objects.create(username='author', team=self.team)
+        pr = PullRequest.objects.create(
+            pull_request_name='pr1', author=author, status='OPEN')
+        pr.assigned_reviewers.add(self.user)
+
+        response = self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': self.user.id, 'is_active': False}), content_type='application/json')
+
+        self.assertEqual(response.json()['reassignment'],
+                         {'reassigned': 0, 'short': 1, 'orphaned': 1})
+        self.assertFalse(pr.assigned_reviewers.exists())
+
+    def test_set_active_query_count_does_not_grow_with_prs(self):
+        author = User.objects.create(username='author', team=self.team)
+        for i in range(3):
+            User.objects.create(username=f'member{i}', team=self.team)
+        for i in range(30):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'pr{i}', author=author, status='OPEN')
+            pr.assigned_reviewers.add(self.user)
+
+        with self.assertNumQueries(14):
+            self.client.post('/api/users/setIsActive/', data=json.dumps(
+                {'user_id': self.user.id, 'is_active': False}), content_type='application/json')
+
     def test_set_active_missing_fields(self):
         response = self.client.post(
             '/api/users/setIsActive/', data=json.dumps({}), content_type='application/json')
@@ -77,6 +297,35 @@ class UserAPITestCase(APITestCase):
         self.assertEqual(str(self.user.id), data['user_id'])
         self.assertTrue(len(data['pull_requests']) >= 1)
 
+    def test_get_review_prs_paginates_and_filters(self):
+        author = User.objects.create(username='author', team=self.team)
+        for i in range(7):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'pr{i}', author=author,
+                status='MERGED' if i % 3 == 0 else 'OPEN')
+            pr.assigned_reviewers.add(self.user)
+
+        names = []
+        cursor = None
+        while True:
+            params = {'user_id': self.user.id, 'status': 'OPEN', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/api/users/getReview/', params).json()
+            self.assertLessEqual(len(data['pull_requests']), 2)
+            names += [pr['pull_request_name'] for pr in data['pull_requests']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(names, ['pr1', 'pr2', 'pr4', 'pr5'])
+
+    def test_get_review_prs_invalid_params(self):
+        for params in ({'status': 'CLOSED'}, {'limit': 0}, {'cursor': 'garbage'}):
+            response = self.client.get(
+                '/api/users/getReview/', {'user_id': self.user.id, **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_change_team_success(self):
         response = self.client.post('/api/users/changeTeam/', data=json.dumps(
             {'user_id': self.user.id, 'team_name': self.team2.team_name}), content_type='application/json')
@@ -98,8 +347,9 @@ class UserAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
 
-class PullRequestAPITestCase(APITestCase):
+class PullRequestAPITestCase(ServiceAPITestCase):
     def setUp(self):
+        super().setUp()
         self.team = Team.objects.create(team_name='Team1')
         self.user = User.objects.create(
             username='user1', team=self.team, is_active=True)
@@ -124,6 +374,75 @@ class PullRequestAPITestCase(APITestCase):
             '/api/pullRequest/create/', data=json.dumps(data), content_type='application/json')
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
+    def test_create_pull_request_other_integrity_error_is_not_conflict(self):
+        data = {'pull_request_name': 'PR1', 'author_id': self.user.id}
+        failure = IntegrityError('insert or update on table "api_reviewevent" '
+                                 'violates foreign key constraint')
+        with mock.patch('api.serializers.events.pull_requests_created',
+                        side_effect=failure):
+            with self.assertRaises(IntegrityError):
+                self.client.post('/api/pullRequest/create/', data=json.dumps(data),
+                                 content_type='application/json')
+        self.assertFalse(PullRequest.objects.filter(pull_request_name='PR1').exists())
+
+    def test_create_pull_request_skips_existence_query(self):
+        data = {'pull_request_name': 'PR1', 'author_id': self.user.id}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                '/api/pullRequest/create/', data=json.dumps(data), content_type='application/json')
+        self.assertFalse(any('"pull_requests_pullrequest"."pull_request_name" = ' in query['sql']
+                             for query in queries))
+
+    def test_create_pull_request_idempotency_key_replays_response(self):
+        data = {'pull_request_name': 'PR1', 'author_id': self.user.id}
+        first = self.client.post(
+            '/api/pullRequest/create/', data=json.dumps(data), content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='webhook-1')
+        second = self.client.post(
+            '/api/pullRequest/create/', data=json.dumps(data), content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='webhook-1')
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(PullRequest.objects.count(), 1)
+
+    def test_create_pull_request_new_idempotency_key_reports_conflict(self):
+        data = {'pull_request_name': 'PR1', 'author_id': self.user.id}
+        self.client.post(
+            '/api/pullRequest/create/', data=json.dumps(data), content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='webhook-1')
+        response = self.client.post(
+            '/api/pullRequest/create/', data=json.dumps(data), content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='webhook-2')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_create_pull_request_idempotency_key_with_other_body_is_rejected(self):
+        self.client.post('/api/pullRequest/create/', data=json.dumps(
+            {'pull_request_name': 'PR1', 'author_id': self.user.id}),
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY='webhook-1')
+        response = self.client.post('/api/pullRequest/create/', data=json.dumps(
+            {'pull_request_name': 'PR2', 'author_id': self.user.id}),
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY='webhook-1')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.json()['error']['code'], 'IDEMPOTENCY_KEY_REUSED')
+        self.assertFalse(PullRequest.objects.filter(pull_request_name='PR2').exists())
+
+    def test_create_pull_request_expired_idempotency_key_is_not_replayed(self):
+        data = {'author_id': self.user.id, 'pull_request_name': 'PR1'}
+        self.client.post('/api/pullRequest/create/', data=json.dumps(data),
+                         content_type='application/json', HTTP_IDEMPOTENCY_KEY='webhook-1')
+        IdempotencyKey.objects.update(created_at=datetime.now(timezone.utc) - timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL + 1))
+        response = self.client.post('/api/pullRequest/create/', data=json.dumps(data),
+                                    content_type='application/json',
+                                    HTTP_IDEMPOTENCY_KEY='webhook-1')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 409)
+
     def test_merge_pull_request_success(self):
         pr = PullRequest.objects.create(
             pull_request_name='PR1', author=self.user, status='OPEN')
@@ -148,6 +467,43 @@ class PullRequestAPITestCase(APITestCase):
         self.assertIn(response.status_code, [
                       status.HTTP_200_OK, status.HTTP_409_CONFLICT])
 
+    def test_reassign_reviewer_replaces_with_free_member(self):
+        user3 = User.objects.create(username='user3', team=self.team)
+        user4 = User.objects.create(username='user4', team=self.team)
+        pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.user, status='OPEN')
+        pr.assigned_reviewers.set([self.user2, user3])
+
+        response = self.client.post('/api/pullRequest/reassign/', data=json.dumps(
+            {'pull_request_id': pr.id, 'old_user_id': self.user2.id}),
+            content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['replaced_by'], user4.id)
+        self.assertEqual(sorted(response.json()['pr']['assigned_reviewers']),
+                         [user3.id, user4.id])
+        self.assertEqual(UserReviewStats.objects.get(user=self.user2).open_assignments_count, 0)
+        self.assertEqual(UserReviewStats.objects.get(user=user4).open_assignments_count, 1)
+        self.assertEqual(PullRequestReviewStats.objects.get(pull_request=pr).reviewers_count, 2)
+
+    def test_reassign_reviewer_errors(self):
+        pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.user, status='OPEN')
+        pr.assigned_reviewers.set([self.user2])
+        cases = [
+            ({'pull_request_id': pr.id, 'old_user_id': 'abc'}, status.HTTP_400_BAD_REQUEST),
+            ({'pull_request_id': 0, 'old_user_id': self.user2.id}, status.HTTP_400_BAD_REQUEST),
+            ({'pull_request_id': pr.id + 1, 'old_user_id': self.user2.id},
+             status.HTTP_404_NOT_FOUND),
+            ({'pull_request_id': pr.id, 'old_user_id': self.user2.id + 100},
+             status.HTTP_404_NOT_FOUND),
+            ({'pull_request_id': pr.id, 'old_user_id': self.user.id}, status.HTTP_409_CONFLICT),
+        ]
+        for data, expected in cases:
+            response = self.client.post('/api/pullRequest/reassign/', data=json.dumps(data),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, expected, data)
+
     def test_reassign_reviewer_no_candidates(self):
         pr = PullRequest.objects.create(
             pull_request_name='PR1', author=self.user, status='OPEN')
@@ -160,8 +516,790 @@ class PullRequestAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
 
-class StatisticsAPITestCase(APITestCase):
+class ReadSerializersTestCase(ServiceAPITestCase):
+    """Сериализаторы ответов повторяют вывод ModelSerializer за меньшее число запросов."""
+
+    def setUp(self):
+        super().setUp()
+        self.teams = [Team.objects.create(team_name=f'Team{i}') for i in range(3)]
+        self.users = [User.objects.create(username=f'user{i}', team=self.teams[i % 3])
+                      for i in range(9)]
+        self.prs = []
+        for i in range(6):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'PR{i}', author=self.users[i], status='OPEN')
+            pr.assigned_reviewers.set(self.users[i + 1:i + 3])
+            self.prs.append(pr)
+
+    def test_user_matches_model_serializer(self):
+        user = User.objects.select_related('team').get(pk=self.users[0].pk)
+        self.assertEqual(UserTeamReadSerializer(UserTeamReadSerializer.row(user)).data,
+                         UserTeamSerializer(user).data)
+
+    def test_teams_match_model_serializer(self):
+        with self.assertNumQueries(2):
+            data = TeamReadSerializer.from_queryset(Team.objects.order_by('pk')).data
+        self.assertEqual(data, [TeamSerializer(team).data for team in Team.objects.order_by('pk')])
+
+    def test_pull_requests_match_model_serializer(self):
+        with self.assertNumQueries(2):
+            data = PullRequestReadSerializer.from_queryset(PullRequest.objects.order_by('pk')).data
+        expected = [PullRequestSerializer(pr).data for pr in PullRequest.objects.order_by('pk')]
+        for row in data + expected:
+            row['assigned_reviewers'] = sorted(row['assigned_reviewers'])
+        self.assertEqual(data, expected)
+
+    def test_merge_formats_merged_at_like_drf(self):
+        response = self.client.post('/api/pullRequest/merge/', data=json.dumps(
+            {'pull_request_id': self.prs[0].pk}), content_type='application/json')
+
+        self.prs[0].refresh_from_db()
+        self.assertEqual(response.json()['pr']['merged_at'],
+                         self.prs[0].merged_at.isoformat().replace('+00:00', 'Z'))
+        self.assertEqual(sorted(response.json()['pr']['assigned_reviewers']),
+                         [user.pk for user in self.users[1:3]])
+
+
+class FastJSONTestCase(TestCase):
+    payloads = [
+        {'team_name': 'Команда', 'members': [{'user_id': 1, 'is_active': True}]},
+        [{'line': 'a\u2028b\u2029c', 'emoji': '🚀', 'quote': '"\\/'}],
+        {'merged_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+         'naive': datetime(2024, 5, 1, 12, 30), 'day': date(2024, 5, 1),
+         'amount': Decimal('1.50'), 'id': uuid.UUID(int=1), 'empty': [], 'none': None},
+        {'big': 2 ** 70, 1: 'int key'},
+        [],
+    ]
+
+    def test_renderer_output_matches_drf(self):
+        for data in self.payloads:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data), data)
+        indented = 'application/json; indent=4'
+        self.assertEqual(FastJSONRenderer().render(self.payloads[0], indented),
+                         JSONRenderer().render(self.payloads[0], indented))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_renderer_without_orjson(self):
+        with mock.patch('api.renderers.orjson', None):
+            for data in self.payloads:
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser_matches_drf(self):
+        for body in (b'{"a": [1, 2.5, "\u0436", null, true]}', b'{"big": 123456789012345678901234}',
+                     '{"name": "Команда"}'.encode()):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for body in (b'{"a": NaN}', b'{"a": ', b'\xff'):
+            errors = []
+            for parser in (FastJSONParser(), JSONParser()):
+                with self.assertRaises(ParseError) as context:
+                    parser.parse(BytesIO(body))
+                errors.append(str(context.exception))
+            self.assertEqual(errors[0], errors[1], body)
+
+    def test_api_responses_use_fast_renderer(self):
+        Team.objects.create(team_name='Команда')
+        response = self.client.get('/api/team/get/', {'team_name': 'Команда'})
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, '{"team_name":"Команда","members":[]}'.encode())
+
+
+class WorkerKilled(BaseException):
+    """Имитирует гибель воркера посреди задачи: ``jobs.run`` её не ловит."""
+
+
+@override_settings(JOB_BATCH_SIZE=2)
+class JobsAPITestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.author, self.reviewer, *self.others = [
+            User.objects.create(username=f'user{i}', team=self.team) for i in range(5)]
+        for i in range(5):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'PR{i}', author=self.author, status='OPEN')
+            pr.assigned_reviewers.add(self.reviewer)
+
+    def post(self, path, data):
+        return self.client.post(path, data=json.dumps(data), content_type='application/json')
+
+    def run_jobs(self):
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        return out.getvalue()
+
+    def get_job(self, job_id):
+        response = self.client.get(f'/api/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_deactivate_user_async_runs_in_batches(self):
+        response = self.post('/api/users/setIsActive/?async=true', {
+            'user_id': self.reviewer.id, 'is_active': False})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = response.json()['job']
+        self.assertEqual(job['status'], 'QUEUED')
+        self.assertTrue(response['Location'].endswith(f'/api/jobs/{job["job_id"]}/'))
+        self.assertTrue(User.objects.get(pk=self.reviewer.id).is_active)
+
+        with mock.patch('api.jobs.checkpoint', wraps=jobs.checkpoint) as checkpoint:
+            self.assertIn('Processed 1 jobs', self.run_jobs())
+        # Снятие флага и три пакета переназначений по два PR.
+        self.assertEqual(checkpoint.call_count, 4)
+
+        job = self.get_job(job['job_id'])
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual((job['progress']['done'], job['progress']['total']), (5, 5))
+        self.assertEqual(job['result']['reassignment'],
+                         {'reassigned': 5, 'short': 0, 'orphaned': 0})
+        self.assertFalse(job['result']['user']['is_active'])
+        self.assertFalse(Reviewer.objects.filter(user_id=self.reviewer.id).exists())
+        self.assertEqual(Reviewer.objects.count(), 5)
+
+    def test_deactivate_team_async(self):
+        response = self.post('/api/team/deactivate/?async=1', {'team_name': 'Team1'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.run_jobs()
+
+        job = self.get_job(response.json()['job']['job_id'])
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual(job['result']['reassignment'],
+                         {'reassigned': 0, 'short': 5, 'orphaned': 5})
+        self.assertEqual([member['is_active'] for member in job['result']['team']['members']],
+                         [False] * 5)
+        self.assertFalse(Reviewer.objects.exists())
+
+    def test_bulk_create_async_matches_sync_results(self):
+        items = [{'pull_request_name': name, 'author_id': self.author.id}
+                 for name in ('new1', 'PR0', 'new2', 'new3', 'new4')]
+        response = self.post('/api/pullRequest/bulkCreate/?async=true', {'pull_requests': items})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.run_jobs()
+
+        results = self.get_job(response.json()['job']['job_id'])['result']['results']
+        self.assertEqual([result.get('error', {}).get('code') for result in results],
+                         [None, 'PR_EXISTS', None, None, None])
+        self.assertEqual(PullRequest.objects.count(), 9)
+
+    def test_bulk_add_teams_async(self):
+        response = self.post('/api/team/bulkAdd/?async=true', {'teams': [
+            {'team_name': f'New{i}', 'members': [{'username': f'new{i}', 'is_active': True}]}
+            for i in range(3)]})
+        self.run_jobs()
+
+        job = self.get_job(response.json()['job']['job_id'])
+        self.assertEqual([result['team']['team_name'] for result in job['result']['results']],
+                         ['New0', 'New1', 'New2'])
+        self.assertNotIn('results', job['progress'])
+
+    def test_job_of_lost_worker_resumes_from_last_batch(self):
+        items = [{'pull_request_name': f'new{i}', 'author_id': self.author.id} for i in range(5)]
+        job_id = self.post('/api/pullRequest/bulkCreate/?async=true',
+                           {'pull_requests': items}).json()['job']['job_id']
+
+        create = jobs.create_pull_requests
+        calls = []
+
+        def create_then_die(batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise WorkerKilled
+            return create(batch)
+
+        with mock.patch('api.jobs.create_pull_requests', create_then_die):
+            with self.assertRaises(WorkerKilled):
+                jobs.run(jobs.claim())
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.progress['done']), ('RUNNING', 2))
+
+        # Пока аренда не истекла, задачу не забирает другой воркер.
+        self.assertIn('Processed 0 jobs', self.run_jobs())
+        Job.objects.filter(pk=job_id).update(locked_until=datetime.now(timezone.utc))
+        self.run_jobs()
+
+        job = self.get_job(job_id)
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual(len(job['result']['results']), 5)
+        self.assertEqual(PullRequest.objects.filter(pull_request_name__startswith='new').count(), 5)
+
+    @override_settings(JOB_MAX_ATTEMPTS=1)
+    def test_job_fails_after_max_attempts(self):
+        job = jobs.enqueue('team.deactivate', {'team_name': 'Team1'})
+        jobs.claim()
+        Job.objects.filter(pk=job.pk).update(locked_until=datetime.now(timezone.utc))
+
+        self.assertIsNone(jobs.claim())
+        self.assertEqual(self.get_job(job.pk)['status'], 'FAILED')
+
+    def test_failed_job_reports_error(self):
+        job = jobs.enqueue('team.deactivate', {'team_name': 'missing'})
+        self.run_jobs()
+
+        job = self.get_job(job.pk)
+        self.assertEqual(job['status'], 'FAILED')
+        self.assertIn('DoesNotExist', job['error'])
+
+    def test_invalid_requests(self):
+        response = self.post('/api/team/deactivate/?async=maybe', {'team_name': 'Team1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post('/api/team/deactivate/?async=true', {'team_name': 'missing'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(self.client.get('/api/jobs/12345/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED is checked on PostgreSQL')
+class ConcurrentJobClaimTestCase(TransactionTestCase):
+    def test_claim_skips_job_locked_by_another_worker(self):
+        first = jobs.enqueue('team.deactivate', {'team_name': 'a'})
+        second = jobs.enqueue('team.deactivate', {'team_name': 'b'})
+        locked, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(pk=first.pk)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        locked.wait(5)
+        try:
+            self.assertEqual(jobs.claim().pk, second.pk)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(jobs.claim().pk, first.pk)
+
+
+class EventsAPITestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.members = [User.objects.create(username=f'user{i}', team=self.team)
+                        for i in range(5)]
+        self.author = self.members[0]
+
+    def post(self, path, data):
+        return self.client.post(path, data=json.dumps(data), content_type='application/json')
+
+    def create_pr(self, name):
+        return self.post('/api/pullRequest/create/', {
+            'pull_request_name': name, 'author_id': self.author.id}).json()['pr']
+
+    def get_events(self, **params):
+        response = self.client.get('/api/events/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_write_paths_append_events(self):
+        pr = self.create_pr('PR1')
+        old_reviewer = pr['assigned_reviewers'][0]
+        new_reviewer = self.post('/api/pullRequest/reassign/', {
+            'pull_request_id': pr['pull_request_id'],
+            'old_user_id': old_reviewer}).json()['replaced_by']
+        self.post('/api/pullRequest/merge/', {'pull_request_id': pr['pull_request_id']})
+        self.post('/api/users/setIsActive/', {'user_id': old_reviewer, 'is_active': False})
+        self.post('/api/users/setIsActive/', {'user_id': old_reviewer, 'is_active': False})
+
+        data = self.get_events()
+        self.assertEqual([(event['type'], event['data']) for event in data['events']], [
+            ('pull_request.created', {
+                'pull_request_id': pr['pull_request_id'], 'pull_request_name': 'PR1',
+                'author_id': self.author.id, 'reviewers': pr['assigned_reviewers']}),
+            ('pull_request.reassigned', {
+                'pull_request_id': pr['pull_request_id'],
+                'added': [new_reviewer], 'removed': [old_reviewer]}),
+            ('pull_request.merged', {
+                'pull_request_id': pr['pull_request_id'],
+                'reviewers': sorted({*pr['assigned_reviewers'], new_reviewer} - {old_reviewer})}),
+            ('user.deactivated', {'user_id': old_reviewer}),
+        ])
+        self.assertEqual(data['next_cursor'], data['events'][-1]['cursor'])
+
+    def test_bulk_create_and_deactivation_append_events(self):
+        self.post('/api/pullRequest/bulkCreate/', {'pull_requests': [
+            {'pull_request_name': f'PR{i}', 'author_id': self.author.id} for i in range(3)]})
+        reviewer = Reviewer.objects.values_list('user_id', flat=True).first()
+        self.post('/api/users/setIsActive/', {'user_id': reviewer, 'is_active': False})
+
+        types = [event['type'] for event in self.get_events()['events']]
+        self.assertEqual(types[:4], ['pull_request.created'] * 3 + ['user.deactivated'])
+        self.assertEqual(set(types[4:]), {'pull_request.reassigned'})
+
+    def test_rolled_back_write_leaves_no_event(self):
+        self.create_pr('PR1')
+        response = self.post('/api/pullRequest/create/', {
+            'pull_request_name': 'PR1', 'author_id': self.author.id})
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(ReviewEvent.objects.count(), 1)
+
+    def test_cursor_resumption(self):
+        for name in ('PR1', 'PR2', 'PR3'):
+            self.create_pr(name)
+
+        first = self.get_events(limit=2)
+        self.assertEqual([event['data']['pull_request_name'] for event in first['events']],
+                         ['PR1', 'PR2'])
+        rest = self.get_events(since=first['next_cursor'])
+        self.assertEqual([event['data']['pull_request_name'] for event in rest['events']],
+                         ['PR3'])
+
+        idle = self.get_events(since=rest['next_cursor'])
+        self.assertEqual(idle, {'events': [], 'next_cursor': rest['next_cursor']})
+
+        self.create_pr('PR4')
+        resumed = self.get_events(since=idle['next_cursor'])
+        self.assertEqual([event['data']['pull_request_name'] for event in resumed['events']],
+                         ['PR4'])
+        response = self.client.get('/api/events/', HTTP_LAST_EVENT_ID=idle['next_cursor'])
+        self.assertEqual(response.json(), resumed)
+
+    def test_since_now_skips_existing_events(self):
+        self.create_pr('PR1')
+        data = self.get_events(since='now')
+        self.assertEqual(data['events'], [])
+        self.create_pr('PR2')
+        self.assertEqual([event['data']['pull_request_name']
+                          for event in self.get_events(since=data['next_cursor'])['events']],
+                         ['PR2'])
+
+    def test_invalid_parameters(self):
+        for params in ({'since': 'abc'}, {'limit': 0}, {'wait': -1}, {'wait': 'soon'},
+                       {'wait': 3600}):
+            response = self.client.get('/api/events/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    @override_settings(EVENTS_POLL_INTERVAL=0.01)
+    def test_long_poll_returns_empty_page_after_timeout(self):
+        self.create_pr('PR1')
+        cursor = self.get_events()['next_cursor']
+        self.assertEqual(self.get_events(since=cursor, wait=0.05),
+                         {'events': [], 'next_cursor': cursor})
+
+    @override_settings(EVENTS_POLL_INTERVAL=0.01, EVENTS_SYNC_MAX_DURATION=0.05)
+    def test_long_poll_ends_before_worker_timeout(self):
+        self.create_pr('PR1')
+        cursor = self.get_events()['next_cursor']
+        started = time.monotonic()
+        self.assertEqual(self.get_events(since=cursor, wait=30),
+                         {'events': [], 'next_cursor': cursor})
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_prune_keeps_last_expired_event(self):
+        for name in ('PR1', 'PR2', 'PR3'):
+            self.create_pr(name)
+        cursors = [event['cursor'] for event in self.get_events()['events']]
+        ReviewEvent.objects.exclude(data__pull_request_name='PR3').update(
+            created_at=datetime.now(timezone.utc) - timedelta(days=30))
+
+        out = StringIO()
+        call_command('prune_events', stdout=out)
+        self.assertIn('Deleted 1 events', out.getvalue())
+
+        response = self.client.get('/api/events/', {'since': cursors[0]})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.json()['error']['code'], 'CURSOR_EXPIRED')
+        self.assertEqual([event['cursor'] for event in self.get_events(
+            since=cursors[1])['events']], cursors[2:])
+
+    @override_settings(EVENTS_STREAM_TIMEOUT=0)
+    def test_server_sent_events(self):
+        self.create_pr('PR1')
+        [event] = self.get_events()['events']
+        response = self.client.get('/api/events/', HTTP_ACCEPT='text/event-stream')
+
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+        retry, message = b''.join(response.streaming_content).decode().split('\n\n', 1)
+        self.assertEqual(retry, 'retry: 500')
+        event_id, event_type, data = message.rstrip('\n').split('\n')
+        self.assertEqual(event_id, f'id: {event.pop("cursor")}')
+        self.assertEqual(event_type, 'event: pull_request.created')
+        self.assertEqual(json.loads(data.removeprefix('data: ')), event)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'visibility is tracked by PostgreSQL transaction ids')
+class EventVisibilityTestCase(TransactionTestCase):
+    """События незавершённой транзакции задерживают все более поздние."""
+
+    def test_cursor_does_not_skip_slow_transaction(self):
+        emitted, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    events.users_changed([1], is_active=False)
+                    emitted.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_writer)
+        thread.start()
+        emitted.wait(5)
+        events.users_changed([2], is_active=False)
+
+        self.assertEqual(events.read(None, 10), [])
+        release.set()
+        thread.join()
+        self.assertEqual([row['data'] for row in events.read(None, 10)],
+                         [{'user_id': 1}, {'user_id': 2}])
+
+
+def roster_queries(queries):
+    return [query for query in queries
+            if '"is_active"' in query['sql'].partition('WHERE')[2]]
+
+
+class RosterCacheTestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.members = [User.objects.create(username=f'user{i}', team=self.team)
+                        for i in range(5)]
+
+    def create_pr(self, name):
+        return self.client.post('/api/pullRequest/create/', data=json.dumps(
+            {'pull_request_name': name, 'author_id': self.members[0].id}),
+            content_type='application/json').json()['pr']
+
+    def test_warm_cache_skips_roster_queries(self):
+        self.create_pr('PR0')
+        self.client.get('/api/team/get/', {'team_name': 'Team1'})
+
+        with CaptureQueriesContext(connection) as queries:
+            pr = self.create_pr('PR1')
+            self.client.post('/api/pullRequest/reassign/', data=json.dumps(
+                {'pull_request_id': pr['pull_request_id'],
+                 'old_user_id': pr['assigned_reviewers'][0]}),
+                content_type='application/json')
+            self.client.post('/api/pullRequest/bulkCreate/', data=json.dumps(
+                {'pull_requests': [{'pull_request_name': 'PR2',
+                                    'author_id': self.members[1].id}]}),
+                content_type='application/json')
+        self.assertEqual(roster_queries(queries), [])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.assertEqual(len(response.json()['members']), 5)
+
+    def test_write_paths_invalidate_cache(self):
+        self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': self.members[1].id, 'is_active': False}),
+            content_type='application/json')
+
+        members = self.client.get('/api/team/get/', {'team_name': 'Team1'}).json()['members']
+        self.assertFalse(next(member['is_active'] for member in members
+                              if member['user_id'] == self.members[1].id))
+
+        team2 = Team.objects.create(team_name='Team2')
+        self.client.get('/api/team/get/', {'team_name': 'Team2'})
+        roster_cache.members([self.team.pk, team2.pk])
+        self.client.post('/api/users/changeTeam/', data=json.dumps(
+            {'user_id': self.members[2].id, 'team_name': 'Team2'}),
+            content_type='application/json')
+        members = self.client.get('/api/team/get/', {'team_name': 'Team2'}).json()['members']
+        self.assertEqual([member['user_id'] for member in members], [self.members[2].id])
+        self.assertEqual(roster_cache.members([self.team.pk, team2.pk]), {
+            self.team.pk: [self.members[0].id, self.members[3].id, self.members[4].id],
+            team2.pk: [self.members[2].id]})
+
+        for i in range(5):
+            pr = self.create_pr(f'PR{i}')
+            self.assertNotIn(self.members[1].id, pr['assigned_reviewers'])
+
+    def test_cache_statistics(self):
+        self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.create_pr('PR1')
+        self.create_pr('PR2')
+
+        response = self.client.get('/api/statisticsCache/')
+        self.assertEqual(response.json(), {'rosters': {'hits': 1, 'misses': 1},
+                                           'teams': {'hits': 1, 'misses': 1}})
+
+
+class ConditionalGetTestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.members = [User.objects.create(username=f'user{i}', team=self.team)
+                        for i in range(3)]
+        self.pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.members[0], status='OPEN')
+        self.pr.assigned_reviewers.add(self.members[1])
+
+    def post(self, url, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data=json.dumps(data),
+                                    content_type='application/json')
+
+    def assertNotModified(self, url, params, etag):
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_team_etag(self):
+        params = {'team_name': 'Team1'}
+        etag = self.client.get('/api/team/get/', params)['ETag']
+        self.assertNotModified('/api/team/get/', params, etag)
+
+        self.post('/api/users/setIsActive/',
+                  {'user_id': self.members[2].id, 'is_active': False})
+        response = self.client.get('/api/team/get/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_review_list_etag(self):
+        params = {'user_id': self.members[1].id}
+        etag = self.client.get('/api/users/getReview/', params)['ETag']
+        self.assertNotModified('/api/users/getReview/', params, etag)
+        other = self.client.get('/api/users/getReview/', {**params, 'status': 'OPEN'})
+        self.assertNotEqual(other['ETag'], etag)
+
+        self.post('/api/pullRequest/merge/', {'pull_request_id': self.pr.id})
+        response = self.client.get('/api/users/getReview/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['pull_requests'][0]['status'], 'MERGED')
+
+    def test_statistics_etag(self):
+        etag = self.client.get('/api/statisticsPR/')['ETag']
+        self.assertNotModified('/api/statisticsPR/', {}, etag)
+        csv_etag = self.client.get('/api/statisticsPR/', {'format': 'csv'})['ETag']
+        self.assertNotEqual(csv_etag, etag)
+
+        self.post('/api/pullRequest/create/',
+                  {'pull_request_name': 'PR2', 'author_id': self.members[0].id})
+        response = self.client.get('/api/statisticsPR/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/api/statisticsUser/')['Last-Modified']
+        response = self.client.get('/api/statisticsUser/',
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class BulkPullRequestAPITestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.author = User.objects.create(username='author', team=self.team)
+        self.members = [
+            User.objects.create(username=f'member{i}', team=self.team)
+            for i in range(3)]
+        User.objects.create(username='inactive', team=self.team, is_active=False)
+
+    def bulk_create(self, items):
+        return self.client.post('/api/pullRequest/bulkCreate/', data=json.dumps(
+            {'pull_requests': items}), content_type='application/json')
+
+    def test_bulk_create_success(self):
+        items = [{'pull_request_name': f'PR{i}', 'author_id': self.author.id}
+                 for i in range(10)]
+        response = self.bulk_create(items)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(len(results), 10)
+        member_ids = {member.pk for member in self.members}
+        for item, result in zip(items, results):
+            pr = PullRequest.objects.get(pk=result['pr']['pull_request_id'])
+            self.assertEqual(pr.pull_request_name, item['pull_request_name'])
+            self.assertEqual(len(result['pr']['assigned_reviewers']), 2)
+            self.assertEqual(set(pr.assigned_reviewers.values_list('pk', flat=True)),
+                             set(result['pr']['assigned_reviewers']))
+            self.assertTrue(set(result['pr']['assigned_reviewers']) <= member_ids)
+
+    def test_bulk_create_reports_errors_per_item(self):
+        PullRequest.objects.create(
+            pull_request_name='PR1', author=self.author, status='OPEN')
+        response = self.bulk_create([
+            {'pull_request_name': 'PR1', 'author_id': self.author.id},
+            {'pull_request_name': 'PR2', 'author_id': 0},
+            {'pull_request_name': 'PR3', 'author_id': self.author.id},
+            {'pull_request_name': 'PR3', 'author_id': self.author.id},
+        ])
+
+        codes = [result.get('error', {}).get('code')
+                 for result in response.json()['results']]
+        self.assertEqual(codes, ['PR_EXISTS', 'NOT_FOUND', None, 'PR_EXISTS'])
+        self.assertEqual(PullRequest.objects.filter(pull_request_name='PR3').count(), 1)
+
+    def test_bulk_create_invalid_payload(self):
+        response = self.bulk_create([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_query_count_does_not_grow(self):
+        items = [{'pull_request_name': f'PR{i}', 'author_id': self.author.id}
+                 for i in range(100)]
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk_create(items)
+        self.assertLessEqual(len(queries), 14)
+
+
+@override_settings(REVIEWER_SELECTION_STRATEGY='least_loaded')
+class LeastLoadedSelectionTestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.author = User.objects.create(username='author', team=self.team)
+        self.members = [
+            User.objects.create(username=f'member{i}', team=self.team)
+            for i in range(4)]
+        for i, reviewer in enumerate(self.members[:2]):
+            for j in range(3 - i):
+                pr = PullRequest.objects.create(
+                    pull_request_name=f'old{i}-{j}', author=self.author, status='OPEN')
+                pr.assigned_reviewers.add(reviewer)
+
+    def create_pr(self, name):
+        response = self.client.post('/api/pullRequest/create/', data=json.dumps(
+            {'pull_request_name': name, 'author_id': self.author.id}),
+            content_type='application/json')
+        return response.json()['pr']
+
+    def test_create_picks_least_loaded_members(self):
+        idle = {self.members[2].pk, self.members[3].pk}
+        self.assertEqual(set(self.create_pr('PR1')['assigned_reviewers']), idle)
+        self.assertEqual(set(self.create_pr('PR2')['assigned_reviewers']), idle)
+        self.assertEqual(workload.count(self.members[2].pk), 2)
+
+    def test_workload_follows_merge_and_reassign(self):
+        pr = self.create_pr('PR1')
+        self.client.post('/api/pullRequest/merge/', data=json.dumps(
+            {'pull_request_id': pr['pull_request_id']}), content_type='application/json')
+        self.assertEqual(workload.count(self.members[2].pk), 0)
+
+        pr = self.create_pr('PR2')
+        response = self.client.post('/api/pullRequest/reassign/', data=json.dumps(
+            {'pull_request_id': pr['pull_request_id'], 'old_user_id': self.members[2].pk}),
+            content_type='application/json')
+        self.assertEqual(response.json()['replaced_by'], self.members[1].pk)
+        self.assertEqual(workload.count(self.members[1].pk), 3)
+        self.assertEqual(workload.count(self.members[2].pk), 0)
+
+    def test_deactivation_spreads_reviews_by_load(self):
+        response = self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': self.members[0].pk, 'is_active': False}),
+            content_type='application/json')
+        self.assertEqual(response.json()['reassignment']['reassigned'], 3)
+        self.assertEqual(self.members[1].review_assignments.count(), 2)
+        counts = sorted(self.members[i].review_assignments.count() for i in (2, 3))
+        self.assertEqual(counts, [1, 2])
+
+    def test_activation_keeps_member_load(self):
+        self.create_pr('PR1')
+        self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': self.members[0].pk, 'is_active': True}),
+            content_type='application/json')
+
+        self.assertEqual(workload.count(self.members[0].pk), 3)
+        self.assertNotIn(self.members[0].pk, self.create_pr('PR2')['assigned_reviewers'])
+
+
+class ReviewPolicyTestCase(ServiceAPITestCase):
     def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.author = User.objects.create(username='author', team=self.team)
+        self.members = [User.objects.create(username=f'member{i}', team=self.team)
+                        for i in range(3)]
+        self.other = Team.objects.create(team_name='Team2')
+        self.outsiders = [User.objects.create(username=f'outsider{i}', team=self.other)
+                          for i in range(2)]
+
+    def post(self, url, data):
+        return self.client.post(url, data=json.dumps(data), content_type='application/json')
+
+    def set_policy(self, **policy):
+        return self.post('/api/team/setPolicy/', {'team_name': 'Team1', **policy})
+
+    def create_pr(self, name):
+        response = self.post('/api/pullRequest/create/',
+                             {'pull_request_name': name, 'author_id': self.author.pk})
+        return response.json()['pr']
+
+    def test_reviewers_count_and_fallback_pool(self):
+        self.assertEqual(len(self.create_pr('PR1')['assigned_reviewers']), 2)
+
+        response = self.set_policy(reviewers_count=5, fallback_teams=['Team2'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['policy'], {
+            'team_name': 'Team1', 'reviewers_count': 5,
+            'fallback_teams': ['Team2'], 'exclude_recent': 0})
+        reviewers = self.create_pr('PR2')['assigned_reviewers']
+        self.assertEqual(set(reviewers), {user.pk for user in self.members + self.outsiders})
+        # Сначала участники команды, потом резервный пул.
+        self.assertEqual(set(reviewers[:3]), {user.pk for user in self.members})
+
+        self.set_policy(reviewers_count=4)
+        self.assertEqual(set(self.create_pr('PR3')['assigned_reviewers']),
+                         {user.pk for user in self.members})
+
+    def test_bulk_create_follows_policy(self):
+        self.set_policy(reviewers_count=1)
+        response = self.post('/api/pullRequest/bulkCreate/', {'pull_requests': [
+            {'pull_request_name': f'PR{i}', 'author_id': self.author.pk} for i in range(3)]})
+        self.assertEqual([len(result['pr']['assigned_reviewers'])
+                          for result in response.json()['results']], [1, 1, 1])
+
+    def test_recent_reviewers_are_skipped_while_others_remain(self):
+        self.set_policy(reviewers_count=1, exclude_recent=2)
+        chosen = [self.create_pr(f'PR{i}')['assigned_reviewers'][0] for i in range(6)]
+        # Каждые три подряд — разные участники: два последних пропускаются.
+        for i in range(4):
+            self.assertEqual(len(set(chosen[i:i + 3])), 3, chosen)
+
+        self.set_policy(reviewers_count=3, exclude_recent=2)
+        self.assertEqual(len(self.create_pr('PR6')['assigned_reviewers']), 3)
+
+    def test_reassign_and_deactivation_use_fallback_pool(self):
+        for member in self.members[1:]:
+            member.delete()
+        pr = self.create_pr('PR1')
+        self.assertEqual(pr['assigned_reviewers'], [self.members[0].pk])
+        response = self.post('/api/pullRequest/reassign/', {
+            'pull_request_id': pr['pull_request_id'], 'old_user_id': self.members[0].pk})
+        self.assertEqual(response.json()['error']['code'], 'NO_CANDIDATE')
+
+        self.set_policy(fallback_teams=['Team2'])
+        response = self.post('/api/pullRequest/reassign/', {
+            'pull_request_id': pr['pull_request_id'], 'old_user_id': self.members[0].pk})
+        self.assertIn(response.json()['replaced_by'], [user.pk for user in self.outsiders])
+
+        pr = self.create_pr('PR2')
+        self.assertEqual(len(pr['assigned_reviewers']), 2)
+        response = self.post('/api/users/setIsActive/',
+                             {'user_id': self.members[0].pk, 'is_active': False})
+        self.assertEqual(response.json()['reassignment'],
+                         {'reassigned': 1, 'short': 0, 'orphaned': 0})
+        self.assertEqual(set(Reviewer.objects.filter(
+            pullrequest_id=pr['pull_request_id']).values_list('user_id', flat=True)),
+            {user.pk for user in self.outsiders})
+
+    def test_set_policy_validation(self):
+        response = self.set_policy(fallback_teams=['Team1'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.set_policy(reviewers_count=0)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.set_policy(fallback_teams=['Team2', 'Team9'])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json()['error']['code'], 'NOT_FOUND')
+        self.assertFalse(ReviewPolicy.objects.exists())
+
+
+class StatisticsAPITestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
         self.team = Team.objects.create(team_name='Team1')
         self.user = User.objects.create(
             username='user1', team=self.team, is_active=True)
@@ -180,3 +1318,820 @@ class StatisticsAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(any(item['pull_request_id'] ==
                         self.pr.id for item in response.json()))
+
+    def test_statistics_read_counters_without_grouping(self):
+        for url in ('/api/statisticsUser/', '/api/statisticsPR/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertFalse(any('GROUP BY' in query['sql'] for query in queries))
+
+    def test_counters_follow_write_actions(self):
+        others = [User.objects.create(username=f'user{i}', team=self.team)
+                  for i in range(2, 6)]
+        response = self.client.post('/api/pullRequest/create/', data=json.dumps(
+            {'pull_request_name': 'PR2', 'author_id': self.user.id}),
+            content_type='application/json')
+        pr = response.json()['pr']
+        self.client.post('/api/pullRequest/reassign/', data=json.dumps(
+            {'pull_request_id': pr['pull_request_id'],
+             'old_user_id': pr['assigned_reviewers'][0]}),
+            content_type='application/json')
+        self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': pr['assigned_reviewers'][1], 'is_active': False}),
+            content_type='application/json')
+        self.client.post('/api/pullRequest/bulkCreate/', data=json.dumps(
+            {'pull_requests': [{'pull_request_name': f'PR{i}', 'author_id': others[0].id}
+                               for i in range(3, 8)]}),
+            content_type='application/json')
+        self.client.post('/api/pullRequest/merge/', data=json.dumps(
+            {'pull_request_id': pr['pull_request_id']}), content_type='application/json')
+        PullRequest.objects.get(pull_request_name='PR3').delete()
+
+        live = (list(UserReviewStats.objects.order_by('pk').values()),
+                list(PullRequestReviewStats.objects.order_by('pk').values()))
+        call_command('rebuild_review_stats', stdout=StringIO())
+        rebuilt = (list(UserReviewStats.objects.order_by('pk').values()),
+                   list(PullRequestReviewStats.objects.order_by('pk').values()))
+
+        def nonzero(rows):
+            return [row for row in rows
+                    if any(value for key, value in row.items() if key.endswith('count'))]
+
+        self.assertEqual([nonzero(rows) for rows in live],
+                         [nonzero(rows) for rows in rebuilt])
+
+
+    def test_statistics_paginated_with_link_header(self):
+        for i in range(2, 6):
+            User.objects.create(username=f'user{i}', team=self.team)
+
+        response = self.client.get('/api/statisticsUser/', {'limit': 2})
+        self.assertEqual(len(response.json()), 2)
+        seen = [item['user_id'] for item in response.json()]
+        while 'Link' in response:
+            next_url = response['Link'].split(';')[0].strip('<>')
+            response = self.client.get(next_url)
+            seen.extend(item['user_id'] for item in response.json())
+        self.assertEqual(seen, list(User.objects.order_by('pk').values_list('pk', flat=True)))
+
+    def test_pr_statistics_filters(self):
+        other_team = Team.objects.create(team_name='Team2')
+        other = User.objects.create(username='other', team=other_team)
+        PullRequest.objects.create(
+            pull_request_name='PR2', author=other, status='MERGED')
+
+        response = self.client.get('/api/statisticsPR/', {'team_name': 'Team2'})
+        self.assertEqual([item['pull_request_name'] for item in response.json()], ['PR2'])
+        response = self.client.get('/api/statisticsPR/', {'status': 'OPEN'})
+        self.assertEqual([item['pull_request_name'] for item in response.json()], ['PR1'])
+        response = self.client.get('/api/statisticsPR/', {'created_from': '2100-01-01'})
+        self.assertEqual(response.json(), [])
+
+    def test_statistics_invalid_params(self):
+        for url, params in (('/api/statisticsUser/', {'limit': 'x'}),
+                            ('/api/statisticsUser/', {'is_active': 'maybe'}),
+                            ('/api/statisticsPR/', {'status': 'CLOSED'}),
+                            ('/api/statisticsPR/', {'created_to': 'yesterday'}),
+                            ('/api/statisticsPR/', {'after': 'x'})):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statistics_stream_ndjson(self):
+        response = self.client.get('/api/statisticsUser/', {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line)
+                for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [{'user_id': self.user.id, 'username': 'user1',
+                                 'assignments_count': 1}])
+
+    def test_statistics_stream_csv(self):
+        response = self.client.get('/api/statisticsPR/', {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['pull_request_id,pull_request_name,reviewers_count',
+                                 f'{self.pr.id},PR1,1'])
+
+
+class ArchiveTestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.author, self.first, self.second = (
+            User.objects.create(username=f'user{i}', team=self.team) for i in range(3))
+        self.prs = []
+        for i in range(4):
+            pr = PullRequest.objects.create(
+                pull_request_name=f'PR{i}', author=self.author, status='OPEN')
+            pr.assigned_reviewers.add(self.first, *([self.second] if i % 2 else []))
+            self.prs.append(pr)
+        for pr in self.prs[:3]:
+            self.post('/api/pullRequest/merge/', {'pull_request_id': pr.pk})
+        # PR0 и PR1 смёржены давно, PR2 — только что, PR3 открыт.
+        PullRequest.objects.filter(pk__in=[pr.pk for pr in self.prs[:2]]).update(
+            merged_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    def post(self, url, data):
+        return self.client.post(url, data=json.dumps(data), content_type='application/json')
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command('archive_pull_requests', stdout=out, **options)
+        return out.getvalue()
+
+    def test_archive_moves_old_merged_pull_requests_with_links(self):
+        self.assertEqual(self.archive(batch_size=1), 'Archived 2 pull requests\n')
+
+        old, hot = [pr.pk for pr in self.prs[:2]], [pr.pk for pr in self.prs[2:]]
+        self.assertEqual(sorted(PullRequest.objects.values_list('pk', flat=True)), hot)
+        self.assertEqual(sorted(
+            ArchivedPullRequest.objects.values_list('pk', 'pull_request_name', 'reviewers_count')),
+            [(old[0], 'PR0', 1), (old[1], 'PR1', 2)])
+        self.assertEqual(set(ArchivedPullRequest.objects.get(pk=old[1]).assigned_reviewers.all()),
+                         {self.first, self.second})
+        self.assertFalse(Reviewer.objects.filter(pullrequest_id__in=old).exists())
+        self.assertFalse(PullRequestReviewStats.objects.filter(pull_request_id__in=old).exists())
+        self.assertEqual(self.archive(), 'Archived 0 pull requests\n')
+
+    def test_archive_moves_counters_and_rebuild_agrees(self):
+        self.archive()
+        stats = {row['user_id']: row for row in UserReviewStats.objects.values()}
+        self.assertEqual(
+            [(stats[user.pk]['assignments_count'], stats[user.pk]['open_assignments_count'],
+              stats[user.pk]['archived_assignments_count'])
+             for user in (self.first, self.second)],
+            [(2, 1, 2), (1, 1, 1)])
+
+        call_command('rebuild_review_stats', stdout=StringIO())
+        self.assertEqual({row['user_id']: row for row in UserReviewStats.objects.values()},
+                         stats)
+
+    def test_archive_respects_age(self):
+        self.assertEqual(self.archive(older_than=365 * 100), 'Archived 0 pull requests\n')
+        self.assertEqual(self.archive(older_than=0), 'Archived 3 pull requests\n')
+
+    def test_statistics_include_archived_only_when_asked(self):
+        self.archive()
+        names = [item['pull_request_name']
+                 for item in self.client.get('/api/statisticsPR/').json()]
+        self.assertEqual(names, ['PR2', 'PR3'])
+        users = {item['user_id']: item['assignments_count']
+                 for item in self.client.get('/api/statisticsUser/').json()}
+        self.assertEqual(users[self.first.pk], 2)
+
+        response = self.client.get('/api/statisticsPR/', {'include_archived': 'true'})
+        self.assertEqual([(item['pull_request_id'], item['pull_request_name'],
+                           item['reviewers_count']) for item in response.json()],
+                         [(pr.pk, f'PR{i}', 1 + i % 2) for i, pr in enumerate(self.prs)])
+        users = {item['user_id']: item['assignments_count'] for item in self.client.get(
+            '/api/statisticsUser/', {'include_archived': 'true'}).json()}
+        self.assertEqual((users[self.first.pk], users[self.second.pk]), (4, 2))
+
+        response = self.client.get('/api/statisticsPR/', {
+            'include_archived': 'true', 'status': 'MERGED', 'limit': 2})
+        self.assertEqual([item['pull_request_name'] for item in response.json()],
+                         ['PR0', 'PR1'])
+        response = self.client.get(response['Link'].split(';')[0].strip('<>'))
+        self.assertEqual([item['pull_request_name'] for item in response.json()], ['PR2'])
+        self.assertNotIn('Link', response)
+
+        response = self.client.get('/api/statisticsPR/', {
+            'include_archived': '1', 'status': 'OPEN', 'format': 'csv'})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[1:],
+                         [f'{self.prs[3].pk},PR3,2'])
+        response = self.client.get('/api/statisticsPR/', {'include_archived': 'maybe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_review_include_archived(self):
+        self.archive()
+        response = self.client.get('/api/users/getReview/', {'user_id': self.first.pk})
+        self.assertEqual([pr['pull_request_name'] for pr in response.json()['pull_requests']],
+                         ['PR2', 'PR3'])
+
+        seen, cursor = [], None
+        while True:
+            params = {'user_id': self.first.pk, 'include_archived': 'true', 'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/api/users/getReview/', params).json()
+            seen.extend((pr['pull_request_name'], pr['status']) for pr in data['pull_requests'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, [('PR0', 'MERGED'), ('PR1', 'MERGED'),
+                                ('PR2', 'MERGED'), ('PR3', 'OPEN')])
+
+        response = self.client.get('/api/users/getReview/', {
+            'user_id': self.first.pk, 'include_archived': 'true', 'status': 'OPEN'})
+        self.assertEqual([pr['pull_request_name'] for pr in response.json()['pull_requests']],
+                         ['PR3'])
+
+    def test_archived_pull_request_is_merged(self):
+        self.archive()
+        pr = self.prs[1]
+        response = self.post('/api/pullRequest/merge/', {'pull_request_id': pr.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['pr']['status'], 'MERGED')
+        self.assertEqual(sorted(response.json()['pr']['assigned_reviewers']),
+                         sorted([self.first.pk, self.second.pk]))
+        self.assertEqual(response.json()['pr']['merged_at'], '2020-01-01T00:00:00Z')
+
+        response = self.post('/api/pullRequest/reassign/',
+                             {'pull_request_id': pr.pk, 'old_user_id': self.first.pk})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['error']['code'], 'PR_MERGED')
+
+    def test_archived_name_stays_reserved(self):
+        self.archive()
+        response = self.post('/api/pullRequest/create/',
+                             {'pull_request_name': 'PR0', 'author_id': self.author.pk})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['error']['code'], 'PR_EXISTS')
+
+        response = self.post('/api/pullRequest/bulkCreate/', {'pull_requests': [
+            {'pull_request_name': 'PR0', 'author_id': self.author.pk},
+            {'pull_request_name': 'PR9', 'author_id': self.author.pk}]})
+        self.assertEqual([result.get('error', {}).get('code')
+                          for result in response.json()['results']], ['PR_EXISTS', None])
+        self.assertFalse(PullRequest.objects.filter(pull_request_name='PR0').exists())
+
+    def test_name_archived_during_bulk_create_is_rejected(self):
+        plans = policy_engine.plans
+
+        def archive_then_plan(team_ids):
+            # Архивация успела завершиться между проверкой имён и вставкой.
+            ArchivedPullRequest.objects.get_or_create(
+                pk=10 ** 6, defaults={
+                    'pull_request_name': 'PR9', 'author': self.author, 'status': 'MERGED',
+                    'created_at': datetime.now(timezone.utc),
+                    'merged_at': datetime.now(timezone.utc)})
+            return plans(team_ids)
+
+        events_before = ReviewEvent.objects.count()
+        with mock.patch.object(policy_engine, 'plans', side_effect=archive_then_plan):
+            response = self.post('/api/pullRequest/bulkCreate/', {'pull_requests': [
+                {'pull_request_name': 'PR9', 'author_id': self.author.pk},
+                {'pull_request_name': 'PR10', 'author_id': self.author.pk}]})
+        self.assertEqual([result.get('error', {}).get('code')
+                          for result in response.json()['results']], ['PR_EXISTS', None])
+        self.assertFalse(PullRequest.objects.filter(pull_request_name='PR9').exists())
+        self.assertEqual(ReviewEvent.objects.count(), events_before + 1)
+
+
+class MetricsTestCase(ServiceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.team = Team.objects.create(team_name='Team1')
+        self.author = User.objects.create(username='author', team=self.team)
+        User.objects.create(username='reviewer', team=self.team)
+
+    def scrape(self):
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_route_names(self):
+        self.assertEqual(metrics.route_name(resolve('/api/pullRequest/create/')),
+                         'pullRequest/create')
+        self.assertEqual(metrics.route_name(resolve('/api/team/get.json')), 'team/get')
+        self.assertEqual(metrics.route_name(resolve('/api/statisticsUser/')), 'statisticsUser')
+        self.assertEqual(metrics.route_name(None), 'unmatched')
+
+    def test_records_queries_and_size_per_route(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/pullRequest/create/', {
+                'pull_request_name': 'PR1', 'author_id': self.author.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        query_count = len(queries)
+
+        samples = self.scrape()
+        route = 'route="pullRequest/create"'
+        self.assertEqual(samples[
+            f'api_requests_total{{{route},method="POST",status="201"}}'], 1)
+        self.assertEqual(samples[f'api_db_queries_sum{{{route}}}'], query_count)
+        self.assertEqual(samples[f'api_db_queries_count{{{route}}}'], 1)
+        self.assertEqual(samples[f'api_response_size_bytes_sum{{{route}}}'],
+                         len(response.content))
+        self.assertEqual(samples[f'api_request_duration_seconds_bucket{{{route},le="+Inf"}}'], 1)
+        self.assertEqual(samples[f'api_render_duration_seconds_count{{{route}}}'], 1)
+
+    def test_streamed_response_size(self):
+        response = self.client.get('/api/statisticsUser/', {'format': 'ndjson'})
+        body = b''.join(response.streaming_content)
+
+        samples = self.scrape()
+        self.assertEqual(samples['api_response_size_bytes_sum{route="statisticsUser"}'],
+                         len(body))
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0.001)
+    def test_slow_request_log_includes_sql(self):
+        with self.assertLogs('api.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.assertIn('(team/get)', logs.output[0])
+        self.assertIn('FROM "teams_team"', logs.output[0])
+
+    def test_sums_snapshots_of_all_workers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(metrics.files.cancel)
+        other = metrics.MetricsRegistry()
+        other.observe_request('team/get', 'GET', 200, 0.02, metrics.RequestStats(), size=10)
+        metrics.SnapshotFiles(other).write(directory)
+
+        with override_settings(METRICS_MULTIPROC_DIR=directory, METRICS_FLUSH_INTERVAL=60):
+            response = self.client.get('/api/team/get/', {'team_name': 'Team1'})
+            samples = self.scrape()
+            # Свой снимок записан при сборе, поэтому повторный сбор не удваивает счётчики.
+            again = self.scrape()
+
+        route = 'route="team/get"'
+        self.assertEqual(samples[f'api_requests_total{{{route},method="GET",status="200"}}'], 2)
+        self.assertEqual(samples[f'api_response_size_bytes_sum{{{route}}}'],
+                         10 + len(response.content))
+        self.assertEqual(again[f'api_db_queries_count{{{route}}}'], 2)
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.assertNotIn('route="team/get"', self.client.get('/api/metrics').content.decode())
+
+
+class BenchmarkCommandsTestCase(ServiceAPITestCase):
+    def test_seed_benchmark(self):
+        call_command('seed_benchmark', teams=3, members=4, prs=20, reviewers=2,
+                     inactive=0, seed=1, stdout=StringIO())
+
+        self.assertEqual(Team.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(PullRequest.objects.count(), 20)
+        self.assertEqual(PullRequest.assigned_reviewers.through.objects.count(), 40)
+        self.assertEqual(PullRequestReviewStats.objects.filter(reviewers_count=2).count(), 20)
+        for pull_request in PullRequest.objects.prefetch_related('assigned_reviewers'):
+            self.assertNotIn(pull_request.author, pull_request.assigned_reviewers.all())
+            self.assertEqual({reviewer.team_id for reviewer in pull_request.assigned_reviewers.all()},
+                             {pull_request.author.team_id})
+
+    def test_run_benchmark_reports_every_endpoint(self):
+        call_command('seed_benchmark', teams=3, members=4, prs=20, seed=1, stdout=StringIO())
+        out = StringIO()
+        call_command('run_benchmark', requests=3, warmup=1, seed=1, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['dataset']['pull_requests'], 20)
+        self.assertIn('pullRequest/reassign', report['endpoints'])
+        for endpoint, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 3, endpoint)
+            self.assertTrue(all(int(code) < 500 for code in result['statuses']), endpoint)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreaterEqual(result['queries']['max'], result['queries']['min'])
+
+
+class AsyncReadViewsTestCase(TransactionTestCase):
+    """Асинхронные обёртки выполняются в другом потоке, поэтому данные коммитятся."""
+
+    def setUp(self):
+        # Соединения потоков пула не должны переживать тест, иначе
+        # тестовую базу не удастся удалить.
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        self.addCleanup(connection.settings_dict.__setitem__, 'CONN_MAX_AGE', max_age)
+        cache.clear()
+        self.factory = RequestFactory()
+        self.team = Team.objects.create(team_name='Team1')
+        self.user = User.objects.create(username='user1', team=self.team)
+        self.pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.user, status='OPEN')
+        self.pr.assigned_reviewers.add(self.user)
+
+    def test_async_view_matches_sync_view(self):
+        view = TeamViewSet.as_view({'get': 'get_team'})
+        request = self.factory.get('/api/team/get/', {'team_name': 'Team1'})
+        response = async_to_sync(read_only(view))(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content),
+                         self.client.get('/api/team/get/', {'team_name': 'Team1'}).json())
+
+    def test_async_stream_is_read_outside_event_loop(self):
+        request = self.factory.get('/api/statisticsPR/', {'format': 'ndjson'})
+        response = async_to_sync(read_only(get_pr_statistics))(request)
+
+        async def consume():
+            return b''.join(response)
+
+        self.assertEqual(json.loads(async_to_sync(consume)()), {
+            'pull_request_id': self.pr.id, 'pull_request_name': 'PR1',
+            'reviewers_count': 1})
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertIn('ETag', response)
+
+    @override_settings(ASYNC_READ_VIEWS=True, EVENTS_POLL_INTERVAL=0.01)
+    def test_async_events_wait_in_event_loop(self):
+        events.users_changed([self.user.pk], True)
+        request = self.factory.get('/api/events/', {'since': 'now', 'wait': 0.05})
+        with mock.patch('api.events.wait', wraps=events.wait) as wait:
+            response = async_to_sync(get_events_async)(request)
+
+        self.assertEqual([call.args[2] for call in wait.call_args_list], [0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {
+            'events': [], 'next_cursor': events.latest()})
+
+    @override_settings(ASYNC_READ_VIEWS=True, EVENTS_POLL_INTERVAL=0.01)
+    def test_async_events_return_events_written_while_waiting(self):
+        events.users_changed([self.user.pk], True)
+        cursor = events.latest()
+        request = self.factory.get('/api/events/', {'since': cursor, 'wait': 5})
+
+        async def wait_and_write():
+            waiting = asyncio.ensure_future(get_events_async(request))
+            await asyncio.sleep(0.05)
+            await sync_to_async(events.users_changed, thread_sensitive=False)(
+                [self.user.pk], False)
+            return await waiting
+
+        response = async_to_sync(wait_and_write)()
+        self.assertEqual([event['type'] for event in json.loads(response.content)['events']],
+                         ['user.deactivated'])
+
+    def test_async_view_queries_are_recorded(self):
+        metrics.registry.clear()
+        middleware = MetricsMiddleware(read_only(TeamViewSet.as_view({'get': 'get_team'})))
+        request = self.factory.get('/api/team/get/', {'team_name': 'Team1'})
+        request.resolver_match = resolve('/api/team/get/')
+        response = async_to_sync(middleware.__acall__)(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('api_db_queries_count{route="team/get"} 1', metrics.registry.render())
+        self.assertNotIn('api_db_queries_sum{route="team/get"} 0', metrics.registry.render())
+
+
+@override_settings(REPLICA_DATABASE='default')
+class ReplicaRoutingTestCase(ServiceAPITestCase):
+    """Реплика подменена основной базой: проверяется выбор, а не данные."""
+
+    def setUp(self):
+        super().setUp()
+        replicas.lag.clear()
+        self.addCleanup(replicas.lag.clear)
+        self.factory = RequestFactory()
+        self.router = replicas.ReplicaRouter()
+
+    def chosen(self, **headers):
+        seen = []
+
+        @replicas.read_replica
+        def view(request):
+            seen.append(self.router.db_for_read(User))
+
+        view(Request(self.factory.get('/', **headers)))
+        return seen[0]
+
+    def test_reads_go_to_replica_only_inside_read_views(self):
+        self.assertEqual(self.chosen(), 'default')
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertFalse(self.router.allow_migrate('default', 'api'))
+        with override_settings(REPLICA_DATABASE=None):
+            self.assertIsNone(self.chosen())
+            self.assertTrue(self.router.allow_migrate('default', 'api'))
+
+    def test_write_makes_client_read_from_primary(self):
+        team = Team.objects.create(team_name='Team1')
+        response = self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': User.objects.create(username='u', team=team).pk, 'is_active': False}),
+            content_type='application/json')
+        cookie = response.cookies[replicas.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertIsNone(self.chosen(HTTP_COOKIE=f'{replicas.STICKY_COOKIE}=1'))
+        self.assertIsNone(self.chosen(HTTP_X_READ_PRIMARY='1'))
+
+        self.assertNotIn(replicas.STICKY_COOKIE, self.client.get('/api/statisticsPR/').cookies)
+        response = self.client.post('/api/users/setIsActive/', data=json.dumps(
+            {'user_id': 0, 'is_active': False}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+    def test_lagging_or_unavailable_replica_falls_back_to_primary(self):
+        self.assertEqual(replicas.lag.measure('default'), 0)
+        with mock.patch.object(replicas.lag, 'measure', return_value=10.0) as measure:
+            self.assertIsNone(self.chosen())
+            self.assertIsNone(self.chosen())
+        self.assertEqual(measure.call_count, 1)
+
+        replicas.lag.clear()
+        with mock.patch.object(replicas.lag, 'measure', return_value=1.0):
+            self.assertEqual(self.chosen(), 'default')
+
+        replicas.lag.clear()
+        failing = mock.MagicMock(vendor='postgresql')
+        failing.cursor.side_effect = OperationalError('connection refused')
+        with mock.patch.object(replicas, 'connections', {'default': failing}):
+            with self.assertLogs('api.replicas', 'WARNING'):
+                self.assertIsNone(self.chosen())
+
+    def test_fresh_changes_are_not_cached_from_replica(self):
+        Team.objects.create(team_name='Team1')
+        response = self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('ETag', self.client.get('/api/statisticsUser/'))
+        self.assertEqual(roster_cache.stats()['teams'], {'hits': 0, 'misses': 1})
+        self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.assertEqual(roster_cache.stats()['teams'], {'hits': 0, 'misses': 2})
+
+        with override_settings(REPLICA_MAX_LAG=0, REPLICA_LAG_CHECK_INTERVAL=0):
+            self.assertIn('ETag', self.client.get('/api/team/get/', {'team_name': 'Team1'}))
+            self.assertIn('ETag', self.client.get('/api/statisticsUser/'))
+            self.client.get('/api/team/get/', {'team_name': 'Team1'})
+        self.assertEqual(roster_cache.stats()['teams'], {'hits': 1, 'misses': 3})
+
+
+@skipUnless(settings.REPLICA_DATABASE, 'set DB_REPLICA to run against a replica alias')
+class ReplicaIntegrationTestCase(TransactionTestCase):
+    """С ``DB_REPLICA`` реплика — отдельное соединение к тестовой базе."""
+
+    databases = {'default', settings.REPLICA_DATABASE or 'default'}
+
+    def setUp(self):
+        cache.clear()
+        replicas.lag.clear()
+        self.team = Team.objects.create(team_name='Team1')
+        self.user = User.objects.create(username='user1', team=self.team)
+        self.pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.user, status='OPEN')
+        self.pr.assigned_reviewers.add(self.user)
+
+    def queries(self, alias, *args, **kwargs):
+        client = kwargs.pop('client', self.client)
+        with CaptureQueriesContext(connections[alias]) as queries:
+            response = client.get(*args, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_read_endpoints_use_replica(self):
+        for url, params in (('/api/team/get/', {'team_name': 'Team1'}),
+                            ('/api/users/getReview/', {'user_id': self.user.pk}),
+                            ('/api/statisticsUser/', {}),
+                            ('/api/statisticsPR/', {'format': 'csv'})):
+            with CaptureQueriesContext(connections['default']) as primary:
+                self.assertGreater(self.queries(settings.REPLICA_DATABASE, url, params), 0)
+            self.assertEqual(len(primary), 0, url)
+
+    def test_client_reads_own_writes_from_primary(self):
+        client = APIClient()
+        client.post('/api/pullRequest/create/', {
+            'pull_request_name': 'PR2', 'author_id': self.user.pk}, format='json')
+        self.assertEqual(self.queries(settings.REPLICA_DATABASE, '/api/statisticsPR/',
+                                      client=client), 0)
+        self.assertGreater(self.queries(settings.REPLICA_DATABASE, '/api/statisticsPR/'), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'row locks are checked on PostgreSQL')
+class ConcurrentReassignTestCase(TransactionTestCase):
+    """Переназначения и merge одного PR из нескольких потоков, каждый со своим соединением."""
+
+    def setUp(self):
+        cache.clear()
+        workload.clear()
+        self.team = Team.objects.create(team_name='Team1')
+        self.members = [User.objects.create(username=f'user{i}', team=self.team)
+                        for i in range(8)]
+        self.pr = PullRequest.objects.create(
+            pull_request_name='PR1', author=self.members[0], status='OPEN')
+        self.pr.assigned_reviewers.set(self.members[1:3])
+
+    def post_concurrently(self, requests):
+        barrier = threading.Barrier(len(requests))
+        codes = [None] * len(requests)
+
+        def post(index, path, data):
+            client = APIClient()
+            try:
+                barrier.wait()
+                codes[index] = client.post(path, data, format='json').status_code
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=(index, *request))
+                   for index, request in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return codes
+
+    def reassign_concurrently(self, old_user_ids):
+        return self.post_concurrently([
+            ('/api/pullRequest/reassign/',
+             {'pull_request_id': self.pr.id, 'old_user_id': old_user_id})
+            for old_user_id in old_user_ids])
+
+    def open_counts(self):
+        return dict(UserReviewStats.objects.filter(
+            open_assignments_count__gt=0).values_list('user_id', 'open_assignments_count'))
+
+    def reviewer_ids(self):
+        return list(self.pr.assigned_reviewers.values_list('pk', flat=True))
+
+    def test_same_reviewer_is_replaced_once(self):
+        old_reviewer = self.members[1].id
+        codes = self.reassign_concurrently([old_reviewer] * 4)
+
+        self.assertEqual(sorted(codes), [200, 409, 409, 409])
+        reviewers = self.reviewer_ids()
+        self.assertEqual(len(reviewers), 2)
+        self.assertNotIn(old_reviewer, reviewers)
+
+    def test_different_reviewers_get_distinct_replacements(self):
+        original = {self.members[1].id, self.members[2].id}
+        codes = self.reassign_concurrently(list(original))
+
+        self.assertEqual(codes, [200, 200])
+        reviewers = self.reviewer_ids()
+        self.assertEqual(len(set(reviewers)), 2)
+        self.assertNotIn(self.members[0].id, reviewers)
+        # Второе переназначение может выбрать ревьювера, снятого первым,
+        # но не может вернуть исходный состав.
+        self.assertNotEqual(set(reviewers), original)
+        self.assertEqual(PullRequestReviewStats.objects.get(pull_request=self.pr).reviewers_count, 2)
+
+    def test_concurrent_merges_release_reviewers_once(self):
+        other = PullRequest.objects.create(
+            pull_request_name='PR2', author=self.members[0], status='OPEN')
+        other.assigned_reviewers.set(self.members[1:3])
+        codes = self.post_concurrently(
+            [('/api/pullRequest/merge/', {'pull_request_id': self.pr.id})] * 4)
+
+        self.assertEqual(codes, [200] * 4)
+        self.assertEqual(self.open_counts(), {self.members[1].id: 1, self.members[2].id: 1})
+        self.assertEqual(ReviewEvent.objects.filter(kind=events.PULL_REQUEST_MERGED).count(), 1)
+
+    def test_merge_racing_reassign_releases_current_reviewers(self):
+        codes = self.post_concurrently([
+            ('/api/pullRequest/merge/', {'pull_request_id': self.pr.id}),
+            ('/api/pullRequest/reassign/',
+             {'pull_request_id': self.pr.id, 'old_user_id': self.members[1].id})])
+
+        self.assertEqual(codes[0], 200)
+        self.assertEqual(self.open_counts(), {})
+
+    def test_concurrent_deactivations_share_one_candidate(self):
+        # Свободен только один участник: оба снятых ревьювера претендуют на него.
+        User.objects.filter(pk__in=[member.pk for member in self.members[4:]]).update(
+            is_active=False)
+        candidate = self.members[3].id
+        codes = self.post_concurrently([
+            ('/api/users/setIsActive/', {'user_id': member.id, 'is_active': False})
+            for member in self.members[1:3]])
+
+        self.assertEqual(codes, [200, 200])
+        self.assertEqual(self.reviewer_ids(), [candidate])
+        self.assertEqual(self.open_counts(), {candidate: 1})
+
+    def test_deactivation_racing_merge_releases_reviewers_once(self):
+        other = PullRequest.objects.create(
+            pull_request_name='PR2', author=self.members[0], status='OPEN')
+        other.assigned_reviewers.set(self.members[1:3])
+        codes = self.post_concurrently([
+            ('/api/pullRequest/merge/', {'pull_request_id': self.pr.id}),
+            ('/api/users/setIsActive/', {'user_id': self.members[1].id, 'is_active': False})])
+
+        self.assertEqual(codes, [200, 200])
+        counts = self.open_counts()
+        # PR2 остаётся открытым: у снятого ревьювера нет открытых назначений,
+        # у второго — одно, у замены — одно.
+        self.assertNotIn(self.members[1].id, counts)
+        self.assertEqual(counts.pop(self.members[2].id), 1)
+        self.assertEqual(sum(counts.values()), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are checked on PostgreSQL')
+class IndexUsageTestCase(ServiceAPITestCase):
+    """Планы SQL-запросов, которые выполняют сами представления."""
+
+    # Уникальное поле получает индекс уникальности и индекс ``_like`` для
+    # LIKE; для равенства планировщик берёт любой из них.
+    NAME_INDEX = 'pull_requests_pullrequest_pull_request_name_8e51d836_(uniq|like)'
+    # Без VACUUM в транзакции теста составной pr_reviewer_user_pr_idx не даёт
+    # Index Only Scan и равноценен индексу внешнего ключа user_id.
+    REVIEWER_INDEX = ('(pr_reviewer_user_pr_idx|'
+                      'pull_requests_pullrequest_assigned_reviewers_user_id_6c4a8b48)')
+
+    def setUp(self):
+        super().setUp()
+        # Планы зависят от статистики, поэтому данные похожи на рабочие:
+        # участники команд разбросаны по таблице, активных среди них мало,
+        # почти все PR смёржены.
+        teams = Team.objects.bulk_create(Team(team_name=f'Team{t}') for t in range(5))
+        users = User.objects.bulk_create(
+            User(username=f'user{t}-{i}', team=team, is_active=i < 5)
+            for i in range(200) for t, team in enumerate(teams))
+        self.author, self.reviewer = users[:2]
+        pull_requests = PullRequest.objects.bulk_create(
+            PullRequest(pull_request_name=f'PR{i}', author=users[i % len(users)],
+                        status='OPEN' if i % 20 == 0 else 'MERGED')
+            for i in range(1000))
+        Reviewer.objects.bulk_create(
+            Reviewer(pullrequest_id=pr.pk, user_id=users[(i + shift) % len(users)].pk)
+            for i, pr in enumerate(pull_requests) for shift in (1, 2))
+        with connection.cursor() as cursor:
+            for model in (User, PullRequest, Reviewer):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def post(self, path, data):
+        return self.client.post(path, data=json.dumps(data), content_type='application/json')
+
+    def explain(self, marker, request):
+        """Выполнить запрос к API и вернуть план его SQL-запроса с ``marker``."""
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        statements = [query['sql'] for query in queries if marker in query['sql']]
+        self.assertTrue(statements, f'No query contains {marker!r}')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + statements[0])
+            return '\n'.join(line for line, in cursor.fetchall())
+
+    def assertScans(self, plan, index_name):
+        self.assertNotIn('Seq Scan', plan)
+        self.assertRegex(
+            plan, rf'(Index Scan|Index Only Scan) using {index_name} |'
+                  rf'Bitmap Index Scan on {index_name} ')
+
+    def test_bulk_create_name_lookup(self):
+        plan = self.explain('"pull_requests_pullrequest"."pull_request_name" IN', lambda: self.post(
+            '/api/pullRequest/bulkCreate/', {'pull_requests': [
+                {'pull_request_name': 'new', 'author_id': self.author.pk}]}))
+        self.assertScans(plan, self.NAME_INDEX)
+
+    def test_open_reviews_of_user(self):
+        plan = self.explain('"pull_requests_pullrequest_assigned_reviewers"."user_id" =', lambda: (
+            self.client.get('/api/users/getReview/',
+                            {'user_id': self.reviewer.pk, 'status': 'OPEN'})))
+        self.assertScans(plan, self.REVIEWER_INDEX)
+
+    def test_deactivation_reviewer_lookup(self):
+        plan = self.explain('"user_id" IN', lambda: self.post(
+            '/api/users/setIsActive/', {'user_id': self.reviewer.pk, 'is_active': False}))
+        self.assertScans(plan, self.REVIEWER_INDEX)
+
+    def test_active_team_members(self):
+        plan = self.explain('"users_user"."is_active"', lambda: self.post(
+            '/api/pullRequest/create/', {'pull_request_name': 'new', 'author_id': self.author.pk}))
+        self.assertScans(plan, 'user_team_active_idx')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The backend extends the PostgreSQL one')
+class DatabaseBackendTestCase(TestCase):
+    def wrapper(self, alias, **options):
+        wrapper = DatabaseWrapper({**connection.settings_dict, **options}, alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    @staticmethod
+    def backend_pid(wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def terminate(self, pid):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+    def test_health_check_replaces_dropped_connection(self):
+        checked = self.wrapper('checked', CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True)
+        unchecked = self.wrapper('unchecked', CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=False)
+        for wrapper in (checked, unchecked):
+            self.terminate(self.backend_pid(wrapper))
+            wrapper.close_if_unusable_or_obsolete()
+
+        self.assertTrue(self.backend_pid(checked))
+        with self.assertRaises(DatabaseError):
+            self.backend_pid(unchecked)
+
+    def test_pool_reuses_and_bounds_connections(self):
+        pool_options = {'max_size': 1, 'timeout': 0.1}
+        first = self.wrapper('pooled', POOL=pool_options, CONN_HEALTH_CHECKS=True)
+        second = self.wrapper('pooled', POOL=pool_options, CONN_HEALTH_CHECKS=True)
+
+        pid = self.backend_pid(first)
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+        first.close()
+        self.assertEqual(self.backend_pid(second), pid)
+
+        second.close()
+        self.terminate(pid)
+        self.assertNotEqual(self.backend_pid(first), pid)
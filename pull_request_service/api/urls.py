@@ -1,10 +1,17 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import read_only
 from .views import (
     PullRequestViewSet,
     TeamViewSet,
     UserViewSet,
+    get_cache_statistics,
+    get_events,
+    get_events_async,
+    get_job,
+    get_metrics,
     get_pr_statistics,
     get_user_statistics,
 )
@@ -19,4 +26,18 @@ urlpatterns = [
     path("", include(router.urls)),
     path('statisticsUser/', get_user_statistics),
     path('statisticsPR/', get_pr_statistics),
+    path('statisticsCache/', get_cache_statistics),
+    path('metrics', get_metrics),
+    path('events/', get_events),
+    path('jobs/<int:job_id>/', get_job, name='job-detail'),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('team/get/', read_only(TeamViewSet.as_view({'get': 'get_team'}))),
+        path('users/getReview/',
+             read_only(UserViewSet.as_view({'get': 'get_review_prs'}))),
+        path('statisticsUser/', read_only(get_user_statistics)),
+        path('statisticsPR/', read_only(get_pr_statistics)),
+        path('events/', get_events_async),
+    ] + urlpatterns
@@ -0,0 +1,105 @@
+"""Версии данных для условных GET-запросов.
+
+Каждая область (``stats``, ``team:<name>``, ``reviews:<user_id>``) хранит в
+кэше пару (токен, время изменения). Пути записи меняют токен после коммита
+транзакции, а ``conditional`` строит из него ETag и Last-Modified и отвечает
+304, не выполняя представление.
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import parse_etags
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from . import replicas
+
+
+def _key(scope):
+    return 'version:' + hashlib.sha1(scope.encode()).hexdigest()
+
+
+class Versions:
+    @property
+    def cache(self):
+        return caches[settings.VERSION_CACHE_ALIAS]
+
+    def current(self, scope):
+        """Текущая версия области; отсутствующая версия создаётся заново."""
+        key = _key(scope)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, (uuid.uuid4().hex, time.time()), None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self, *scopes):
+        """Сменить версии областей после коммита текущей транзакции."""
+        keys = [_key(scope) for scope in set(scopes)]
+
+        def apply():
+            modified = time.time()
+            self.cache.set_many(
+                {key: (uuid.uuid4().hex, modified) for key in keys}, None)
+
+        transaction.on_commit(apply)
+
+
+versions = Versions()
+
+
+def team_scope(team_name):
+    return f'team:{team_name}'
+
+
+def reviews_scope(user_id):
+    return f'reviews:{user_id}'
+
+
+def conditional(scope):
+    """Поддержка If-None-Match и If-Modified-Since для GET-представления.
+
+    ``scope(request)`` возвращает область версии или ``None``, если запрос
+    не удаётся отнести к области — тогда представление выполняется как есть.
+    ETag учитывает также строку запроса и выбранный формат ответа.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            name = scope(request)
+            if name is None:
+                return view(*args, **kwargs)
+
+            token, modified = versions.current(name)
+            digest = hashlib.sha1('|'.join((
+                token, request.get_full_path(), request.accepted_media_type or '',
+            )).encode()).hexdigest()
+            headers = {'ETag': f'"{digest}"', 'Last-Modified': http_date(modified)}
+
+            if_none_match = request.headers.get('If-None-Match')
+            if if_none_match:
+                etags = parse_etags(if_none_match)
+                not_modified = '*' in etags or headers['ETag'] in etags
+            else:
+                since = parse_http_date_safe(request.headers.get('If-Modified-Since'))
+                not_modified = since is not None and int(modified) <= since
+            if not_modified:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            response = view(*args, **kwargs)
+            # Ответ с реплики, которая могла ещё не получить последнее
+            # изменение, нельзя закрепить за новой версией.
+            if response.status_code == status.HTTP_200_OK and not replicas.may_lag(modified):
+                for header, value in headers.items():
+                    response[header] = value
+            return response
+        return wrapper
+    return decorator
@@ -1,30 +1,79 @@
-import random
-
-from django.db import transaction
-from django.db.models import Count
+from datetime import date, datetime, time
+from time import monotonic
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.utils.timezone import now
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware, now
+from django.views.decorators.http import require_GET
 
 from rest_framework import serializers, status, viewsets
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
-from pull_requests.models import PullRequest
-from teams.models import Team
+from pull_requests.models import STATUS_CHOICES, ArchivedPullRequest, PullRequest
+from teams.models import ReviewPolicy, Team
 from users.models import User
 
+from . import counters, events, jobs, metrics, replicas
+from .archive import ArchivedReviewer
+from .assignments import Reviewer, create_pull_requests, reassign_open_reviews
+from .async_views import call, run
+from .bulk import create_teams
+from .idempotency import idempotent
+from .models import Job
+from .pagination import decode_cursor, encode_cursor, parse_after, parse_limit
+from .renderers import CSVRenderer, EventStreamRenderer, NDJSONRenderer, StreamingRenderer
+from .replicas import read_replica
+from .policies import policy_engine
+from .rosters import roster_cache
+from .selection import workload
 from .serializers import (
-    PullRequestMergeSerializer,
+    JobReadSerializer,
+    PullRequestBulkCreateSerializer,
+    PullRequestMergeReadSerializer,
+    PullRequestReadSerializer,
     PullRequestSerializer,
-    PullRequestShortSerializer,
+    ReviewPolicySerializer,
+    TeamBulkAddSerializer,
+    TeamReadSerializer,
     TeamSerializer,
+    UserReadSerializer,
+    UserTeamReadSerializer,
     UserTeamSerializer,
 )
+from .versions import conditional, reviews_scope, team_scope, versions
+
+
+def _async_requested(request):
+    """Значение ``?async=``; ValueError, если это не булево значение."""
+    return _parse_bool(request.query_params.get('async', 'false'))
+
+
+def _job_accepted(request, job):
+    data = JobReadSerializer(JobReadSerializer.row(job)).data
+    return Response({'job': data}, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': request.build_absolute_uri(
+                        reverse('job-detail', kwargs={'job_id': job.pk}))})
+
+
+def _async_error(error):
+    return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _team_data(team):
+    members = UserReadSerializer.from_queryset(team.members.order_by('pk')).data
+    return TeamReadSerializer(TeamReadSerializer.row(team, members=members)).data
 
 
 class TeamViewSet(viewsets.GenericViewSet):
-    queryset = Team.objects.all()
+    queryset = Team.objects.prefetch_related('members')
     serializer_class = TeamSerializer
 
     def get_success_headers(self, data):
@@ -34,26 +83,83 @@ class TeamViewSet(viewsets.GenericViewSet):
             return {}
 
     @action(detail=False, methods=['post'], url_path='add')
+    @idempotent
     def add_team(self, request, *args, **kwargs):
-        team_name = request.data.get('team_name')
-        if Team.objects.filter(team_name=team_name).exists():
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.save()
+        except IntegrityError:
+            team_name = serializer.validated_data['team_name']
             return Response(
                 {'error': {'code': 'TEAM_EXISTS',
                            'message': f'{team_name} already exists'}},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        serializer = self.get_serializer(data=request.data)
+        team = serializer.instance
+        roster_cache.invalidate(team_ids=[team.pk], team_names=[team.team_name])
+        data = _team_data(team)
+        headers = self.get_success_headers(data)
+        return Response({'team': data}, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=False, methods=['post'], url_path='bulkAdd')
+    @idempotent
+    def bulk_add_teams(self, request, *args, **kwargs):
+        try:
+            run_async = _async_requested(request)
+        except ValueError as e:
+            return _async_error(e)
+        serializer = TeamBulkAddSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        headers = self.get_success_headers(serializer.data)
-        return Response({'team': serializer.data}, status=status.HTTP_201_CREATED, headers=headers)
+        if run_async:
+            return _job_accepted(request, jobs.enqueue(
+                'team.bulkAdd', {'items': serializer.validated_data['teams']}))
+        results = create_teams(serializer.validated_data['teams'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], url_path='get')
+    @read_replica
+    @conditional(lambda request: team_scope(request.query_params['team_name'])
+                 if request.query_params.get('team_name') else None)
     def get_team(self, request, *args, **kwargs):
         team_name = request.query_params.get('team_name')
-        team = get_object_or_404(self.get_queryset(), team_name=team_name)
-        serializer = self.get_serializer(team)
-        return Response(serializer.data)
+        if not team_name:
+            raise Http404
+
+        def build():
+            serializer = TeamReadSerializer.from_queryset(Team.objects.filter(team_name=team_name))
+            return serializer.data[0] if serializer.instance else None
+
+        # Состав, прочитанный с отстающей реплики, кэшировался бы до
+        # следующего изменения команды.
+        store = not replicas.may_lag(versions.current(team_scope(team_name))[1])
+        payload = roster_cache.team(team_name, build, store=store)
+        if payload is None:
+            raise Http404
+        return Response(payload)
+
+    @action(detail=False, methods=['post'], url_path='setPolicy')
+    def set_policy(self, request, *args, **kwargs):
+        serializer = ReviewPolicySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        names = {data['team_name'], *data['fallback_teams']}
+        teams = dict(Team.objects.filter(team_name__in=names).values_list('team_name', 'pk'))
+        missing = sorted(names - teams.keys())
+        if missing:
+            return Response(
+                {'error': {'code': 'NOT_FOUND',
+                           'message': f'teams not found: {", ".join(missing)}'}},
+                status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            policy, _ = ReviewPolicy.objects.update_or_create(
+                team_id=teams[data['team_name']],
+                defaults={'reviewers_count': data['reviewers_count'],
+                          'exclude_recent': data['exclude_recent']})
+            policy.fallback_teams.set([teams[name] for name in data['fallback_teams']])
+        return Response({'policy': data}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='deactivate')
     def deactivate_team(self, request, *args, **kwargs):
@@ -64,17 +170,49 @@ class TeamViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            run_async = _async_requested(request)
+        except ValueError as e:
+            return _async_error(e)
+
         team = get_object_or_404(Team, team_name=team_name)
+        if run_async:
+            return _job_accepted(request, jobs.enqueue(
+                'team.deactivate', {'team_name': team.team_name}))
 
         with transaction.atomic():
+            members = dict(team.members.values_list('pk', 'is_active'))
+            member_ids = list(members)
             team.members.update(is_active=False)
+            events.users_changed(
+                [pk for pk, is_active in members.items() if is_active], is_active=False)
+            reassignment = reassign_open_reviews(member_ids)
+            roster_cache.invalidate(team_ids=[team.pk], team_names=[team_name])
+
+        data = _team_data(team)
+        return Response({'team': data, 'reassignment': reassignment},
+                        status=status.HTTP_200_OK)
+
+
+def _reviews_scope(request):
+    user_id = request.query_params.get('user_id', '')
+    return reviews_scope(int(user_id)) if user_id.isdigit() else None
 
-        serializer = self.get_serializer(team)
-        return Response({'team': serializer.data}, status=status.HTTP_200_OK)
+
+def _review_rows(model, user_id, pr_status, after):
+    pull_requests = model.objects.filter(assigned_reviewers=user_id)
+    if pr_status:
+        pull_requests = pull_requests.filter(status=pr_status)
+    if after:
+        created_at, pk = after
+        pull_requests = pull_requests.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+    return pull_requests.order_by().values(
+        'pk', 'pull_request_name', 'author_id', 'status', 'created_at')
 
 
 class UserViewSet(viewsets.GenericViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('team')
     serializer_class = UserTeamSerializer
 
     @action(detail=False, methods=['post'], url_path='setIsActive')
@@ -87,33 +225,40 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user = get_object_or_404(User, pk=user_id)
+        try:
+            run_async = _async_requested(request)
+        except ValueError as e:
+            return _async_error(e)
+
+        user = get_object_or_404(self.get_queryset(), pk=user_id)
+        if run_async:
+            return _job_accepted(request, jobs.enqueue(
+                'users.setIsActive', {'user_id': user.pk, 'is_active': is_active}))
 
         with transaction.atomic():
+            if user.is_active != is_active:
+                events.users_changed([user.pk], is_active)
             user.is_active = is_active
             user.save()
 
             if not is_active:
-                open_prs = user.review_assignments.filter(status='OPEN')
-
-                for pr in open_prs:
-                    pr.assigned_reviewers.remove(user)
-
-                    candidates = pr.author.team.members.filter(is_active=True).exclude(
-                        pk__in=[pr.author.pk] +
-                        list(pr.assigned_reviewers.values_list('pk', flat=True))
-                    )
+                reassignment = reassign_open_reviews([user.pk])
+            roster_cache.invalidate(team_ids=[user.team_id],
+                                    team_names=[user.team.team_name])
 
-                    if candidates.exists():
-                        new_reviewer = random.choice(list(candidates))
-                        pr.assigned_reviewers.add(new_reviewer)
+        if is_active:
+            workload.refresh(user.team_id, [user.pk])
+        else:
+            workload.forget([user.pk])
 
-                    pr.save()
-
-        serializer = self.get_serializer(user)
-        return Response({'user': serializer.data}, status=status.HTTP_200_OK)
+        data = {'user': UserTeamReadSerializer(UserTeamReadSerializer.row(user)).data}
+        if not is_active:
+            data['reassignment'] = reassignment
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], url_path='getReview')
+    @read_replica
+    @conditional(_reviews_scope)
     def get_review_prs(self, request, *args, **kwargs):
         user_id = request.query_params.get('user_id')
         if not user_id:
@@ -122,13 +267,48 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user = get_object_or_404(User, pk=user_id)
-        pull_requests = user.review_assignments.all()
-        serializer = PullRequestShortSerializer(pull_requests, many=True)
+        pr_status = request.query_params.get('status')
+        if pr_status and pr_status not in dict(STATUS_CHOICES):
+            return Response(
+                {"detail": "status must be OPEN or MERGED"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = parse_limit(request.query_params.get('limit'),
+                                settings.REVIEW_PAGE_SIZE,
+                                settings.REVIEW_PAGE_MAX_SIZE)
+            cursor = request.query_params.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+            include_archived = _parse_bool(request.query_params.get('include_archived', 'false'))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = get_object_or_404(User.objects.only('pk'), pk=user_id)
+        pull_requests = _review_rows(PullRequest, user.pk, pr_status, after)
+        # В архиве только смёрженные PR; их ключи не пересекаются с
+        # ключами горячей таблицы, поэтому курсор общий.
+        if include_archived and pr_status != 'OPEN':
+            pull_requests = pull_requests.union(
+                _review_rows(ArchivedPullRequest, user.pk, pr_status, after), all=True)
+
+        rows = list(pull_requests.order_by('created_at', 'pk')[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['pk'])
 
         return Response({
             'user_id': user_id,
-            'pull_requests': serializer.data
+            'pull_requests': [
+                {
+                    'pull_request_id': row['pk'],
+                    'pull_request_name': row['pull_request_name'],
+                    'author_id': row['author_id'],
+                    'status': row['status']
+                } for row in rows
+            ],
+            'next_cursor': next_cursor
         }, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='changeTeam')
@@ -142,7 +322,7 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user = get_object_or_404(User, pk=user_id)
+        user = get_object_or_404(self.get_queryset(), pk=user_id)
         new_team = get_object_or_404(Team, team_name=new_team_name)
 
         open_prs = user.review_assignments.filter(status='OPEN')
@@ -153,11 +333,14 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_409_CONFLICT,
             )
 
+        old_team = user.team
         user.team = new_team
         user.save()
+        roster_cache.invalidate(team_ids=[old_team.pk, new_team.pk],
+                                team_names=[old_team.team_name, new_team.team_name])
 
-        serializer = self.get_serializer(user)
-        return Response({'user': serializer.data}, status=status.HTTP_200_OK)
+        data = UserTeamReadSerializer(UserTeamReadSerializer.row(user)).data
+        return Response({'user': data}, status=status.HTTP_200_OK)
 
 
 class PullRequestViewSet(viewsets.GenericViewSet):
@@ -165,6 +348,7 @@ class PullRequestViewSet(viewsets.GenericViewSet):
     serializer_class = PullRequestSerializer
 
     @action(detail=False, methods=['post'], url_path='create')
+    @idempotent
     def create_pull_request(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -183,7 +367,25 @@ class PullRequestViewSet(viewsets.GenericViewSet):
                                "message": "Author/team not found"}},
                     status=status.HTTP_404_NOT_FOUND)
 
-        return Response({'pr': serializer.data}, status=status.HTTP_201_CREATED)
+        pull_request = serializer.instance
+        data = PullRequestReadSerializer(PullRequestReadSerializer.row(
+            pull_request, assigned_reviewers=pull_request.reviewer_ids)).data
+        return Response({'pr': data}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulkCreate')
+    @idempotent
+    def bulk_create_pull_requests(self, request, *args, **kwargs):
+        try:
+            run_async = _async_requested(request)
+        except ValueError as e:
+            return _async_error(e)
+        serializer = PullRequestBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if run_async:
+            return _job_accepted(request, jobs.enqueue(
+                'pullRequest.bulkCreate', {'items': serializer.validated_data['pull_requests']}))
+        results = create_pull_requests(serializer.validated_data['pull_requests'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='merge')
     def merge_pull_request(self, request, *args, **kwargs):
@@ -195,24 +397,50 @@ class PullRequestViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        pull_request = get_object_or_404(PullRequest, pk=pull_request_id)
+        try:
+            pull_request = self.get_queryset().get(pk=pull_request_id)
+            links = Reviewer.objects.filter(pullrequest_id=pull_request.pk)
+        except PullRequest.DoesNotExist:
+            # PR из архива уже смёржен: ответ такой же, как на повторный merge.
+            pull_request = get_object_or_404(ArchivedPullRequest, pk=pull_request_id)
+            links = ArchivedReviewer.objects.filter(archivedpullrequest_id=pull_request.pk)
+        links = links.order_by('user_id').values_list('user_id', flat=True)
 
         if pull_request.status == 'MERGED':
-            serializer = PullRequestMergeSerializer(pull_request)
-            return Response({'pr': serializer.data}, status=status.HTTP_200_OK)
-
-        pull_request.status = 'MERGED'
-        pull_request.merged_at = now()
-        pull_request.save()
+            reviewer_ids = list(links)
+        else:
+            # Статус меняется условным UPDATE: из параллельных merge его
+            # выполняет один, а переназначение того же PR (оно блокирует
+            # строку) завершается до него, поэтому ревьюверы читаются уже
+            # после UPDATE.
+            with transaction.atomic():
+                merged_at = now()
+                merged = PullRequest.objects.filter(
+                    pk=pull_request.pk, status='OPEN',
+                ).update(status='MERGED', merged_at=merged_at)
+                reviewer_ids = list(links)
+                if merged:
+                    counters.pull_request_merged(reviewer_ids)
+                    events.pull_request_merged(pull_request.pk, reviewer_ids)
+            if merged:
+                pull_request.status, pull_request.merged_at = 'MERGED', merged_at
+                workload.release(reviewer_ids)
+            else:
+                pull_request.refresh_from_db(fields=['status', 'merged_at'])
 
-        serializer = PullRequestMergeSerializer(pull_request)
-        return Response({'pr': serializer.data}, status=status.HTTP_200_OK)
+        data = PullRequestMergeReadSerializer(PullRequestMergeReadSerializer.row(
+            pull_request, assigned_reviewers=reviewer_ids)).data
+        return Response({'pr': data}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='reassign')
     def reassign_reviewer(self, request, *args, **kwargs):
         pull_request_id = request.data.get('pull_request_id')
         old_user_id = request.data.get('old_user_id')
 
+        try:
+            pull_request_id, old_user_id = int(pull_request_id), int(old_user_id)
+        except (TypeError, ValueError):
+            pull_request_id = old_user_id = None
         if not pull_request_id or not old_user_id:
             return Response(
                 {"error": {"code": "BAD_REQUEST",
@@ -220,71 +448,358 @@ class PullRequestViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        pull_request = get_object_or_404(PullRequest, pk=pull_request_id)
+        # Строка PR блокируется до конца транзакции, поэтому параллельные
+        # переназначения одного PR выполняются по очереди и видят состав
+        # ревьюверов, оставленный предыдущим.
+        with transaction.atomic():
+            try:
+                pull_request = PullRequest.objects.select_for_update().get(pk=pull_request_id)
+            except PullRequest.DoesNotExist:
+                pull_request = get_object_or_404(
+                    ArchivedPullRequest.objects.only('status'), pk=pull_request_id)
 
-        if pull_request.status == 'MERGED':
-            return Response(
-                {"error": {"code": "PR_MERGED", "message": "cannot reassign on merged PR"}},
-                status=status.HTTP_409_CONFLICT,
-            )
+            if pull_request.status == 'MERGED':
+                return Response(
+                    {"error": {"code": "PR_MERGED", "message": "cannot reassign on merged PR"}},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            reviewers = dict(Reviewer.objects.filter(
+                pullrequest_id=pull_request.pk).values_list('user_id', 'user__team_id'))
+            if old_user_id not in reviewers:
+                get_object_or_404(User.objects.only('pk'), pk=old_user_id)
+                return Response(
+                    {"error": {"code": "NOT_ASSIGNED",
+                               "message": "reviewer is not assigned to this PR"}},
+                    status=status.HTTP_409_CONFLICT,
+                )
 
-        old_reviewer = get_object_or_404(User, pk=old_user_id)
+            team_id = reviewers[old_user_id]
+            plan = policy_engine.plans([team_id])[team_id]
+            chosen = policy_engine.choose(
+                plan, exclude={*reviewers, pull_request.author_id}, k=1)
 
-        if old_reviewer not in pull_request.assigned_reviewers.all():
-            return Response(
-                {"error": {"code": "NOT_ASSIGNED",
-                           "message": "reviewer is not assigned to this PR"}},
-                status=status.HTTP_409_CONFLICT,
-            )
+            if not chosen:
+                return Response(
+                    {"error": {"code": "NO_CANDIDATE",
+                               "message": "no active replacement candidate in team"}},
+                    status=status.HTTP_409_CONFLICT,
+                )
 
-        candidates = list(
-            old_reviewer.team.members.filter(is_active=True)
-            .exclude(pk__in=[old_reviewer.pk] + list(pull_request.assigned_reviewers.values_list('pk', flat=True)) + [pull_request.author.pk])
-        )
+            [new_reviewer_id] = chosen
 
-        if not candidates:
-            return Response(
-                {"error": {"code": "NO_CANDIDATE",
-                           "message": "no active replacement candidate in team"}},
-                status=status.HTTP_409_CONFLICT,
-            )
+            Reviewer.objects.filter(
+                pullrequest_id=pull_request.pk, user_id=old_user_id).delete()
+            Reviewer.objects.create(pullrequest_id=pull_request.pk, user_id=new_reviewer_id)
+            added, removed = [(pull_request.pk, new_reviewer_id)], [(pull_request.pk, old_user_id)]
+            counters.reviewers_changed(added=added, removed=removed)
+            events.reviewers_changed(added=added, removed=removed)
 
-        new_reviewer = random.choice(candidates)
+        workload.release([old_user_id])
+        workload.assign([new_reviewer_id])
+        policy_engine.remember([plan])
+
+        data = PullRequestReadSerializer(PullRequestReadSerializer.row(
+            pull_request, assigned_reviewers=[
+                *(user_id for user_id in reviewers if user_id != old_user_id),
+                new_reviewer_id])).data
+        return Response({'pr': data, 'replaced_by': new_reviewer_id}, status=status.HTTP_200_OK)
 
-        with transaction.atomic():
-            pull_request.assigned_reviewers.remove(old_reviewer)
-            pull_request.assigned_reviewers.add(new_reviewer)
-            pull_request.save()
 
-        serializer = self.get_serializer(pull_request)
-        return Response({'pr': serializer.data, 'replaced_by': new_reviewer.pk}, status=status.HTTP_200_OK)
+@api_view(['GET'])
+def get_job(request, job_id):
+    job = get_object_or_404(Job, pk=job_id)
+    return Response(JobReadSerializer(JobReadSerializer.row(job)).data)
 
 
 @api_view(['GET'])
+def get_cache_statistics(request):
+    return Response(roster_cache.stats())
+
+
+def _parse_wait(value):
+    if value in (None, ''):
+        return 0
+    try:
+        wait = float(value)
+    except ValueError as e:
+        raise ValueError('wait must be a number') from e
+    if not 0 <= wait <= settings.EVENTS_MAX_WAIT:
+        raise ValueError(f'wait must be between 0 and {settings.EVENTS_MAX_WAIT:g}')
+    return wait
+
+
+# Как часто отправлять комментарий в простаивающий поток SSE, чтобы
+# прокси не закрывали соединение.
+SSE_HEARTBEAT = 15
+
+
+def _sync_duration(seconds):
+    """Сколько синхронный запрос к /api/events/ может ждать событий.
+
+    В WSGI-режиме ожидание занимает воркер gunicorn, а синхронные воркеры
+    убиваются через GUNICORN_TIMEOUT, поэтому ожидание обрывается раньше.
+    """
+    return min(seconds, settings.EVENTS_SYNC_MAX_DURATION)
+
+
+def _event_stream(renderer, rows, cursor, limit):
+    """Поток SSE: уже прочитанные ``rows`` и новые события до таймаута.
+
+    В ASGI-режиме потоковый ответ дочитывается целиком до отправки
+    (см. ``async_views``), а событий уже подождал ``get_events_async``,
+    поэтому поток закрывается сразу после прочитанных событий, и
+    EventSource переподключается с заголовком Last-Event-ID.
+    """
+    deadline = monotonic() + _sync_duration(settings.EVENTS_STREAM_TIMEOUT)
+    yield f'retry: {int(settings.EVENTS_POLL_INTERVAL * 1000)}\n\n'
+    while True:
+        for row in rows:
+            event = events.to_representation(row)
+            cursor = event.pop('cursor')
+            yield renderer.event(event, event=event['type'], event_id=cursor)
+        remaining = deadline - monotonic()
+        if remaining <= 0 or settings.ASYNC_READ_VIEWS:
+            return
+        try:
+            rows = events.wait(cursor, limit, min(SSE_HEARTBEAT, remaining))
+        except events.CursorExpired:
+            yield renderer.event({'code': 'CURSOR_EXPIRED'}, event='error')
+            return
+        if not rows:
+            yield ': keep-alive\n\n'
+
+
+def _events_query(request):
+    """Курсор, ``limit`` и ``wait`` запроса к /api/events/.
+
+    ``since=now`` заменяется курсором последнего события; ValueError, если
+    параметры некорректны.
+    """
+    cursor = request.GET.get('since') or request.headers.get('Last-Event-ID')
+    limit = parse_limit(request.GET.get('limit'),
+                        settings.EVENTS_PAGE_SIZE, settings.EVENTS_PAGE_MAX_SIZE)
+    wait = _parse_wait(request.GET.get('wait'))
+    if cursor == 'now':
+        cursor = events.latest()
+    elif cursor:
+        events.decode_cursor(cursor)
+    else:
+        cursor = None
+    return cursor, limit, wait
+
+
+@api_view(['GET'])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer])
+def get_events(request, query=None):
+    """События назначений после курсора ``since`` (или Last-Event-ID).
+
+    ``since=now`` начинает с конца журнала. С ``wait`` запрос ждёт до
+    стольких секунд, пока не появятся события; с ``Accept:
+    text/event-stream`` события отдаются потоком SSE. ``query`` — уже
+    разобранные параметры от ``get_events_async``, который ждёт событий
+    сам.
+    """
+    if query is None:
+        try:
+            query = _events_query(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    cursor, limit, wait = query
+
+    renderer = request.accepted_renderer
+    streaming = isinstance(renderer, EventStreamRenderer)
+    timeout = 0 if streaming or settings.ASYNC_READ_VIEWS else _sync_duration(wait)
+    try:
+        rows = events.wait(cursor, limit, timeout)
+    except events.CursorExpired:
+        return Response(
+            {'error': {'code': 'CURSOR_EXPIRED',
+                       'message': 'events after this cursor have been pruned'}},
+            status=status.HTTP_410_GONE)
+
+    if streaming:
+        response = StreamingHttpResponse(
+            _event_stream(renderer, rows, cursor, limit),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    data = [events.to_representation(row) for row in rows]
+    return Response({'events': data,
+                     'next_cursor': data[-1]['cursor'] if data else cursor})
+
+
+async def get_events_async(request):
+    """``get_events`` для ASGI: событий ждёт цикл событий, а не поток.
+
+    Ожидание в ``get_events`` заняло бы поток общего пула на всё время
+    long-poll, и несколько подписчиков вытеснили бы остальные читающие
+    эндпоинты. Здесь поток нужен только для коротких чтений журнала, а
+    ответ строит ``get_events`` без ожидания.
+    """
+    try:
+        query = await run(_events_query, request)
+    except ValueError:
+        return await call(get_events, request)
+    cursor, limit, wait = query
+
+    accept = request.headers.get('Accept', '')
+    streaming = (request.GET.get('format') == EventStreamRenderer.format
+                 or EventStreamRenderer.media_type in accept)
+    try:
+        await events.wait_async(cursor, limit, SSE_HEARTBEAT if streaming else wait)
+    except events.CursorExpired:
+        pass
+    return await call(get_events, request, query=query)
+
+
+@require_GET
+def get_metrics(request):
+    directory = settings.METRICS_MULTIPROC_DIR
+    source = metrics.files.collect(directory) if directory else metrics.registry
+    return HttpResponse(source.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+STATISTICS_RENDERERS = [
+    *api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, CSVRenderer]
+
+
+def _parse_bool(value):
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(f'{value} is not a boolean')
+
+
+def _parse_datetime(name, value):
+    try:
+        parsed = parse_datetime(value) or datetime.combine(
+            date.fromisoformat(value), time.min)
+    except ValueError as e:
+        raise ValueError(f'{name} must be an ISO 8601 date or datetime') from e
+    return make_aware(parsed) if is_naive(parsed) else parsed
+
+
+def _statistics_response(request, stats, key, fields, archived=None):
+    """Отдать статистику страницей JSON или потоком NDJSON/CSV.
+
+    Строки упорядочены по ``key``; следующая страница JSON-ответа
+    передаётся в заголовке ``Link`` с параметром ``after``. ``archived`` —
+    пара (queryset, поля) строк архива, которые добавляются к ``stats``
+    через UNION ALL; поля перечисляются в порядке столбцов ``fields``.
+    """
+    try:
+        after = parse_after(request.query_params.get('after'))
+        limit = parse_limit(request.query_params.get('limit'),
+                            settings.STATS_PAGE_SIZE,
+                            settings.STATS_PAGE_MAX_SIZE)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    sources = [(stats, fields)] if archived is None else [(stats, fields), archived]
+    for i, (queryset, names) in enumerate(sources):
+        queryset = queryset.order_by().values(*names)
+        if after is not None:
+            queryset = queryset.filter(**{f'{key}__gt': after})
+        sources[i] = queryset
+    stats = sources[0].union(sources[1], all=True) if archived else sources[0]
+    stats = stats.order_by(key)
+
+    renderer = request.accepted_renderer
+    if isinstance(renderer, StreamingRenderer):
+        # Поток читается после выхода из представления: база фиксируется
+        # сейчас, пока действует выбор read_replica.
+        stats = stats.using(stats.db)
+        if 'limit' in request.query_params:
+            stats = stats[:limit]
+        return StreamingHttpResponse(
+            renderer.stream(stats.iterator(chunk_size=settings.STATS_STREAM_CHUNK_SIZE), fields),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+
+    data = list(stats[:limit + 1])
+    headers = {}
+    if len(data) > limit:
+        data = data[:limit]
+        query = request.query_params.copy()
+        query['after'] = data[-1][key]
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+        headers['Link'] = f'<{next_url}>; rel="next"'
+    return Response(data, headers=headers)
+
+
+@api_view(['GET'])
+@renderer_classes(STATISTICS_RENDERERS)
+@read_replica
+@conditional(lambda request: 'stats')
 def get_user_statistics(request):
-    stats = User.objects.annotate(assignments_count=Count(
-        'review_assignments')).values('pk', 'username', 'assignments_count')
+    try:
+        include_archived = _parse_bool(request.query_params.get('include_archived', 'false'))
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    assignments_count = Coalesce('review_stats__assignments_count', 0)
+    if include_archived:
+        assignments_count += Coalesce('review_stats__archived_assignments_count', 0)
+    stats = User.objects.annotate(user_id=F('pk'), assignments_count=assignments_count)
+
+    team_name = request.query_params.get('team_name')
+    if team_name:
+        stats = stats.filter(team__team_name=team_name)
+    is_active = request.query_params.get('is_active')
+    if is_active:
+        try:
+            stats = stats.filter(is_active=_parse_bool(is_active))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    data = [
-        {
-            'user_id': user['pk'],
-            'username': user['username'],
-            'assignments_count': user['assignments_count']
-        } for user in stats
-    ]
-    return Response(data)
+    return _statistics_response(
+        request, stats, 'user_id', ('user_id', 'username', 'assignments_count'))
 
 
 @api_view(['GET'])
+@renderer_classes(STATISTICS_RENDERERS)
+@read_replica
+@conditional(lambda request: 'stats')
 def get_pr_statistics(request):
-    stats = PullRequest.objects.annotate(reviewers_count=Count(
-        'assigned_reviewers')).values('pk', 'pull_request_name', 'reviewers_count')
-
-    data = [
-        {
-            'pull_request_id': pr['pk'],
-            'pull_request_name': pr['pull_request_name'],
-            'reviewers_count': pr['reviewers_count']
-        } for pr in stats
-    ]
-    return Response(data)
+    stats = PullRequest.objects.annotate(
+        pull_request_id=F('pk'),
+        reviewers_count=Coalesce('review_stats__reviewers_count', 0))
+    # Число ревьюверов архивного PR хранится в его строке, под другим
+    # именем, потому что аннотация не может совпадать с полем модели.
+    archived = ArchivedPullRequest.objects.annotate(
+        pull_request_id=F('pk'), archived_reviewers_count=F('reviewers_count'))
+    try:
+        include_archived = _parse_bool(request.query_params.get('include_archived', 'false'))
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    team_name = request.query_params.get('team_name')
+    if team_name:
+        stats = stats.filter(author__team__team_name=team_name)
+        archived = archived.filter(author__team__team_name=team_name)
+    pr_status = request.query_params.get('status')
+    if pr_status:
+        if pr_status not in dict(STATUS_CHOICES):
+            return Response({'detail': 'status must be OPEN or MERGED'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        stats = stats.filter(status=pr_status)
+        archived = archived.filter(status=pr_status)
+    try:
+        for param, lookup in (('created_from', 'created_at__gte'),
+                              ('created_to', 'created_at__lt')):
+            value = request.query_params.get(param)
+            if value:
+                value = _parse_datetime(param, value)
+                stats = stats.filter(**{lookup: value})
+                archived = archived.filter(**{lookup: value})
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return _statistics_response(
+        request, stats, 'pull_request_id',
+        ('pull_request_id', 'pull_request_name', 'reviewers_count'),
+        archived=(archived, ('pull_request_id', 'pull_request_name',
+                             'archived_reviewers_count')) if include_archived else None)
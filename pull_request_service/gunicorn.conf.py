@@ -0,0 +1,55 @@
+"""Настройки gunicorn для запуска сервиса.
+
+SERVER_MODE выбирает точку входа: ``asgi`` (по умолчанию) — uvicorn-воркеры
+и асинхронные читающие представления, ``wsgi`` — синхронные воркеры.
+
+Составы команд, версии для ETag и правила назначения кэшируются и
+сбрасываются в кэше ``CACHE_BACKEND``. ``LocMemCache`` (по умолчанию) у
+каждого процесса свой, и сброс в одном воркере не дошёл бы до соседних,
+поэтому без общего кэша запускается один воркер, а больший
+WEB_CONCURRENCY отвергается.
+
+Метрики тоже копятся в памяти процесса. При нескольких воркерах они
+сохраняют снимки в общий каталог ``METRICS_MULTIPROC_DIR`` (по умолчанию
+временный), и ``/api/metrics`` отдаёт сумму по всем воркерам.
+"""
+import multiprocessing
+import os
+import tempfile
+
+shared_cache = not os.getenv('CACHE_BACKEND', 'locmem.LocMemCache').endswith('locmem.LocMemCache')
+
+bind = os.getenv('BIND', '0.0.0.0:8080')
+workers = int(os.getenv('WEB_CONCURRENCY',
+                        multiprocessing.cpu_count() * 2 + 1 if shared_cache else 1))
+if workers > 1 and not shared_cache:
+    raise SystemExit(
+        f'WEB_CONCURRENCY={workers} needs a cache shared between processes: '
+        'set CACHE_BACKEND and CACHE_LOCATION (for example memcached) or run one worker')
+if workers > 1 and not os.getenv('METRICS_MULTIPROC_DIR'):
+    os.environ['METRICS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='pr-service-metrics-')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+if os.getenv('SERVER_MODE', 'asgi') == 'asgi':
+    wsgi_app = 'pull_request_service.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'pull_request_service.wsgi:application'
+    threads = int(os.getenv('GUNICORN_THREADS', 1))
+    worker_class = 'gthread' if threads > 1 else 'sync'
+
+
+def on_starting(server):
+    """Удалить снимки метрик, оставшиеся от прошлого запуска."""
+    directory = os.getenv('METRICS_MULTIPROC_DIR')
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
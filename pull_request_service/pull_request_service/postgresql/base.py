@@ -0,0 +1,151 @@
+"""PostgreSQL-бэкенд с проверкой соединений и пулом.
+
+Django 3.2 не умеет ни CONN_HEALTH_CHECKS (появилось в 4.1), ни пула
+соединений (5.1), поэтому оба механизма добавлены поверх стандартного
+бэкенда и настраиваются дополнительными ключами DATABASES:
+
+- ``CONN_HEALTH_CHECKS`` — перед первым использованием в новом запросе
+  переиспользуемое соединение проверяется и при необходимости
+  переоткрывается, вместо ошибки в середине обработки запроса;
+- ``POOL`` — ``{'max_size': ..., 'timeout': ...}``: закрытие соединения
+  возвращает его в общий для процесса пул, а открытие берёт из пула.
+"""
+import threading
+
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.base import Database
+
+
+class ConnectionPool:
+    """Ограниченный пул psycopg2-соединений процесса."""
+
+    def __init__(self, max_size, timeout):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def acquire(self, connect, check=None):
+        """Взять свободное соединение или открыть новое через ``connect``.
+
+        Свободные соединения, не прошедшие ``check``, закрываются.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError('connection pool exhausted')
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    return connect()
+                if not connection.closed and (check is None or check(connection)):
+                    return connection
+                connection.close()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        try:
+            if (not connection.closed and connection.info.transaction_status
+                    != Database.extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Database.Error:
+            connection.close()
+        if not connection.closed:
+            with self._lock:
+                self._idle.append(connection)
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools(database_name):
+    """Закрыть свободные соединения всех пулов к базе ``database_name``."""
+    with _pools_lock:
+        pools = [pool for (_, name, *_), pool in _pools.items() if name == database_name]
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула не дали бы удалить тестовую базу.
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    health_check_done = False
+    # Пул, из которого взято текущее соединение: NAME в settings_dict может
+    # смениться, пока соединение открыто (например, при создании тестовой БД).
+    connection_pool = None
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        key = (self.alias, *(self.settings_dict[name]
+                             for name in ('NAME', 'USER', 'HOST', 'PORT')))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    options.get('max_size', 10), options.get('timeout', 30))
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        check = self._usable if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+        connection = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params), check)
+        self.connection_pool = pool
+        return connection
+
+    def connect(self):
+        # Свежее соединение проверять незачем; флаг ставится до connect(),
+        # который сам вызывает ensure_connection() из set_autocommit().
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def _close(self):
+        pool, self.connection_pool = self.connection_pool, None
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection)
+
+    @staticmethod
+    def _usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
@@ -5,12 +5,14 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-dn3&!)upxxck9s5-yi*q@pvvu4n$6u-&dd2guy5zv%la8g2jsd'
+SECRET_KEY = os.getenv(
+    'SECRET_KEY',
+    'django-insecure-dn3&!)upxxck9s5-yi*q@pvvu4n$6u-&dd2guy5zv%la8g2jsd')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
 
 # Application definition
@@ -30,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,17 +66,57 @@ WSGI_APPLICATION = 'pull_request_service.wsgi.application'
 
 # Database
 
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'pull_request_service.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'mysecretpassword'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # With a pool, connections go back to the pool at the end of each request
+        'CONN_MAX_AGE': 0 if DB_POOL_MAX_SIZE else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() in ('true', '1'),
+        'POOL': {
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        } if DB_POOL_MAX_SIZE else None,
+        # pgbouncer in transaction pooling mode does not support server-side cursors
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', 'False').lower() in ('true', '1'),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# Local SQLite database, e.g. for benchmarks without PostgreSQL
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'postgresql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+    }
+
+# Read replica for the read-only endpoints: a PostgreSQL host, or a file
+# path when DB_ENGINE is sqlite (e.g. the primary's own file for local runs)
+
+DB_REPLICA = os.getenv('DB_REPLICA', '')
+
+if DB_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASES['replica']['NAME' if DB_ENGINE == 'sqlite' else 'HOST'] = DB_REPLICA
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+REPLICA_DATABASE = 'replica' if DB_REPLICA else None
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -108,9 +152,136 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Default primary key field type
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.MyUser'
+
+# Reviewer selection: 'random', 'least_loaded' or a dotted path to a class
+
+REVIEWER_SELECTION_STRATEGY = os.getenv('REVIEWER_SELECTION_STRATEGY', 'random')
+
+REVIEWER_WORKLOAD_TTL = int(os.getenv('REVIEWER_WORKLOAD_TTL', 300))
+
+BULK_CREATE_MAX_ITEMS = int(os.getenv('BULK_CREATE_MAX_ITEMS', 1000))
+
+REVIEW_PAGE_SIZE = int(os.getenv('REVIEW_PAGE_SIZE', 100))
+
+REVIEW_PAGE_MAX_SIZE = int(os.getenv('REVIEW_PAGE_MAX_SIZE', 1000))
+
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+STATS_PAGE_SIZE = int(os.getenv('STATS_PAGE_SIZE', 1000))
+
+STATS_PAGE_MAX_SIZE = int(os.getenv('STATS_PAGE_MAX_SIZE', 10000))
+
+STATS_STREAM_CHUNK_SIZE = int(os.getenv('STATS_STREAM_CHUNK_SIZE', 2000))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+ROSTER_CACHE_ALIAS = os.getenv('ROSTER_CACHE_ALIAS', 'default')
+
+ROSTER_CACHE_TTL = int(os.getenv('ROSTER_CACHE_TTL', 600))
+
+VERSION_CACHE_ALIAS = os.getenv('VERSION_CACHE_ALIAS', 'default')
+
+# Read endpoints served by async views; enabled by default in asgi.py
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False').lower() in ('true', '1')
+
+ASYNC_STREAM_SPOOL_SIZE = int(os.getenv('ASYNC_STREAM_SPOOL_SIZE', 8 * 1024 * 1024))
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1')
+
+# Requests slower than this are logged with their SQL; 0 disables the log
+
+METRICS_SLOW_REQUEST_MS = float(os.getenv('METRICS_SLOW_REQUEST_MS', 0))
+
+# Directory where every worker saves its metrics so that /api/metrics sums
+# all of them; gunicorn.conf.py creates one when it runs several workers
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+
+# Seconds a worker may delay saving its metrics after a request
+
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+
+# orjson-backed JSON renderer and parser; they fall back to the stdlib
+# json module when orjson is not installed
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Event log (/api/events/): page size, the longest long-poll wait and SSE
+# connection in seconds, how often waiting clients check for new events,
+# and how long events are kept before prune_events removes them
+
+EVENTS_PAGE_SIZE = int(os.getenv('EVENTS_PAGE_SIZE', 100))
+
+EVENTS_PAGE_MAX_SIZE = int(os.getenv('EVENTS_PAGE_MAX_SIZE', 1000))
+
+EVENTS_MAX_WAIT = float(os.getenv('EVENTS_MAX_WAIT', 30))
+
+EVENTS_STREAM_TIMEOUT = float(os.getenv('EVENTS_STREAM_TIMEOUT', 300))
+
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', 0.5))
+
+EVENTS_RETENTION = int(os.getenv('EVENTS_RETENTION', 7 * 24 * 60 * 60))
+
+# Longest wait of a /api/events/ long-poll or SSE stream in WSGI mode: the
+# request holds a gunicorn worker, and sync workers are killed after
+# GUNICORN_TIMEOUT, so waits end earlier and clients reconnect
+
+EVENTS_SYNC_MAX_DURATION = float(os.getenv(
+    'EVENTS_SYNC_MAX_DURATION', max(int(os.getenv('GUNICORN_TIMEOUT', 30)) - 5, 1)))
+
+# Background jobs (?async=true): rows per batch transaction, seconds a
+# worker holds a job between checkpoints, how often an idle run_jobs polls
+# the queue, and how many times a job is retried after a worker is lost
+
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', 200))
+
+JOB_LEASE = int(os.getenv('JOB_LEASE', 60))
+
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+# Archival of merged pull requests: how many days a merged PR stays in the
+# hot tables before archive_pull_requests moves it, and how many PRs are
+# moved per transaction
+
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', 90))
+
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+
+# Read replica routing: seconds a client reads from the primary after its
+# own write, the largest replication lag in seconds tolerated before reads
+# fall back to the primary, and how often the lag is measured
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 2))
+
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 1))
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic import TemplateView
+from django.views.static import serve
 
 
 urlpatterns = [
@@ -11,4 +13,9 @@ urlpatterns = [
         TemplateView.as_view(template_name='redoc.html'),
         name='redoc'
     ),
+    re_path(
+        r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'),
+        serve,
+        {'document_root': settings.STATIC_ROOT}
+    ),
 ]
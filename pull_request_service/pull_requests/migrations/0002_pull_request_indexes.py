@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 14:55
+
+import itertools
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+
+def rename_duplicate_names(apps, schema_editor):
+    """Переименовать PR с повторяющимися названиями перед уникальным индексом.
+
+    Проверка перед вставкой, которую заменяет уникальный индекс, пропускала
+    дубликаты при одновременных запросах. Самый ранний PR сохраняет
+    название, к остальным добавляется их id.
+    """
+    PullRequest = apps.get_model('pull_requests', 'PullRequest')
+    duplicates = PullRequest.objects.values('pull_request_name').annotate(
+        count=Count('id')).filter(count__gt=1).values_list('pull_request_name', flat=True)
+    for name in list(duplicates):
+        for pr in PullRequest.objects.filter(pull_request_name=name).order_by('id')[1:]:
+            for attempt in itertools.count():
+                suffix = f' #{pr.pk}' + (f'.{attempt}' if attempt else '')
+                new_name = name[:128 - len(suffix)] + suffix
+                if not PullRequest.objects.filter(pull_request_name=new_name).exists():
+                    break
+            logger.warning('Renaming duplicate pull request %s %r to %r', pr.pk, name, new_name)
+            pr.pull_request_name = new_name
+            pr.save(update_fields=['pull_request_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pull_requests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='pullrequest',
+            name='pull_request_name',
+            field=models.CharField(max_length=128, unique=True, verbose_name='Название'),
+        ),
+        migrations.AddIndex(
+            model_name='pullrequest',
+            index=models.Index(condition=models.Q(status='OPEN'), fields=['created_at', 'id'], name='pull_request_open_idx'),
+        ),
+    ]
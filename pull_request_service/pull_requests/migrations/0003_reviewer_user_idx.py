@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 14:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pull_requests', '0002_pull_request_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX pr_reviewer_user_pr_idx '
+                'ON pull_requests_pullrequest_assigned_reviewers (user_id, pullrequest_id)',
+            reverse_sql='DROP INDEX pr_reviewer_user_pr_idx',
+        ),
+    ]
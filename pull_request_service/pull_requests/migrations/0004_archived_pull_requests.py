@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 15:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_team_active_idx'),
+        ('pull_requests', '0003_reviewer_user_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPullRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('pull_request_name', models.CharField(db_index=True, max_length=128, verbose_name='Название')),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('MERGED', 'Merged')], max_length=6, verbose_name='Статус')),
+                ('reviewers_count', models.PositiveIntegerField(default=0, verbose_name='Количество ревьюверов')),
+                ('created_at', models.DateTimeField(verbose_name='Дата и время создания')),
+                ('merged_at', models.DateTimeField(verbose_name='Дата и время слияния')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время архивации')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pullrequest',
+            index=models.Index(condition=models.Q(status='MERGED'), fields=['merged_at', 'id'], name='pull_request_merged_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedpullrequest',
+            name='assigned_reviewers',
+            field=models.ManyToManyField(blank=True, related_name='archived_review_assignments', to='users.User', verbose_name='Ревьюверы'),
+        ),
+        migrations.AddField(
+            model_name='archivedpullrequest',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests', to='users.user', verbose_name='Автор'),
+        ),
+    ]
@@ -13,7 +13,7 @@ class PullRequest(models.Model):
     """Pull Request."""
 
     pull_request_name = models.CharField(
-        max_length=128, verbose_name="Название")
+        max_length=128, unique=True, verbose_name="Название")
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -40,5 +40,61 @@ class PullRequest(models.Model):
         verbose_name="Дата и время слияния"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='OPEN'),
+                name='pull_request_open_idx',
+            ),
+            models.Index(
+                fields=['merged_at', 'id'],
+                condition=models.Q(status='MERGED'),
+                name='pull_request_merged_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.pull_request_name
+
+
+class ArchivedPullRequest(models.Model):
+    """Смёрженный PR, перенесённый из горячей таблицы командой
+    ``archive_pull_requests``; первичный ключ сохраняется.
+
+    Имя остаётся занятым и после архивации: создание PR проверяет и
+    горячую таблицу, и архив. Повторы в архиве возможны только у PR,
+    заархивированных до введения этой проверки.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    pull_request_name = models.CharField(
+        max_length=128, db_index=True, verbose_name="Название")
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Автор",
+        related_name='archived_requests'
+    )
+    status = models.CharField(
+        max_length=6,
+        choices=STATUS_CHOICES,
+        verbose_name="Статус"
+    )
+    assigned_reviewers = models.ManyToManyField(
+        User,
+        related_name='archived_review_assignments',
+        blank=True,
+        verbose_name="Ревьюверы"
+    )
+    reviewers_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество ревьюверов")
+    created_at = models.DateTimeField(verbose_name="Дата и время создания")
+    merged_at = models.DateTimeField(verbose_name="Дата и время слияния")
+    archived_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата и время архивации"
+    )
+
     def __str__(self):
         return self.pull_request_name
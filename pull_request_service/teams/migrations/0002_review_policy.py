@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 15:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewPolicy',
+            fields=[
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_policy', serialize=False, to='teams.team', verbose_name='Команда')),
+                ('reviewers_count', models.PositiveSmallIntegerField(default=2, verbose_name='Количество ревьюверов')),
+                ('exclude_recent', models.PositiveSmallIntegerField(default=0, verbose_name='Пропускать последних назначенных')),
+                ('fallback_teams', models.ManyToManyField(blank=True, related_name='_teams_reviewpolicy_fallback_teams_+', to='teams.Team', verbose_name='Резервные команды')),
+            ],
+        ),
+    ]
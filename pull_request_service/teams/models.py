@@ -9,3 +9,32 @@ class Team(models.Model):
 
     def __str__(self):
         return self.team_name
+
+
+class ReviewPolicy(models.Model):
+    """Правила назначения ревьюверов на PR авторов команды.
+
+    Без записи действуют правила по умолчанию: два ревьювера из команды
+    автора без резервных команд.
+    """
+
+    team = models.OneToOneField(
+        Team,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='review_policy',
+        verbose_name="Команда"
+    )
+    reviewers_count = models.PositiveSmallIntegerField(
+        default=2, verbose_name="Количество ревьюверов")
+    fallback_teams = models.ManyToManyField(
+        Team,
+        related_name='+',
+        blank=True,
+        verbose_name="Резервные команды"
+    )
+    exclude_recent = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Пропускать последних назначенных")
+
+    def __str__(self):
+        return f'{self.team_id}: {self.reviewers_count}'
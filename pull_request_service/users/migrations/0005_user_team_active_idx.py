@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_team'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['team', 'is_active'], name='user_team_active_idx'),
+        ),
+    ]
@@ -23,5 +23,11 @@ class User(models.Model):
     is_active = models.BooleanField(
         default=True, verbose_name="Статус активности")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', 'is_active'],
+                         name='user_team_active_idx'),
+        ]
+
     def __str__(self):
         return self.username